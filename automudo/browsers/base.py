@@ -20,6 +20,14 @@ class Browser(object):
         all_bookmarks = self.get_all_bookmarks()
         return [b for b in all_bookmarks if 'music' in map(str.lower, b[0])]
 
+    def get_music_bookmarks_added_times(self):
+        """
+            Returns a dictionary of music bookmark title -> the time
+            (in seconds since the epoch) in which the bookmark was added.
+            Browsers which do not keep these times return an empty dictionary.
+        """
+        return dict()
+
     def get_music_bookmarks_titles(self):
         """
             Returns the titles that were given to the user's music bookmarks.
@@ -4,6 +4,9 @@ import itertools
 
 from .base import Browser
 
+# Chrome keeps times in microseconds since 1601-01-01 (UTC).
+CHROME_EPOCH_OFFSET_SECONDS = 11644473600
+
 
 class ChromeBrowser(Browser):
     """
@@ -24,6 +27,30 @@ class ChromeBrowser(Browser):
         parsed_bookmarks_json = self._get_parsed_bookmarks_json()
         return self._get_all_bookmarks_under_node(parsed_bookmarks_json)
 
+    def get_music_bookmarks_added_times(self):
+        """
+            Implementation for Browser.get_music_bookmarks_added_times .
+        """
+        added_times = dict()
+        parsed_bookmarks_json = self._get_parsed_bookmarks_json()
+        nodes_to_visit = [
+            ([], parsed_bookmarks_json['roots']['bookmark_bar'])
+            ]
+        while nodes_to_visit:
+            parent_path, bookmark_node = nodes_to_visit.pop()
+            path = parent_path + [bookmark_node['name']]
+            if bookmark_node['type'] == 'folder':
+                nodes_to_visit.extend((path, child_node) for child_node
+                                      in bookmark_node['children'])
+            elif 'music' in map(str.lower, path) and \
+                    bookmark_node.get('date_added'):
+                added_time = (int(bookmark_node['date_added']) / 1000000 -
+                              CHROME_EPOCH_OFFSET_SECONDS)
+                added_times[bookmark_node['name']] = max(
+                    added_time, added_times.get(bookmark_node['name'], 0)
+                    )
+        return added_times
+
     @staticmethod
     def _get_parsed_bookmarks_json():
         """
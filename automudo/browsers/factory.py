@@ -1,6 +1,10 @@
-from .chrome import ChromeBrowser
+from automudo.utils.registry import PluginRegistry
 
-SUPPORTED_BROWSERS = [ChromeBrowser]
+# The implementations are imported only when they are used.
+SUPPORTED_BROWSERS = PluginRegistry("browser", {
+    'chrome': "automudo.browsers.chrome:ChromeBrowser",
+    'firefox': "automudo.browsers.firefox:FirefoxBrowser"
+    })
 
 
 def create_browser(browser_name, **kwargs):
@@ -8,11 +12,8 @@ def create_browser(browser_name, **kwargs):
         Finds the class that inherits Browser
         and has the given browser name,
         and initializes an object of it using kwargs.
+
+        Raises:
+            KeyError - there is no browser with the given name.
     """
-    for browser in SUPPORTED_BROWSERS:
-        if browser.name == browser_name:
-            return browser(**kwargs)
-    return KeyError("Browser {} not found. Supported browsers are: {}".format(
-        browser_name,
-        ", ".join(browser.name for browser in SUPPORTED_BROWSERS)
-        ))
+    return SUPPORTED_BROWSERS.create(browser_name, **kwargs)
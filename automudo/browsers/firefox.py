@@ -0,0 +1,213 @@
+import os
+import sqlite3
+import contextlib
+import configparser
+from urllib.request import pathname2url
+
+from .base import Browser
+
+# Types of rows in moz_bookmarks.
+BOOKMARK_TYPE = 1
+FOLDER_TYPE = 2
+# The folder of the tags, whose children are not real bookmarks.
+TAGS_FOLDER_GUID = "tags________"
+
+# The ids of all of the folders named "music" (except for tags),
+# and of their descendants.
+MUSIC_FOLDERS_QUERY = """
+    WITH RECURSIVE music_folders(id) AS (
+        SELECT id FROM moz_bookmarks
+        WHERE type = :folder_type AND lower(title) = 'music'
+        AND parent NOT IN (SELECT id FROM moz_bookmarks
+                           WHERE guid = :tags_folder_guid)
+        UNION
+        SELECT child.id FROM moz_bookmarks AS child
+        JOIN music_folders ON child.parent = music_folders.id
+        WHERE child.type = :folder_type
+    )
+"""
+
+
+class FirefoxBrowser(Browser):
+    """
+    A Browser implementation for Firefox.
+    The bookmarks are read from the profile's places.sqlite,
+    which is opened read-only and immutable, so that it is read
+    in place (without copying it) even while Firefox is running.
+    Immutable reads skip Firefox's write-ahead log (places.sqlite-wal),
+    so bookmarks added since Firefox last checkpointed it are not seen
+    (they are seen in later runs).
+    """
+    name = "firefox"
+
+    def __init__(self, profile_path=None):
+        """
+            Initializes the FirefoxBrowser instance.
+
+            Parameters:
+                profile_path - optional. the path of the Firefox profile.
+                               defaults to the default profile
+        """
+        super(FirefoxBrowser, self).__init__()
+
+        if profile_path:
+            profile_path = os.path.expanduser(profile_path)
+        else:
+            profile_path = self._get_default_profile_path()
+        self.__places_path = os.path.join(profile_path, "places.sqlite")
+        if not os.path.exists(self.__places_path):
+            raise FileNotFoundError(
+                "Firefox's bookmarks file was not found: {}".format(
+                    self.__places_path
+                    ))
+
+    @staticmethod
+    def _get_default_profile_path():
+        """
+            Returns the path of Firefox's default profile, by profiles.ini.
+        """
+        firefox_directory = os.path.expanduser("~/.mozilla/firefox")
+        if os.name.startswith("nt"):  # Windows
+            firefox_directory = os.path.join(os.getenv('APPDATA'),
+                                             r"Mozilla\Firefox")
+
+        profiles = configparser.ConfigParser()
+        if not profiles.read(os.path.join(firefox_directory,
+                                          "profiles.ini")):
+            raise FileNotFoundError("Firefox's profiles.ini was not found")
+
+        # Newer versions keep the default profile of each installation
+        # in an Install section, older ones mark it with Default=1.
+        for section in profiles.sections():
+            if section.startswith("Install") and \
+                    profiles.has_option(section, "Default"):
+                return os.path.join(firefox_directory,
+                                    profiles.get(section, "Default"))
+        for section in profiles.sections():
+            if section.startswith("Profile") and \
+                    profiles.get(section, "Default", fallback="0") == "1":
+                profile_path = profiles.get(section, "Path")
+                if profiles.get(section, "IsRelative", fallback="1") == "1":
+                    profile_path = os.path.join(firefox_directory,
+                                                profile_path)
+                return profile_path
+        raise FileNotFoundError("Firefox's default profile was not found")
+
+    def _connect(self, immutable=True):
+        """
+            Opens places.sqlite read-only. When immutable is set,
+            SQLite neither locks it nor looks for changes in it,
+            so a running Firefox does not block the reading.
+        """
+        return sqlite3.connect(
+            "file:{}?mode=ro{}".format(
+                pathname2url(self.__places_path),
+                "&immutable=1" if immutable else ""
+                ),
+            uri=True
+            )
+
+    def _read(self, read_function):
+        """
+            Returns the result of read_function(connection),
+            reading places.sqlite immutably.
+            If Firefox changes the file in the middle of the reading
+            (by a checkpoint), SQLite may find it malformed. It is then
+            read again normally (with SQLite's locking, and with
+            the write-ahead log).
+        """
+        try:
+            with contextlib.closing(self._connect()) as connection:
+                return read_function(connection)
+        except sqlite3.DatabaseError:
+            with contextlib.closing(
+                    self._connect(immutable=False)) as connection:
+                return read_function(connection)
+
+    def _iterate_music_bookmarks(self, columns, modified_since=None):
+        """
+            Yields the given columns of the bookmarks under the folders
+            named "music", as they are read from the database.
+        """
+        query = MUSIC_FOLDERS_QUERY + """
+            SELECT {} FROM moz_bookmarks
+            WHERE parent IN music_folders AND type = :bookmark_type
+            AND title IS NOT NULL AND lastModified >= :modified_since
+        """.format(columns)
+        # Firefox keeps times in microseconds since the epoch.
+        parameters = {'folder_type': FOLDER_TYPE,
+                      'bookmark_type': BOOKMARK_TYPE,
+                      'tags_folder_guid': TAGS_FOLDER_GUID,
+                      'modified_since': (modified_since or 0) * 1000000}
+        # The rows are read at once, so that a failed reading
+        # is read again from the start (see _read).
+        yield from self._read(
+            lambda connection: connection.execute(query,
+                                                  parameters).fetchall()
+            )
+
+    def get_music_bookmarks_titles(self, modified_since=None):
+        """
+            Returns an iterator of the titles of the user's music bookmarks,
+            using a single recursive query.
+
+            Parameters:
+                modified_since - optional. only return the titles of bookmarks
+                                 which were added or changed since this time
+                                 (in seconds since the epoch)
+        """
+        for (title,) in self._iterate_music_bookmarks("title",
+                                                      modified_since):
+            yield title
+
+    def get_music_bookmarks_added_times(self):
+        """
+            Implementation for Browser.get_music_bookmarks_added_times .
+        """
+        added_times = dict()
+        for title, date_added in self._iterate_music_bookmarks(
+                "title, dateAdded"
+                ):
+            added_times[title] = max(date_added / 1000000,
+                                     added_times.get(title, 0))
+        return added_times
+
+    def get_all_bookmarks(self):
+        """
+            Implementation for Browser.get_all_bookmarks .
+        """
+        def read_folders_and_bookmarks(connection):
+            folders = {
+                folder_id: (parent_id, title, guid)
+                for folder_id, parent_id, title, guid in connection.execute(
+                    "SELECT id, parent, title, guid FROM moz_bookmarks "
+                    "WHERE type = ?", (FOLDER_TYPE,)
+                    )
+                }
+            bookmarks = connection.execute(
+                "SELECT moz_bookmarks.parent, moz_bookmarks.title, "
+                "moz_places.url FROM moz_bookmarks "
+                "JOIN moz_places ON moz_places.id = moz_bookmarks.fk "
+                "WHERE moz_bookmarks.type = ?", (BOOKMARK_TYPE,)
+                ).fetchall()
+            return (folders, bookmarks)
+
+        folders, bookmarks = self._read(read_folders_and_bookmarks)
+
+        def get_folder_path(folder_id):
+            # Returns None for the folders of the tags.
+            path = []
+            while folder_id in folders:
+                folder_id, title, guid = folders[folder_id]
+                if guid == TAGS_FOLDER_GUID:
+                    return None
+                if title:  # The root folder has no title.
+                    path.insert(0, title)
+            return path
+
+        all_bookmarks = []
+        for parent_id, title, url in bookmarks:
+            folder_path = get_folder_path(parent_id)
+            if folder_path is not None:
+                all_bookmarks.append((folder_path + [title or ""], url))
+        return all_bookmarks
@@ -19,6 +19,22 @@ class MusicMetadataDatabase(object):
     # When inheriting this class, you should define a module-level
     # constant named "name", containing the database's name
 
+    # Albums are considered matching a search string
+    # only above this probability.
+    GOOD_MATCH_PROBABILITY = 0.9
+
+    # The estimated costs of the lookups, used for planning runs
+    # (see automudo.planning). Local databases send no requests.
+    # The typical amount of search requests and of detail requests
+    # of looking up a single album.
+    ALBUM_LOOKUP_SEARCHES = 0
+    ALBUM_LOOKUP_DETAIL_FETCHES = 0
+    # The amount of requests of listing the albums of an artist
+    # (see find_artist_albums), or None if the database cannot list them.
+    ARTIST_LOOKUP_REQUESTS = None
+    # The minimal amount of seconds between requests, by the rate limit.
+    REQUEST_INTERVAL_SECONDS = 0
+
     # Unwanted keywords that should be removed from search strings.
     # Note that years are removed because the years found in some sources
     # are not the year or release, causing problems in the search.
@@ -45,7 +61,23 @@ class MusicMetadataDatabase(object):
         for k in __UNWANTED_SEARCH_KEYWORDS
         ]
 
-    def find_album(self, search_string, max_results=3):
+    def find_album(self, search_string, max_results=3,
+                   on_album_fetched=None):
+        """
+            Finds an album in the metadata database matching the search string.
+            A synchronous wrapper of find_album_async.
+
+            Returns:
+                iterator of (album, probability) tuples of good matches.
+        """
+        # asyncio is slow to import, so it is imported on first use.
+        from ..utils.aio import iterate_sync
+        return iterate_sync(self.find_album_async(
+            search_string, max_results, on_album_fetched
+            ))
+
+    async def find_album_async(self, search_string, max_results=3,
+                               on_album_fetched=None):
         """
             Finds an album in the metadata database matching the search string.
             Only returns great matches (>90% probability in a SequenceMatcher).
@@ -53,9 +85,13 @@ class MusicMetadataDatabase(object):
             Parameters:
                 search_string - the search string
                 max_results - maximal amount of results to return
+                on_album_fetched - optional. a function which is called
+                                   with every album fetched from the database,
+                                   including the ones that do not match
 
             Returns:
-                iterable of (album, probability) tuples of good matches.
+                asynchronous iterator of (album, probability) tuples
+                of good matches.
         """
         normalized_search_string = self.normalize_music_description(
             search_string
@@ -64,19 +100,21 @@ class MusicMetadataDatabase(object):
         # The reason for this is that many results are not very good
         # and we filter some of the results here.
         max_results_from_specific_db = int(2*max_results)
-        master_releases = self._find_album(
+        master_releases = self._find_album_async(
             normalized_search_string, True, max_results_from_specific_db
             )
-        all_releases = self._find_album(
+        all_releases = self._find_album_async(
             normalized_search_string, False, max_results_from_specific_db
             )
 
         found_a_good_release = False
-        for album in master_releases:
+        async for album in master_releases:
+            if on_album_fetched is not None:
+                on_album_fetched(album)
             probability = self._get_album_match_probability(
                 normalized_search_string, album
                 )
-            if probability > 0.9:
+            if probability > self.GOOD_MATCH_PROBABILITY:
                 found_a_good_release = True
                 yield (album, probability)
                 max_results -= 1
@@ -84,43 +122,93 @@ class MusicMetadataDatabase(object):
                     return
 
         if not found_a_good_release:
-            for album in all_releases:
+            async for album in all_releases:
+                if on_album_fetched is not None:
+                    on_album_fetched(album)
                 probability = self._get_album_match_probability(
                     normalized_search_string, album
                     )
-                if probability > 0.9:
+                if probability > self.GOOD_MATCH_PROBABILITY:
                     found_a_good_release = True
                     yield (album, probability)
                     max_results -= 1
                     if max_results == 0:
                         return
 
+    def find_artist_albums(self, artist, search_strings,
+                           on_album_fetched=None):
+        """
+            Finds the albums matching several search strings
+            of the same artist at once.
+            A synchronous wrapper of find_artist_albums_async.
+        """
+        from ..utils.aio import run_sync
+        return run_sync(self.find_artist_albums_async(
+            artist, search_strings, on_album_fetched
+            ))
+
+    async def find_artist_albums_async(self, artist, search_strings,
+                                       on_album_fetched=None):
+        """
+            Finds the albums matching several search strings
+            of the same artist at once, by listing the artist's albums
+            (instead of searching for each of the strings).
+            Databases which cannot list the albums of an artist
+            match nothing, so the strings are searched one by one.
+
+            Parameters:
+                artist - the artist's name
+                search_strings - the search strings (of the artist's albums
+                                 or tracks)
+                on_album_fetched - optional. a function which is called
+                                   with every album fetched from the database
+
+            Returns:
+                a dictionary of search-string -> (album, probability),
+                of the search strings which were matched.
+        """
+        return dict()
+
     @classmethod
     def _get_album_match_probability(cls, normalized_search_string, album):
-        def get_match_probability(compared_string):
-            return difflib.SequenceMatcher(
-                    a=normalized_search_string,
-                    b=cls.normalize_music_description(
-                        compared_string
-                        )
-                    ).ratio()
-
-        album_match_probability = get_match_probability(
-            " ".join([album.artist, album.title])
+        return cls._get_best_match_probability(
+            normalized_search_string, cls._get_album_comparison_strings(album)
             )
-        highest_probability = album_match_probability
+
+    @classmethod
+    def _get_album_comparison_strings(cls, album):
+        """
+            Returns the normalized strings that search strings
+            of the album (or of one of its tracks) are compared with.
+        """
+        comparison_strings = [" ".join([album.artist, album.title])]
         for track in album.tracks:
-            comparison_strings = [
+            comparison_strings.extend([
                 " ".join([album.artist, track.title]),
                 " ".join([track.title, album.artist]),
                 " ".join([album.artist, album.title, track.title]),
                 " ".join([track.title, album.title, album.artist])
-                ]
-            for comparison_string in comparison_strings:
-                highest_probability = max(
-                    highest_probability,
-                    get_match_probability(comparison_string)
-                    )
+                ])
+        return [cls.normalize_music_description(comparison_string)
+                for comparison_string in comparison_strings]
+
+    @staticmethod
+    def _get_best_match_probability(normalized_search_string,
+                                    normalized_comparison_strings):
+        """
+            Returns the highest SequenceMatcher ratio between the search
+            string and the comparison strings.
+            The cheap upper bounds of the ratio are checked first,
+            so most of the non-matching strings are not fully compared.
+        """
+        highest_probability = 0
+        matcher = difflib.SequenceMatcher(a=normalized_search_string)
+        for comparison_string in normalized_comparison_strings:
+            matcher.set_seq2(comparison_string)
+            if matcher.real_quick_ratio() > highest_probability and \
+                    matcher.quick_ratio() > highest_probability:
+                highest_probability = max(highest_probability,
+                                          matcher.ratio())
         return highest_probability
 
     @classmethod
@@ -155,8 +243,27 @@ class MusicMetadataDatabase(object):
 
         return description_string.strip()
 
+    # The database-specific implementation is either _find_album
+    # or _find_album_async. Each of them defaults to wrapping the other,
+    # so implementations should override at least one of them.
+    # Databases which do I/O should implement _find_album_async.
+
     def _find_album(self, search_string, master_releases_only, max_results):
         """
             The database-specific implementation for find_album.
+            Returns an iterator of albums.
+        """
+        from ..utils.aio import iterate_sync
+        yield from iterate_sync(self._find_album_async(
+            search_string, master_releases_only, max_results
+            ))
+
+    async def _find_album_async(self, search_string,
+                                master_releases_only, max_results):
+        """
+            The database-specific implementation for find_album_async.
+            Returns an asynchronous iterator of albums.
         """
-        raise NotImplementedError()
+        for album in self._find_album(search_string,
+                                      master_releases_only, max_results):
+            yield album
@@ -1,10 +1,20 @@
 import re
+import asyncio
 import datetime
 
-import requests
-
 from .base import MusicMetadata, TrackMetadata, MusicMetadataDatabase
-from ..utils.throttle import throttle
+from ..utils import http
+from ..utils.aio import run_blocking
+from ..utils.rate_limit import AdaptiveRateLimiter
+
+# Discogs reports the remaining requests budget (per minute) in the headers
+# of its responses. All of the requests share the same limiter,
+# since they share the same budget (of the API key).
+_DISCOGS_RATE_LIMITER = AdaptiveRateLimiter(
+    limit_header="X-Discogs-Ratelimit",
+    remaining_header="X-Discogs-Ratelimit-Remaining",
+    window_seconds=60
+    )
 
 
 class DiscogsMetadataDatabase(MusicMetadataDatabase):
@@ -13,6 +23,20 @@ class DiscogsMetadataDatabase(MusicMetadataDatabase):
     """
     name = "discogs"
 
+    # The maximal amount of pages (of 100 releases each)
+    # read from the releases list of an artist.
+    MAX_ARTIST_RELEASES_PAGES = 3
+
+    # A masters search and the details of its results until a good match.
+    # Titles without good masters cost more: a releases search as well,
+    # and the details of all of the results.
+    ALBUM_LOOKUP_SEARCHES = 1
+    ALBUM_LOOKUP_DETAIL_FETCHES = 2
+    # An artist search and the first page of the artist's releases.
+    ARTIST_LOOKUP_REQUESTS = 2
+    # Authenticated requests are limited to 60 per minute.
+    REQUEST_INTERVAL_SECONDS = 1
+
     def __init__(self, user_agent=None, api_key=None):
         """
             Initializes the DiscogsMetadataDatabase instance.
@@ -47,21 +71,15 @@ class DiscogsMetadataDatabase(MusicMetadataDatabase):
         else:
             return 1
 
-    @throttle(seconds=3)
-    def _get_release_details(self, resource_url, formats=None):
+    @staticmethod
+    def _build_artist_name(artists):
         """
-            Gets the release details from the given resource URL.
-            Note that the formats field will not be field
-            unless you provide it in the formats argument.
+            Builds the artist name from a list of Discogs artists,
+            each of them a dictionary with 'name' and 'join' fields.
         """
-        headers = {'User-Agent': self.__user_agent}
-        album_details = requests.get(
-            resource_url, headers=headers
-            ).json()
-
         artist = ""
         last_join = ""
-        for single_artist in album_details['artists']:
+        for single_artist in artists:
             if last_join:
                 if re.match(r"\w", last_join[0]):
                     artist += " "
@@ -76,15 +94,19 @@ class DiscogsMetadataDatabase(MusicMetadataDatabase):
 
         # Remove "The " from the beginning of the artist name.
         if artist.lower().startswith('the '):
-            artist = artist.partition('the ')[2]
+            artist = artist[len('the '):]
 
         # Discogs distinguishes between multiple artists
         # with the same name by writing a numeric identifer
         # in parenthesis after the artist name.
         # We don't need this, so we omit it.
-        artist = re.sub(r"\s*\([0-9]+\)$", "", artist)
+        return re.sub(r"\s*\([0-9]+\)$", "", artist)
 
-        title = album_details['title']
+    @staticmethod
+    def _clean_title(title):
+        """
+            Removes the parenthesis parts from a release title.
+        """
         # When albums with parenthesis in their names are
         # referenced online, the parenthesis part is usually omitted.
         # Therefore, if we don't omit the parenthesis part,
@@ -92,60 +114,85 @@ class DiscogsMetadataDatabase(MusicMetadataDatabase):
         # might not be as successful.
         title = re.sub(r"\([^\)]*\)", "", title)
         title = re.sub(r"\[[^\]]*\]", "", title)
-        title = re.sub(r"\{[^\}]*\}", "", title)
-
-        tracks = []
-        for track in album_details.get('tracklist', []):
-            if track['duration']:
-                duration_parts = [int(p) for p in track['duration'].split(':')]
-                if len(duration_parts) == 3:
-                    hour, minute, second = duration_parts
-                else:
-                    if len(duration_parts) == 2:
-                        second = 60 * duration_parts[0] + duration_parts[1]
-                    else:
-                        second = duration_parts[0]
-                    hour = (second // 60) // 60
-                    minute = (second // 60) % 60
-                    second = second % 60
-                duration = datetime.time(hour=hour,
-                                         minute=minute,
-                                         second=second)
+        return re.sub(r"\{[^\}]*\}", "", title)
+
+    @staticmethod
+    def _parse_duration(duration_string):
+        """
+            Parses a Discogs track duration ("[[h:]m:]s")
+            into a datetime.time, or None if there is no duration.
+        """
+        if not duration_string:
+            return None
+
+        duration_parts = [int(p) for p in duration_string.split(':')]
+        if len(duration_parts) == 3:
+            hour, minute, second = duration_parts
+        else:
+            if len(duration_parts) == 2:
+                second = 60 * duration_parts[0] + duration_parts[1]
             else:
-                duration = None
-
-            tracks.append(TrackMetadata(title=track['title'],
-                                        duration=duration))
-
-        release_date = album_details.get('released', None)
-        if release_date:
-            release_date = [max(1, int(x))
-                            for x in release_date.split("-")]
-            while len(release_date) < 3:
-                release_date.append(1)  # Fictive month/day.
-            release_date = datetime.date(*release_date)
-        return MusicMetadata(artist=artist, title=title,
-                             genres=album_details.get('styles', None),
-                             date=release_date,
-                             formats=formats,
-                             release_id=album_details['id'],
-                             metadata_database_name=self.name,
-                             tracks=tracks)
-
-    def _find_album(self, search_string, master_releases, max_results):
-        """
-            Implementation for MusicMetadataDatabase._find_album .
+                second = duration_parts[0]
+            hour = (second // 60) // 60
+            minute = (second // 60) % 60
+            second = second % 60
+        return datetime.time(hour=hour, minute=minute, second=second)
+
+    @staticmethod
+    def _parse_release_date(release_date):
         """
-        headers = {'User-Agent': self.__user_agent}
-        params = {'token': self.__api_key,
-                  'type': "master" if master_releases else "release",
-                  'q': search_string,
-                  'per_page': max_results,
-                  'page': 1}
-        search_response = requests.get(
+            Parses a Discogs release date ("yyyy[-mm[-dd]]")
+            into a datetime.date, or None if there is no date.
+            Missing or zeroed months and days are set to 1.
+        """
+        if not release_date:
+            return None
+
+        release_date = [max(1, int(x))
+                        for x in release_date.split("-")]
+        while len(release_date) < 3:
+            release_date.append(1)  # Fictive month/day.
+        return datetime.date(*release_date)
+
+    async def _get_release_details_async(self, resource_url, formats=None):
+        """
+            Gets the release details from the given resource URL.
+            Note that the formats field will not be field
+            unless you provide it in the formats argument.
+        """
+        album_details = await self._get_api_resource_async(resource_url)
+
+        tracks = [TrackMetadata(title=track['title'],
+                                duration=self._parse_duration(
+                                    track['duration']
+                                    ))
+                  for track in album_details.get('tracklist', [])]
+
+        return MusicMetadata(
+            artist=self._build_artist_name(album_details['artists']),
+            title=self._clean_title(album_details['title']),
+            genres=album_details.get('styles', None),
+            date=self._parse_release_date(
+                album_details.get('released', None)
+                ),
+            formats=formats,
+            release_id=album_details['id'],
+            metadata_database_name=self.name,
+            tracks=tracks
+            )
+
+    async def _find_album_async(self, search_string,
+                                master_releases, max_results):
+        """
+            Implementation for MusicMetadataDatabase._find_album_async .
+        """
+        search_response = await self._get_api_resource_async(
             "https://api.discogs.com/database/search",
-            params=params, headers=headers
-            ).json()
+            type="master" if master_releases else "release",
+            q=search_string,
+            per_page=max_results,
+            page=1
+            )
 
         search_results = search_response['results']
 
@@ -155,6 +202,173 @@ class DiscogsMetadataDatabase(MusicMetadataDatabase):
             )
 
         for result in search_results:
-            yield self._get_release_details(
+            yield await self._get_release_details_async(
                 result['resource_url'], result.get('format', None)
                 )
+
+    async def _get_api_resource_async(self, url, **params):
+        """
+            Gets a resource of the Discogs API (with the API key,
+            so that all of the requests use its higher rate limit).
+            The requests are paced by the budget which Discogs reports.
+            Failed requests are retried here rather than by http.request,
+            so that every attempt waits for its turn in the rate limiter,
+            and a 429 holds the other requests too while it is retried.
+
+            Raises:
+                http.HttpRequestError - the request failed,
+                                        or its status is not a success.
+        """
+        headers = {'User-Agent': self.__user_agent}
+        params['token'] = self.__api_key
+        for attempt in range(1, http.MAX_ATTEMPTS + 1):
+            await _DISCOGS_RATE_LIMITER.wait_async()
+            try:
+                response = await run_blocking(
+                    http.request, "GET", url, idempotent=False,
+                    params=params, headers=headers
+                    )
+                break
+            except (http.DeadlineExceededError, http.RequestCancelledError,
+                    http.CircuitOpenError):
+                raise
+            except http.HttpRequestError as exception:
+                if exception.response is not None:
+                    _DISCOGS_RATE_LIMITER.update(exception.response)
+                if attempt == http.MAX_ATTEMPTS:
+                    raise
+                # A 429 is waited for by the rate limiter (see
+                # AdaptiveRateLimiter.update), other failures back off.
+                if exception.response is None or \
+                        exception.response.status_code != 429:
+                    retry_delay = http.get_retry_delay(attempt,
+                                                       exception.response)
+                    remaining_time = http.get_remaining_time()
+                    if remaining_time is not None and \
+                            retry_delay >= remaining_time:
+                        raise http.DeadlineExceededError(
+                            "GET {} could not be retried before "
+                            "the deadline".format(url)
+                            ) from exception
+                    await asyncio.sleep(retry_delay)
+        _DISCOGS_RATE_LIMITER.update(response)
+        if not 200 <= response.status_code < 300:
+            raise http.HttpRequestError(
+                "GET {} failed: status {}".format(url, response.status_code),
+                response=response
+                )
+        return response.json()
+
+    async def _find_artist_id_async(self, artist):
+        """
+            Returns the Discogs identifier of the given artist,
+            or None if the artist was not found.
+        """
+        search_response = await self._get_api_resource_async(
+            "https://api.discogs.com/database/search",
+            type="artist", q=artist, per_page=5, page=1
+            )
+        search_results = search_response.get('results', [])
+        normalized_artist = self.normalize_music_description(artist)
+        for result in search_results:
+            if self.normalize_music_description(
+                    self._build_artist_name([{'name': result['title'],
+                                              'join': ""}])
+                    ) == normalized_artist or \
+                    self.normalize_music_description(
+                        result['title']
+                        ) == normalized_artist:
+                return result['id']
+        return search_results[0]['id'] if search_results else None
+
+    async def _get_artist_releases_async(self, artist_id):
+        """
+            Returns the releases and the masters of the given artist
+            in which the artist has the main role.
+        """
+        releases = []
+        for page in range(1, self.MAX_ARTIST_RELEASES_PAGES + 1):
+            releases_response = await self._get_api_resource_async(
+                "https://api.discogs.com/artists/{}/releases".format(
+                    artist_id
+                    ),
+                per_page=100, page=page
+                )
+            releases.extend(release
+                            for release in releases_response.get('releases',
+                                                                 [])
+                            if release.get('role') == "Main")
+            if page >= releases_response.get('pagination',
+                                             {}).get('pages', 1):
+                break
+        return releases
+
+    async def find_artist_albums_async(self, artist, search_strings,
+                                       on_album_fetched=None):
+        """
+            Implementation for MusicMetadataDatabase.find_artist_albums_async .
+            Lists the artist's releases once, matches the search strings
+            against the releases' titles, and fetches the details of
+            the matching releases only.
+            As in find_album, masters are preferred over other releases.
+        """
+        artist_id = await self._find_artist_id_async(artist)
+        if artist_id is None:
+            return dict()
+        releases = await self._get_artist_releases_async(artist_id)
+
+        def get_comparison_strings(release):
+            # Both with and without the cleanups of the artist's name
+            # (such as omitting "The "), as bookmarks may use either.
+            title = self._clean_title(release['title'])
+            return [
+                self.normalize_music_description(" ".join([artist, title]))
+                for artist in [
+                    self._build_artist_name([{'name': release['artist'],
+                                              'join': ""}]),
+                    re.sub(r"\s*\([0-9]+\)$", "", release['artist'])
+                    ]
+                ]
+        masters = [(get_comparison_strings(release), release)
+                   for release in releases if release['type'] == "master"]
+        other_releases = [(get_comparison_strings(release), release)
+                          for release in releases
+                          if release['type'] != "master"]
+
+        albums_by_url = dict()
+        matches = dict()
+        for search_string in search_strings:
+            normalized_search_string = self.normalize_music_description(
+                search_string
+                )
+            for candidate_releases in [masters, other_releases]:
+                probability, release = max(
+                    ((self._get_best_match_probability(
+                        normalized_search_string, comparison_strings
+                        ), release)
+                     for comparison_strings, release in candidate_releases),
+                    key=lambda candidate: candidate[0],
+                    default=(0, None)
+                    )
+                if probability > self.GOOD_MATCH_PROBABILITY:
+                    break
+            else:
+                continue  # Left for a search of its own.
+
+            album = albums_by_url.get(release['resource_url'])
+            if album is None:
+                album = await self._get_release_details_async(
+                    release['resource_url'],
+                    release['format'].split(", ")
+                    if release.get('format') else []
+                    )
+                albums_by_url[release['resource_url']] = album
+                if on_album_fetched is not None:
+                    on_album_fetched(album)
+
+            matches[search_string] = (album, max(
+                probability,
+                self._get_album_match_probability(normalized_search_string,
+                                                  album)
+                ))
+        return matches
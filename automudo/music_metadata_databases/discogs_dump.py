@@ -0,0 +1,316 @@
+import os
+import re
+import gzip
+import sqlite3
+import xml.etree.ElementTree as ElementTree
+
+from .base import MusicMetadata, TrackMetadata, MusicMetadataDatabase
+from .discogs import DiscogsMetadataDatabase
+from .records import write_music_metadata_records, MusicMetadataRecordsFile
+
+# The releases themselves are kept in a records file (see records.py)
+# next to the index, and the index refers to them by their position in it.
+INDEX_SCHEMA = """
+    CREATE TABLE releases (
+        release_id INTEGER PRIMARY KEY,
+        record_index INTEGER NOT NULL
+    );
+    CREATE TABLE main_releases (
+        release_id INTEGER PRIMARY KEY
+    );
+    CREATE VIRTUAL TABLE releases_text USING fts5(
+        artist, title, tracks,
+        content='', tokenize='unicode61 remove_diacritics 2'
+    );
+"""
+
+RECORDS_FILE_SUFFIX = ".records"
+
+# Words which appear in so many releases that searching for them
+# only slows the full-text queries down. They are searched for
+# only when a search string has no other words.
+COMMON_WORDS = frozenset([
+    "a", "an", "and", "at", "by", "de", "feat", "for", "ft", "from",
+    "in", "is", "it", "la", "le", "me", "my", "of", "on", "or",
+    "the", "to", "vs", "with", "you"
+    ])
+
+
+def _open_dump_file(dump_path):
+    """
+        Opens a Discogs dump file for reading.
+        The dumps are published gzipped, but may also be extracted.
+    """
+    if dump_path.endswith(".gz"):
+        return gzip.open(dump_path, "rb")
+    return open(dump_path, "rb")
+
+
+def _get_child_texts(element, path):
+    return [child.text for child in element.iterfind(path) if child.text]
+
+
+def _parse_release_element(element):
+    """
+        Parses a <release> element of the releases dump.
+        Returns a tuple: (MusicMetadata, is-main-release).
+    """
+    artists = [{'name': artist.findtext('name', ""),
+                'join': artist.findtext('join', "")}
+               for artist in element.iterfind('artists/artist')]
+
+    formats = []
+    for release_format in element.iterfind('formats/format'):
+        formats.append(release_format.get('name', ""))
+        formats.extend(_get_child_texts(release_format,
+                                        'descriptions/description'))
+
+    tracks = []
+    for track in element.iterfind('tracklist/track'):
+        try:
+            duration = DiscogsMetadataDatabase._parse_duration(
+                track.findtext('duration', "")
+                )
+        except ValueError:
+            duration = None  # Some durations in the dumps are malformed.
+        tracks.append(TrackMetadata(title=track.findtext('title', ""),
+                                    duration=duration))
+
+    try:
+        release_date = DiscogsMetadataDatabase._parse_release_date(
+            element.findtext('released', "")
+            )
+    except ValueError:
+        release_date = None
+
+    master_id_element = element.find('master_id')
+    is_main_release = (master_id_element is not None and
+                       master_id_element.get('is_main_release') == "true")
+
+    album = MusicMetadata(
+        artist=DiscogsMetadataDatabase._build_artist_name(artists),
+        title=DiscogsMetadataDatabase._clean_title(
+            element.findtext('title', "")
+            ),
+        genres=_get_child_texts(element, 'styles/style'),
+        date=release_date,
+        formats=formats,
+        release_id=int(element.get('id')),
+        metadata_database_name=DiscogsDumpMetadataDatabase.name,
+        tracks=tracks
+        )
+    return (album, is_main_release)
+
+
+def _iterate_dump_albums(connection, dump_paths):
+    """
+        Stream-parses the dumps, yielding the albums of their releases
+        in order, and records in the index the position of each release
+        (the last one, for releases which are repeated)
+        and which releases are main releases.
+    """
+    record_index = 0
+    for dump_path in dump_paths:
+        with _open_dump_file(dump_path) as dump_file:
+            root = None
+            for event, element in ElementTree.iterparse(
+                    dump_file, events=("start", "end")):
+                if event == "start":
+                    if root is None:
+                        root = element
+                    continue
+
+                if element.tag == "release":
+                    album, is_main_release = _parse_release_element(element)
+                    connection.execute(
+                        "INSERT OR REPLACE INTO releases VALUES (?, ?)",
+                        (album.release_id, record_index)
+                        )
+                    if is_main_release:
+                        connection.execute(
+                            "INSERT OR IGNORE INTO main_releases VALUES (?)",
+                            (album.release_id,)
+                            )
+                    record_index += 1
+                    yield album
+                elif element.tag == "master":
+                    main_release_id = element.findtext('main_release')
+                    if main_release_id:
+                        connection.execute(
+                            "INSERT OR IGNORE INTO main_releases VALUES (?)",
+                            (int(main_release_id),)
+                            )
+                else:
+                    continue
+
+                # Free the memory of the elements that were handled.
+                root.clear()
+
+
+def import_discogs_dump(index_path, dump_paths):
+    """
+        Builds a local index from Discogs XML data dumps.
+
+        The dumps are stream-parsed, so they are never loaded
+        into memory as a whole.
+        Releases dumps provide the releases themselves,
+        while masters dumps provide which releases are the main
+        releases of masters.
+        The releases are written into a records file next to the index
+        (its path is the index path with RECORDS_FILE_SUFFIX), and then
+        the full-text index is built from the records file.
+        Both files are built in temporary files and replace the existing
+        ones (if any) only when the import is complete.
+
+        Parameters:
+            index_path - path of the index file to create
+            dump_paths - paths of the dump files (may be gzipped)
+
+        Returns:
+            The amount of imported releases
+            (each release is counted once, even if it is repeated).
+    """
+    records_path = index_path + RECORDS_FILE_SUFFIX
+    temporary_index_path = index_path + ".importing"
+    temporary_records_path = records_path + ".importing"
+    if os.path.exists(temporary_index_path):
+        os.remove(temporary_index_path)
+
+    connection = sqlite3.connect(temporary_index_path)
+    try:
+        connection.executescript(INDEX_SCHEMA)
+        records_amount = write_music_metadata_records(
+            temporary_records_path,
+            _iterate_dump_albums(connection, dump_paths)
+            )
+
+        # Repeated releases (for example, when a dump is given twice)
+        # are indexed only by their last record.
+        with MusicMetadataRecordsFile(temporary_records_path) as records:
+            for release_id, record_index in connection.execute(
+                    "SELECT release_id, record_index FROM releases "
+                    "ORDER BY record_index"
+                    ):
+                album = records[record_index]
+                connection.execute(
+                    "INSERT INTO releases_text (rowid, artist, title, tracks) "
+                    "VALUES (?, ?, ?, ?)",
+                    (release_id, album.artist, album.title,
+                     " ".join(track.title for track in album.tracks))
+                    )
+        connection.execute(
+            "INSERT INTO releases_text (releases_text) VALUES ('optimize')"
+            )
+        # Used to check that the index matches its records file.
+        connection.execute("PRAGMA user_version = {:d}".format(
+            records_amount
+            ))
+        imported_releases, = connection.execute(
+            "SELECT COUNT(*) FROM releases"
+            ).fetchone()
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(temporary_records_path, records_path)
+    os.replace(temporary_index_path, index_path)
+    return imported_releases
+
+
+class DiscogsDumpMetadataDatabase(MusicMetadataDatabase):
+    """
+        A MusicMetadataDatabase implementation that uses a local index
+        of the Discogs data dumps (see import_discogs_dump).
+        Albums are found without any network access.
+    """
+    name = "discogs_dump"
+
+    def __init__(self, user_agent=None, index_path=None):
+        """
+            Initializes the DiscogsDumpMetadataDatabase instance.
+            The user_agent parameter is not used, as no HTTP requests
+            are made.
+        """
+        super(DiscogsDumpMetadataDatabase, self).__init__()
+
+        if not index_path:
+            raise ValueError("Index path not specified")
+
+        index_path = os.path.expanduser(index_path)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(
+                "Discogs dump index was not found: {}".format(index_path)
+                )
+
+        self.__connection = sqlite3.connect(
+            "file:{}?mode=ro".format(index_path), uri=True,
+            check_same_thread=False
+            )
+        self.__records = MusicMetadataRecordsFile(
+            index_path + RECORDS_FILE_SUFFIX
+            )
+        records_amount, = self.__connection.execute(
+            "PRAGMA user_version"
+            ).fetchone()
+        if records_amount != len(self.__records):
+            raise ValueError(
+                "Discogs dump index does not match its records file "
+                "(was the import interrupted?): {}".format(index_path)
+                )
+
+    @staticmethod
+    def _build_full_text_queries(search_string):
+        """
+            Builds the full-text queries of a search string: a query
+            matching all of the search words, and a query matching
+            any of them, for when no release matches all of them.
+            Common words (see COMMON_WORDS) are left out,
+            unless the search string has no other words.
+            Returns an empty list if the search string has no words.
+        """
+        words = []
+        for word in re.findall(r"\w+", search_string.lower()):
+            if word not in words:
+                words.append(word)
+        uncommon_words = [word for word in words
+                          if word not in COMMON_WORDS]
+        words = uncommon_words or words
+        if not words:
+            return []
+
+        quoted_words = ['"{}"'.format(word) for word in words]
+        if len(quoted_words) == 1:
+            return quoted_words
+        return [" AND ".join(quoted_words), " OR ".join(quoted_words)]
+
+    def _find_album(self, search_string, master_releases_only, max_results):
+        """
+            Implementation for MusicMetadataDatabase._find_album .
+        """
+        sql = ("SELECT releases.record_index FROM releases_text "
+               "JOIN releases "
+               "ON releases.release_id = releases_text.rowid "
+               "WHERE releases_text MATCH ? ")
+        if master_releases_only:
+            sql += ("AND releases.release_id IN "
+                    "(SELECT release_id FROM main_releases) ")
+        sql += "ORDER BY bm25(releases_text) LIMIT ?"
+
+        # The query of all of the words matches few releases, so it is
+        # fast. The query of any of them is used only when it fails.
+        record_indices = []
+        for full_text_query in self._build_full_text_queries(search_string):
+            record_indices = self.__connection.execute(
+                sql, (full_text_query, max_results)
+                ).fetchall()
+            if record_indices:
+                break
+
+        albums = sorted(
+            (self.__records[record_index]
+             for record_index, in record_indices),
+            key=lambda album: DiscogsMetadataDatabase._rank_release_formats(
+                album.formats
+                )
+            )
+        yield from albums
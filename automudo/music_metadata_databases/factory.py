@@ -1,6 +1,13 @@
-from .discogs import DiscogsMetadataDatabase
+from automudo.utils.registry import PluginRegistry
 
-SUPPORTED_DATABASES = [DiscogsMetadataDatabase]
+# The implementations are imported only when they are used.
+SUPPORTED_DATABASES = PluginRegistry("database", {
+    'discogs':
+        "automudo.music_metadata_databases.discogs:DiscogsMetadataDatabase",
+    'discogs_dump':
+        "automudo.music_metadata_databases.discogs_dump"
+        ":DiscogsDumpMetadataDatabase"
+    })
 
 
 def create_music_metadata_database(database_name, **kwargs):
@@ -8,12 +15,8 @@ def create_music_metadata_database(database_name, **kwargs):
         Finds the class that inherits Database
         and has the given database name,
         and initializes an object of it using kwargs.
+
+        Raises:
+            KeyError - there is no database with the given name.
     """
-    for database in SUPPORTED_DATABASES:
-        if database.name == database_name:
-            return database(**kwargs)
-    return KeyError(
-        "Database {} not found. Supported databases are: {}".format(
-            database_name,
-            ", ".join(database.name for database in SUPPORTED_DATABASES)
-            ))
+    return SUPPORTED_DATABASES.create(database_name, **kwargs)
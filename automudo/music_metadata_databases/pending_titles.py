@@ -0,0 +1,123 @@
+import threading
+
+from .base import MusicMetadataDatabase
+
+# A title is compared with an album only if at least this part
+# of the title's words appear in the album (artist, title or tracks).
+MIN_SHARED_WORDS_RATIO = 0.5
+
+
+class PendingTitlesIndex(object):
+    """
+        An inverted index of the words of the titles which wait for
+        an album lookup.
+
+        Every album fetched while looking for one title is matched against
+        all of the other pending titles in a single pass, so titles of
+        the same album (usually several of its tracks) are resolved
+        without searching the metadata database again.
+    """
+
+    def __init__(self, titles,
+                 min_probability=MusicMetadataDatabase.GOOD_MATCH_PROBABILITY):
+        """
+            Initializes the PendingTitlesIndex object.
+
+            Parameters:
+                titles - the pending titles
+                min_probability - optional. the minimal match probability
+                                  of an album and a title for resolving
+                                  the title
+        """
+        self.__min_probability = min_probability
+        self.__lock = threading.Lock()
+        # title -> normalized title
+        self.__normalized_titles = dict()
+        # word -> the titles containing it
+        self.__titles_by_word = dict()
+        # title -> (album, probability), of the resolved titles
+        self.__resolved_titles = dict()
+        for title in titles:
+            normalized_title = \
+                MusicMetadataDatabase.normalize_music_description(title)
+            self.__normalized_titles[title] = normalized_title
+            for word in set(normalized_title.split()):
+                self.__titles_by_word.setdefault(word, set()).add(title)
+
+    def remove(self, title):
+        """
+            Stops matching albums against the given title
+            (usually since it is being handled).
+        """
+        with self.__lock:
+            normalized_title = self.__normalized_titles.pop(title, None)
+            if normalized_title is None:
+                return
+            for word in set(normalized_title.split()):
+                self.__titles_by_word[word].discard(title)
+
+    def match_album(self, album):
+        """
+            Matches a fetched album against the pending titles,
+            resolving the titles that it matches
+            (unless they are already resolved to a more probable album).
+            Returns the amount of the newly resolved titles.
+        """
+        comparison_strings = \
+            MusicMetadataDatabase._get_album_comparison_strings(album)
+        album_words = set()
+        for comparison_string in comparison_strings:
+            album_words.update(comparison_string.split())
+
+        with self.__lock:
+            shared_words_counts = dict()
+            for word in album_words:
+                for title in self.__titles_by_word.get(word, ()):
+                    shared_words_counts[title] = \
+                        shared_words_counts.get(title, 0) + 1
+
+            resolved_titles_count = 0
+            for title, shared_words_count in shared_words_counts.items():
+                normalized_title = self.__normalized_titles[title]
+                title_words_count = len(set(normalized_title.split()))
+                if shared_words_count < \
+                        MIN_SHARED_WORDS_RATIO * title_words_count:
+                    continue
+
+                probability = MusicMetadataDatabase._get_best_match_probability(
+                    normalized_title, comparison_strings
+                    )
+                if self.__resolve(title, album, probability):
+                    resolved_titles_count += 1
+            return resolved_titles_count
+
+    def resolve(self, title, album, probability):
+        """
+            Resolves a pending title to an album which was matched with it
+            elsewhere (unless the title is already resolved
+            to a more probable album).
+            Returns whether the title was newly resolved.
+        """
+        with self.__lock:
+            if title not in self.__normalized_titles:
+                return False
+            return self.__resolve(title, album, probability)
+
+    def __resolve(self, title, album, probability):
+        if probability <= self.__min_probability:
+            return False
+        resolved_album, resolved_probability = \
+            self.__resolved_titles.get(title, (None, 0))
+        if probability > resolved_probability:
+            self.__resolved_titles[title] = (album, probability)
+        return resolved_album is None
+
+    def pop_resolved_album(self, title):
+        """
+            Returns the (album, probability) which the given title
+            was resolved to, or None if it was not resolved.
+            The title is removed from the index.
+        """
+        self.remove(title)
+        with self.__lock:
+            return self.__resolved_titles.pop(title, None)
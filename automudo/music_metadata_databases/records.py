@@ -0,0 +1,314 @@
+"""
+    A compact binary format for files of MusicMetadata records.
+
+    The file is made of:
+    1. a header: magic, format version, records amount,
+       and the offsets of the strings table and of the records index
+    2. the records
+    3. the strings table - every string in the file is stored only once,
+       and the records refer to strings by their number in the table
+    4. the records index - the offset of each record
+
+    All integers are little-endian.
+    Dates are stored as ordinals and track durations as seconds.
+    Files are read through a memory map, and records (and their tracks)
+    are only decoded when they are accessed.
+
+    Version 2 widened the offsets of the strings to 64 bits,
+    as the strings of large files (such as of the Discogs dumps)
+    may take more than 4 GiB.
+"""
+import os
+import mmap
+import shutil
+import struct
+import datetime
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from .base import MusicMetadata, TrackMetadata
+from .serialization import duration_to_seconds, seconds_to_duration
+
+MAGIC = b"AMMR"
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct("<4sHIQQ")
+RECORD_FIXED_PART = struct.Struct("<IIIBqi")
+LIST_LENGTH = struct.Struct("<H")
+STRING_ID = struct.Struct("<I")
+TRACKS_AMOUNT = struct.Struct("<I")
+TRACK = struct.Struct("<Ii")
+STRING_OFFSET = struct.Struct("<Q")
+STRING_BOUNDS = struct.Struct("<QQ")
+RECORD_OFFSET = struct.Struct("<Q")
+
+NO_LIST = 0xFFFF
+NO_DURATION = -1
+NO_DATE = 0
+
+RELEASE_ID_NONE = 0
+RELEASE_ID_INT = 1
+RELEASE_ID_STRING = 2
+
+# The amount of decoded strings which a records file keeps.
+DECODED_STRINGS_CACHE_SIZE = 100000
+
+
+def write_music_metadata_records(path, albums):
+    """
+        Writes the given MusicMetadata records into a records file.
+        The records are written as they are read from the given iterable.
+        The strings and the offsets of the records are written into
+        temporary files (next to the records file) until the records end,
+        so only the identifiers of the strings are kept in memory.
+
+        Returns:
+            The amount of written records.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    string_ids = dict()
+    records_amount = 0
+
+    with open(path, "wb") as records_file, \
+            tempfile.TemporaryFile(dir=directory) as strings_file, \
+            tempfile.TemporaryFile(dir=directory) as string_offsets_file, \
+            tempfile.TemporaryFile(dir=directory) as record_offsets_file:
+        def intern(string):
+            string_id = string_ids.get(string)
+            if string_id is None:
+                string_id = string_ids[string] = len(string_ids)
+                string_offsets_file.write(
+                    STRING_OFFSET.pack(strings_file.tell())
+                    )
+                strings_file.write(string.encode("utf-8"))
+            return string_id
+
+        def encode_strings_list(strings):
+            if strings is None:
+                return LIST_LENGTH.pack(NO_LIST)
+            return LIST_LENGTH.pack(len(strings)) + b"".join(
+                STRING_ID.pack(intern(s)) for s in strings
+                )
+
+        records_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+
+        for album in albums:
+            if album.release_id is None:
+                release_id_type, release_id = RELEASE_ID_NONE, 0
+            elif isinstance(album.release_id, int):
+                release_id_type, release_id = RELEASE_ID_INT, album.release_id
+            else:
+                release_id_type = RELEASE_ID_STRING
+                release_id = intern(str(album.release_id))
+
+            record = bytearray(RECORD_FIXED_PART.pack(
+                intern(album.artist), intern(album.title),
+                intern(album.metadata_database_name),
+                release_id_type, release_id,
+                album.date.toordinal() if album.date else NO_DATE
+                ))
+            record += encode_strings_list(album.genres)
+            record += encode_strings_list(album.formats)
+            record += TRACKS_AMOUNT.pack(len(album.tracks))
+            for track in album.tracks:
+                record += TRACK.pack(
+                    intern(track.title),
+                    (NO_DURATION if track.duration is None
+                     else duration_to_seconds(track.duration))
+                    )
+
+            record_offsets_file.write(RECORD_OFFSET.pack(records_file.tell()))
+            records_file.write(record)
+            records_amount += 1
+
+        strings_offset = records_file.tell()
+        records_file.write(STRING_ID.pack(len(string_ids)))
+        string_offsets_file.write(STRING_OFFSET.pack(strings_file.tell()))
+        for temporary_file in [string_offsets_file, strings_file]:
+            temporary_file.seek(0)
+            shutil.copyfileobj(temporary_file, records_file)
+
+        index_offset = records_file.tell()
+        record_offsets_file.seek(0)
+        shutil.copyfileobj(record_offsets_file, records_file)
+
+        records_file.seek(0)
+        records_file.write(HEADER.pack(MAGIC, FORMAT_VERSION,
+                                       records_amount,
+                                       strings_offset, index_offset))
+    return records_amount
+
+
+class LazyTracks(Sequence):
+    """
+        The tracks of a record in a records file.
+        Each track is decoded only when it is accessed.
+    """
+
+    def __init__(self, records_file, tracks_offset, tracks_amount):
+        self.__records_file = records_file
+        self.__tracks_offset = tracks_offset
+        self.__tracks_amount = tracks_amount
+
+    def __len__(self):
+        return self.__tracks_amount
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += self.__tracks_amount
+        if not 0 <= index < self.__tracks_amount:
+            raise IndexError("track index out of range")
+
+        title_id, duration = self.__records_file._unpack(
+            TRACK, self.__tracks_offset + index * TRACK.size
+            )
+        return TrackMetadata(
+            title=self.__records_file._get_string(title_id),
+            duration=(None if duration == NO_DURATION
+                      else seconds_to_duration(duration))
+            )
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class MusicMetadataRecordsFile(Sequence):
+    """
+        A read-only sequence of the MusicMetadata records in a records file.
+        The file is memory-mapped, so opening it is immediate
+        regardless of its size.
+    """
+
+    def __init__(self, path):
+        """
+            Opens the records file in the given path.
+
+            Raises:
+                ValueError - the file is not a records file
+                             or is of an unsupported version.
+        """
+        with open(path, "rb") as records_file:
+            self.__map = mmap.mmap(records_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+
+        (magic, version, self.__records_amount,
+         strings_offset, self.__index_offset) = self._unpack(HEADER, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a music metadata records file: " + path)
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(
+                "Unsupported music metadata records file version: {}".format(
+                    version
+                    ))
+
+        strings_amount, = self._unpack(STRING_ID, strings_offset)
+        self.__string_offsets_offset = strings_offset + STRING_ID.size
+        self.__strings_data_offset = (self.__string_offsets_offset +
+                                      (strings_amount + 1) *
+                                      STRING_OFFSET.size)
+        # The recently decoded strings (string-id -> string).
+        self.__strings = OrderedDict()
+        self.__strings_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_details):
+        self.close()
+
+    def close(self):
+        """
+            Closes the records file.
+            Records which were read from it should no longer be used.
+        """
+        self.__map.close()
+
+    def __len__(self):
+        return self.__records_amount
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += self.__records_amount
+        if not 0 <= index < self.__records_amount:
+            raise IndexError("record index out of range")
+
+        offset, = self._unpack(
+            RECORD_OFFSET, self.__index_offset + index * RECORD_OFFSET.size
+            )
+        (artist_id, title_id, database_name_id,
+         release_id_type, release_id, date) = self._unpack(
+             RECORD_FIXED_PART, offset
+             )
+        offset += RECORD_FIXED_PART.size
+
+        if release_id_type == RELEASE_ID_NONE:
+            release_id = None
+        elif release_id_type == RELEASE_ID_STRING:
+            release_id = self._get_string(release_id)
+
+        genres, offset = self._read_strings_list(offset)
+        formats, offset = self._read_strings_list(offset)
+        tracks_amount, = self._unpack(TRACKS_AMOUNT, offset)
+
+        return MusicMetadata(
+            artist=self._get_string(artist_id),
+            title=self._get_string(title_id),
+            genres=genres,
+            date=(None if date == NO_DATE
+                  else datetime.date.fromordinal(date)),
+            formats=formats,
+            release_id=release_id,
+            metadata_database_name=self._get_string(database_name_id),
+            tracks=LazyTracks(self, offset + TRACKS_AMOUNT.size,
+                              tracks_amount)
+            )
+
+    def _unpack(self, struct_format, offset):
+        return struct_format.unpack_from(self.__map, offset)
+
+    def _get_string(self, string_id):
+        """
+            Returns the string with the given number in the strings table.
+            The last DECODED_STRINGS_CACHE_SIZE strings which were
+            decoded are kept, as the same strings (such as artists
+            and formats) repeat in many records.
+        """
+        with self.__strings_lock:
+            string = self.__strings.get(string_id)
+            if string is not None:
+                self.__strings.move_to_end(string_id)
+                return string
+
+        start, end = self._unpack(
+            STRING_BOUNDS,
+            self.__string_offsets_offset + string_id * STRING_OFFSET.size
+            )
+        string = self.__map[self.__strings_data_offset + start:
+                            self.__strings_data_offset + end].decode("utf-8")
+        with self.__strings_lock:
+            self.__strings[string_id] = string
+            if len(self.__strings) > DECODED_STRINGS_CACHE_SIZE:
+                self.__strings.popitem(last=False)
+        return string
+
+    def _read_strings_list(self, offset):
+        """
+            Reads a list of strings from the given offset.
+            Returns a tuple: (list-of-strings, offset-after-the-list).
+        """
+        length, = self._unpack(LIST_LENGTH, offset)
+        offset += LIST_LENGTH.size
+        if length == NO_LIST:
+            return (None, offset)
+        string_ids = struct.unpack_from("<{}I".format(length),
+                                        self.__map, offset)
+        return ([self._get_string(i) for i in string_ids],
+                offset + length * STRING_ID.size)
@@ -0,0 +1,148 @@
+import os
+import json
+import threading
+
+from .base import MusicMetadataDatabase
+from .serialization import music_metadata_to_dict, music_metadata_from_dict
+
+
+class ResolutionCache(object):
+    """
+        A persistent cache of the albums which titles were resolved to,
+        so that titles which are handled again (for example, when their
+        torrents were not found, or were deleted) go straight
+        to the tracker, without looking for their albums again.
+
+        Titles are cached by their normalized form, and only the
+        resolutions of the given metadata database are used.
+        The resolutions (and their invalidations) are appended to
+        a JSON-lines file, so several processes (see the worker mode)
+        may record them together. The last line of a title wins.
+    """
+
+    def __init__(self, cache_path, metadata_database_name):
+        """
+            Initializes the ResolutionCache object,
+            loading the cache file if it exists.
+        """
+        self.__cache_path = cache_path
+        self.__metadata_database_name = metadata_database_name
+        self.__lock = threading.Lock()
+        # normalized title -> (title, album dictionary, probability).
+        # The albums are converted into MusicMetadata only when used.
+        self.__resolutions = dict()
+
+        try:
+            with open(cache_path, "r", encoding="utf-8") as cache_file:
+                for line in cache_file:
+                    try:
+                        resolution = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut by an interrupted run.
+                    if resolution['metadata-database-name'] != \
+                            metadata_database_name:
+                        continue
+                    self.__add_to_memory(resolution)
+        except IOError:
+            pass  # The cache file does not exist.
+
+    def __add_to_memory(self, resolution):
+        if resolution['album'] is None:
+            self.__resolutions.pop(resolution['normalized-title'], None)
+        else:
+            self.__resolutions[resolution['normalized-title']] = (
+                resolution['title'], resolution['album'],
+                resolution['probability']
+                )
+
+    def __append(self, resolutions):
+        # The caller holds the lock.
+        os.makedirs(os.path.dirname(self.__cache_path), exist_ok=True)
+        with open(self.__cache_path, "a", encoding="utf-8") as cache_file:
+            for resolution in resolutions:
+                self.__add_to_memory(resolution)
+                cache_file.write(json.dumps(resolution,
+                                            ensure_ascii=False) + "\n")
+
+    def __build_resolution(self, normalized_title, title,
+                           album_dict=None, probability=None):
+        return {'metadata-database-name': self.__metadata_database_name,
+                'normalized-title': normalized_title,
+                'title': title,
+                'album': album_dict,
+                'probability': probability}
+
+    def __contains__(self, title):
+        normalized_title = \
+            MusicMetadataDatabase.normalize_music_description(title)
+        with self.__lock:
+            return normalized_title in self.__resolutions
+
+    def get(self, title):
+        """
+            Returns the (album, probability) which the given title
+            (or a title with the same normalized form) was resolved to,
+            or None if it is not cached.
+        """
+        normalized_title = \
+            MusicMetadataDatabase.normalize_music_description(title)
+        with self.__lock:
+            resolution = self.__resolutions.get(normalized_title)
+        if resolution is None:
+            return None
+        _, album_dict, probability = resolution
+        return (music_metadata_from_dict(album_dict), probability)
+
+    def titles(self):
+        """
+            Returns a list of the cached titles
+            (the title which each resolution was recorded for).
+        """
+        with self.__lock:
+            return [title for title, _, _ in self.__resolutions.values()]
+
+    def add(self, title, album, probability):
+        """
+            Records the album (and the match probability)
+            which the given title was resolved to.
+        """
+        normalized_title = \
+            MusicMetadataDatabase.normalize_music_description(title)
+        with self.__lock:
+            self.__append([self.__build_resolution(
+                normalized_title, title,
+                music_metadata_to_dict(album), probability
+                )])
+
+    def invalidate(self, title):
+        """
+            Forgets the resolution of the given title
+            (and of the titles with the same normalized form),
+            so that its album is looked up again.
+            Returns whether the title was cached.
+        """
+        normalized_title = \
+            MusicMetadataDatabase.normalize_music_description(title)
+        with self.__lock:
+            if normalized_title not in self.__resolutions:
+                return False
+            self.__append([self.__build_resolution(normalized_title, title)])
+            return True
+
+    def invalidate_release(self, release_id):
+        """
+            Forgets the resolutions of all of the titles
+            which were resolved to the given release
+            (for example, when it turns out to be a wrong match).
+            Returns the amount of the forgotten titles.
+        """
+        with self.__lock:
+            resolutions = [
+                self.__build_resolution(normalized_title, title)
+                for normalized_title, (title, album_dict, _)
+                in self.__resolutions.items()
+                if str(album_dict['release_id']) == str(release_id)
+                ]
+            if resolutions:
+                self.__append(resolutions)
+            return len(resolutions)
@@ -0,0 +1,58 @@
+"""
+    Conversions of MusicMetadata to and from JSON-compatible dictionaries,
+    and of track durations to and from seconds.
+"""
+import datetime
+
+from .base import MusicMetadata, TrackMetadata
+
+
+def duration_to_seconds(duration):
+    """
+        Converts a track duration (a datetime.time) into seconds.
+    """
+    return (duration.hour * 60 + duration.minute) * 60 + duration.second
+
+
+def seconds_to_duration(seconds):
+    """
+        Converts seconds into a track duration (a datetime.time).
+    """
+    return datetime.time(hour=seconds // 3600,
+                         minute=(seconds // 60) % 60,
+                         second=seconds % 60)
+
+
+def music_metadata_to_dict(album):
+    """
+        Converts a MusicMetadata into a JSON-compatible dictionary.
+        Dates are kept as ISO strings and track durations as seconds.
+    """
+    album_dict = album._asdict()
+    album_dict['date'] = album.date.isoformat() if album.date else None
+    album_dict['tracks'] = [
+        [track.title,
+         None if track.duration is None else
+         duration_to_seconds(track.duration)]
+        for track in album.tracks
+        ]
+    return album_dict
+
+
+def music_metadata_from_dict(album_dict):
+    """
+        Converts a dictionary created by music_metadata_to_dict
+        back into a MusicMetadata.
+    """
+    album_dict = dict(album_dict)
+    if album_dict['date']:
+        album_dict['date'] = datetime.date(
+            *map(int, album_dict['date'].split("-"))
+            )
+    album_dict['tracks'] = [
+        TrackMetadata(title=title,
+                      duration=(None if duration is None
+                                else seconds_to_duration(duration)))
+        for title, duration in album_dict['tracks']
+        ]
+    return MusicMetadata(**album_dict)
@@ -0,0 +1,255 @@
+"""
+    Estimation of the requests and of the time that a run will take,
+    before running it.
+"""
+import time
+from collections import Counter, namedtuple
+
+from .music_metadata_databases.base import MusicMetadataDatabase
+from .utils import http
+
+# The typical amount of tracker searches of an album: the "artist title"
+# search, and sometimes the "artist" "title" search as well
+# (discographies are rarely needed).
+TRACKER_SEARCHES_PER_ALBUM = 1.5
+# The info-hashes of the magnets_file output format are resolved
+# in batches of this size.
+MAGNET_LINKS_PER_REQUEST = 100
+# The typical amount of seconds that a request takes
+# (when it is not slowed down by a rate limit).
+REQUEST_SECONDS = 1
+
+# The estimated amounts of requests of a single title.
+# They are fractional, since requests which several titles share
+# (such as the listing of an artist's albums) are divided among them.
+TitlePlan = namedtuple(
+    "TitlePlan",
+    ["title", "metadata_searches", "detail_fetches",
+     "tracker_searches", "downloads"]
+    )
+RunPlan = namedtuple(
+    "RunPlan",
+    ["titles", "metadata_searches", "detail_fetches",
+     "tracker_searches", "downloads", "requests", "seconds"]
+    )
+
+
+class RunPlanner(object):
+    """
+        Estimates the requests and the time that handling titles will take,
+        by the costs and the rate limits of the metadata database
+        and of the tracker, and chooses the titles which fit in a budget.
+    """
+
+    def __init__(self, metadata_database, tracker, output_format="torrent"):
+        """
+            Initializes the RunPlanner object.
+
+            Parameters:
+                metadata_database - the MusicMetadataDatabase of the run
+                tracker - the Tracker of the run
+                output_format - optional. the output format of the torrents
+                                (see download_album_torrent)
+        """
+        self.__metadata_database = metadata_database
+        self.__metadata_seconds = max(
+            REQUEST_SECONDS, metadata_database.REQUEST_INTERVAL_SECONDS
+            )
+        self.__search_seconds = max(REQUEST_SECONDS,
+                                    tracker.get_search_interval_seconds())
+        self.__requests_per_download = 1
+        if output_format == "magnets_file":
+            self.__requests_per_download = 1 / MAGNET_LINKS_PER_REQUEST
+
+    def plan_titles(self, titles, get_artist=None, min_artist_titles=2,
+                    resolved_titles=None, get_known_torrents=None,
+                    downloaded_torrents=None):
+        """
+            Estimates the requests of each of the given titles.
+
+            Parameters:
+                titles - the titles to handle
+                get_artist - optional. a function which returns the
+                             probable artist of a title (or None),
+                             for titles which are looked up together
+                             with the other titles of their artist
+                min_artist_titles - optional. the minimal amount of titles
+                                    of an artist which are looked up together
+                resolved_titles - optional. titles whose albums are
+                                  already known (see ResolutionCache),
+                                  which are not looked up at all
+                get_known_torrents - optional. a function which returns
+                                     the torrents of a title which are
+                                     found without searching the tracker
+                                     (see Tracker.find_catalog_torrents),
+                                     or an empty list
+                downloaded_torrents - optional. the DownloadedTorrentsIndex,
+                                      whose torrents are not downloaded
+                                      again
+
+            Returns:
+                a list of the TitlePlan-s of the titles.
+        """
+        database = self.__metadata_database
+        titles = list(titles)
+        resolved_titles = resolved_titles or frozenset()
+        titles_by_artist = dict()
+        if get_artist is not None and \
+                database.ARTIST_LOOKUP_REQUESTS is not None:
+            for title in titles:
+                if title in resolved_titles:
+                    continue
+                artist = get_artist(title)
+                if artist is not None:
+                    titles_by_artist.setdefault(artist, []).append(title)
+
+        # Titles with the same normalized form share a single lookup
+        # and a single download.
+        similar_titles_counts = Counter(
+            MusicMetadataDatabase.normalize_music_description(title)
+            for title in titles
+            )
+
+        title_plans = []
+        for title in titles:
+            similar_titles_count = similar_titles_counts[
+                MusicMetadataDatabase.normalize_music_description(title)
+                ]
+            artist_titles = titles_by_artist.get(
+                get_artist(title) if titles_by_artist else None, ()
+                )
+            if title in resolved_titles:
+                metadata_searches = detail_fetches = 0
+            elif len(artist_titles) >= min_artist_titles:
+                # The artist's albums are listed once for all of its titles,
+                # and only the details of the matching album are fetched.
+                metadata_searches = \
+                    database.ARTIST_LOOKUP_REQUESTS / len(artist_titles)
+                detail_fetches = 1
+            else:
+                metadata_searches = database.ALBUM_LOOKUP_SEARCHES
+                detail_fetches = database.ALBUM_LOOKUP_DETAIL_FETCHES
+
+            tracker_searches = TRACKER_SEARCHES_PER_ALBUM
+            downloads = 1
+            known_torrents = []
+            if get_known_torrents is not None:
+                known_torrents = get_known_torrents(title)
+            if known_torrents:
+                # The search is answered by the torrents catalog,
+                # and the best torrent may have been downloaded already.
+                tracker_searches = 0
+                best_torrent = max(known_torrents, key=lambda t: t.seeders)
+                if downloaded_torrents is not None and \
+                        downloaded_torrents.find_by_torrent_id(
+                            best_torrent.tracker_name,
+                            best_torrent.torrent_id) is not None:
+                    downloads = 0
+            title_plans.append(TitlePlan(
+                title,
+                metadata_searches / similar_titles_count,
+                detail_fetches / similar_titles_count,
+                tracker_searches / similar_titles_count,
+                downloads / similar_titles_count
+                ))
+        return title_plans
+
+    def get_requests(self, title_plan):
+        """
+            Returns the estimated amount of requests of a title
+            (or of a RunPlan).
+        """
+        return (title_plan.metadata_searches + title_plan.detail_fetches +
+                title_plan.tracker_searches +
+                title_plan.downloads * self.__requests_per_download)
+
+    def get_seconds(self, title_plan):
+        """
+            Returns the estimated amount of seconds of a title
+            (or of a RunPlan), including the waits for the rate limits.
+        """
+        return ((title_plan.metadata_searches + title_plan.detail_fetches) *
+                self.__metadata_seconds +
+                title_plan.tracker_searches * self.__search_seconds +
+                title_plan.downloads * self.__requests_per_download *
+                REQUEST_SECONDS)
+
+    def summarize(self, title_plans):
+        """
+            Returns the RunPlan of handling all of the given titles.
+        """
+        total = TitlePlan(
+            title=None,
+            metadata_searches=sum(p.metadata_searches for p in title_plans),
+            detail_fetches=sum(p.detail_fetches for p in title_plans),
+            tracker_searches=sum(p.tracker_searches for p in title_plans),
+            downloads=sum(p.downloads for p in title_plans)
+            )
+        return RunPlan(
+            titles=len(title_plans),
+            metadata_searches=total.metadata_searches,
+            detail_fetches=total.detail_fetches,
+            tracker_searches=total.tracker_searches,
+            downloads=total.downloads,
+            requests=self.get_requests(total),
+            seconds=self.get_seconds(total)
+            )
+
+    def select_titles(self, title_plans,
+                      max_requests=None, time_budget_seconds=None):
+        """
+            Chooses the highest-value titles which fit in the given budget.
+            The titles are taken in the given order (from the highest
+            value to the lowest, see TitleScheduler), and titles which
+            do not fit in the rest of the budget are passed over.
+            The estimates may be off, so the run itself enforces
+            the budget as well (see RunBudget).
+            Returns the TitlePlan-s of the chosen titles, in their order.
+        """
+        chosen_title_plans = []
+        total_requests = total_seconds = 0
+        for title_plan in title_plans:
+            title_requests = self.get_requests(title_plan)
+            title_seconds = self.get_seconds(title_plan)
+            if (max_requests is not None and
+                    total_requests + title_requests > max_requests) or \
+                    (time_budget_seconds is not None and
+                     total_seconds + title_seconds > time_budget_seconds):
+                continue
+            total_requests += title_requests
+            total_seconds += title_seconds
+            chosen_title_plans.append(title_plan)
+        return chosen_title_plans
+
+
+class RunBudget(object):
+    """
+        Enforces the budget of a run by the requests it has actually sent
+        (see http.get_sent_requests_count) and the time that has passed
+        since it began. The titles are chosen by estimates
+        (see RunPlanner.select_titles), so a run whose titles cost more
+        than estimated stops when its budget is used up.
+    """
+
+    def __init__(self, max_requests=None, time_budget_seconds=None):
+        """
+            Initializes the RunBudget object, beginning the run.
+            Without limits, the budget is never used up.
+        """
+        self.__max_requests = max_requests
+        self.__time_budget_seconds = time_budget_seconds
+        self.__start_requests_count = http.get_sent_requests_count()
+        self.__start_time = time.monotonic()
+
+    def is_used_up(self):
+        """
+            Checks if the run has sent max_requests requests,
+            or has taken time_budget_seconds.
+        """
+        if self.__max_requests is not None and \
+                http.get_sent_requests_count() - \
+                self.__start_requests_count >= self.__max_requests:
+            return True
+        return (self.__time_budget_seconds is not None and
+                time.monotonic() - self.__start_time >=
+                self.__time_budget_seconds)
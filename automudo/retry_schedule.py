@@ -0,0 +1,140 @@
+import os
+import csv
+import time
+import zlib
+import random
+import threading
+
+# Titles without matches are searched again after this amount of days,
+# which doubles after each failed attempt, up to the maximum.
+INITIAL_RETRY_DELAY_DAYS = 7
+MAX_RETRY_DELAY_DAYS = 180
+# The delays of the titles are spread by up to this part of them,
+# so that titles which failed together are not all searched together.
+RETRY_DELAY_SPREAD = 0.2
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class RetrySchedule(object):
+    """
+        A persistent schedule of the titles which had no matching albums
+        or torrents, so that they are searched again with exponential
+        backoff instead of never (albums are added to the trackers
+        all the time) or in every run (which would flood the sites).
+
+        The failed attempts are appended to a CSV file, so several
+        processes (see the worker mode) may record them together.
+    """
+
+    FIELDS = ['title', 'attempt-time']
+
+    def __init__(self, schedule_path):
+        """
+            Initializes the RetrySchedule object,
+            loading the schedule file if it exists.
+        """
+        self.__schedule_path = schedule_path
+        self.__lock = threading.Lock()
+        # title -> (failed attempts, last attempt time)
+        self.__attempts = dict()
+
+        try:
+            with open(schedule_path, "r",
+                      encoding="utf-8", newline="") as schedule_file:
+                for row in csv.DictReader(schedule_file):
+                    self.__add_to_memory(row['title'],
+                                         float(row['attempt-time']))
+        except IOError:
+            pass  # The schedule file does not exist.
+
+    def __add_to_memory(self, title, attempt_time):
+        attempts, last_attempt_time = self.__attempts.get(title, (0, 0))
+        self.__attempts[title] = (attempts + 1,
+                                  max(attempt_time, last_attempt_time))
+
+    def __append_attempts(self, titles_attempt_times):
+        file_existed = os.path.exists(self.__schedule_path)
+        with open(self.__schedule_path, "a",
+                  encoding="utf-8", newline="") as schedule_file:
+            schedule_file_writer = csv.DictWriter(schedule_file, self.FIELDS)
+            if not file_existed:
+                schedule_file_writer.writeheader()
+            for title, attempt_time in titles_attempt_times:
+                schedule_file_writer.writerow({'title': title,
+                                               'attempt-time': attempt_time})
+
+    def get_failed_attempts(self, title):
+        """
+            Returns the amount of failed attempts of the given title.
+        """
+        with self.__lock:
+            return self.__attempts.get(title, (0, 0))[0]
+
+    def get_failed_attempts_counts(self):
+        """
+            Returns a dictionary of title -> the amount of its failed attempts.
+        """
+        with self.__lock:
+            return {title: attempts
+                    for title, (attempts, _) in self.__attempts.items()}
+
+    def get_next_attempt_time(self, title):
+        """
+            Returns the time (in seconds since the epoch) after which
+            the given title should be searched again,
+            or None if it has no failed attempts.
+        """
+        with self.__lock:
+            attempts, last_attempt_time = self.__attempts.get(title, (0, 0))
+        if not attempts:
+            return None
+
+        delay_days = min(MAX_RETRY_DELAY_DAYS,
+                         INITIAL_RETRY_DELAY_DAYS * 2 ** (attempts - 1))
+        # A stable spread for each title (unlike hash(),
+        # which changes between runs).
+        spread = (zlib.crc32(title.encode("utf-8")) / 0xffffffff * 2 - 1) * \
+            RETRY_DELAY_SPREAD
+        return last_attempt_time + delay_days * (1 + spread) * SECONDS_PER_DAY
+
+    def is_due(self, title, now=None):
+        """
+            Checks if the given title should be searched
+            (either it has no failed attempts, or it is time to retry it).
+        """
+        next_attempt_time = self.get_next_attempt_time(title)
+        if next_attempt_time is None:
+            return True
+        if now is None:
+            now = time.time()
+        return now >= next_attempt_time
+
+    def add_failed_attempt(self, title):
+        """
+            Records a failed attempt of the given title.
+        """
+        attempt_time = time.time()
+        with self.__lock:
+            self.__add_to_memory(title, attempt_time)
+            self.__append_attempts([(title, attempt_time)])
+
+    def add_unscheduled_titles(self, titles):
+        """
+            Schedules titles which had no matches before the schedule
+            was kept, as if they failed once in the last retry delay,
+            so that they are not all searched again in the same run.
+        """
+        now = time.time()
+        with self.__lock:
+            titles_attempt_times = [
+                (title,
+                 now - random.uniform(0, INITIAL_RETRY_DELAY_DAYS) *
+                 SECONDS_PER_DAY)
+                for title in titles if title not in self.__attempts
+                ]
+            if not titles_attempt_times:
+                return
+            for title, attempt_time in titles_attempt_times:
+                self.__add_to_memory(title, attempt_time)
+            self.__append_attempts(titles_attempt_times)
@@ -0,0 +1,96 @@
+"""
+    Ordering of the titles of a run, so that the most valuable work
+    (cheap titles which are likely to succeed) is done first.
+"""
+import time
+import heapq
+
+# The estimated probability of finding an album for a title,
+# which is higher for titles of the form "artist - title".
+BASE_SUCCESS_PROBABILITY = 0.5
+ARTIST_TITLE_SUCCESS_PROBABILITY = 0.7
+# Each failed attempt of a title multiplies its success probability by this.
+FAILED_ATTEMPT_SUCCESS_FACTOR = 0.5
+# Newly added bookmarks are worth up to this much more than old ones.
+# The bonus halves every given amount of days.
+NEW_BOOKMARK_BONUS = 1.0
+NEW_BOOKMARK_BONUS_HALF_LIFE_DAYS = 30
+# Added to the estimated seconds of every title, so that titles
+# which cost nothing are still ordered by their value.
+MIN_TITLE_SECONDS = 1
+
+
+class TitleScheduler(object):
+    """
+        Orders titles by their priority: their estimated value
+        (success probability, boosted for new bookmarks)
+        divided by their estimated cost (see RunPlanner).
+        Titles of artists with many pending titles are cheaper,
+        since the artist's albums are listed once for all of them.
+    """
+
+    def __init__(self, planner, get_artist=None,
+                 added_times=None, failed_attempts=None):
+        """
+            Initializes the TitleScheduler object.
+
+            Parameters:
+                planner - the RunPlanner which estimates the titles' costs
+                get_artist - optional. a function which returns the
+                             probable artist of a title (or None)
+                added_times - optional. a dictionary of title -> the time
+                              its bookmark was added (see
+                              Browser.get_music_bookmarks_added_times)
+                failed_attempts - optional. a dictionary of title ->
+                                  the amount of its past failed attempts
+        """
+        self.__planner = planner
+        self.__get_artist = get_artist
+        self.__added_times = added_times or dict()
+        self.__failed_attempts = failed_attempts or dict()
+
+    def get_success_probability(self, title):
+        """
+            Returns the estimated probability of downloading an album
+            for the title.
+        """
+        success_probability = BASE_SUCCESS_PROBABILITY
+        if self.__get_artist is not None and \
+                self.__get_artist(title) is not None:
+            success_probability = ARTIST_TITLE_SUCCESS_PROBABILITY
+        return success_probability * (
+            FAILED_ATTEMPT_SUCCESS_FACTOR **
+            self.__failed_attempts.get(title, 0)
+            )
+
+    def get_priority(self, title_plan, now=None):
+        """
+            Returns the priority of a title (of its TitlePlan).
+            Titles with higher priorities should be handled first.
+        """
+        if now is None:
+            now = time.time()
+        value = self.get_success_probability(title_plan.title)
+        added_time = self.__added_times.get(title_plan.title)
+        if added_time is not None:
+            age_days = max(0, now - added_time) / (24 * 60 * 60)
+            value *= 1 + NEW_BOOKMARK_BONUS * 0.5 ** (
+                age_days / NEW_BOOKMARK_BONUS_HALF_LIFE_DAYS
+                )
+        return value / (MIN_TITLE_SECONDS +
+                        self.__planner.get_seconds(title_plan))
+
+    def schedule(self, title_plans):
+        """
+            Returns an iterator of the given TitlePlan-s,
+            from the highest priority to the lowest.
+            The titles are taken out of a heap one at a time,
+            so taking only the first titles is cheap.
+        """
+        now = time.time()
+        # The index breaks ties by the original order.
+        heap = [(-self.get_priority(title_plan, now), index, title_plan)
+                for index, title_plan in enumerate(title_plans)]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[-1]
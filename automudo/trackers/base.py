@@ -1,11 +1,13 @@
-import re
-import math
 import difflib
 from collections import namedtuple
 
 import requests
 
 from automudo.music_metadata_databases.base import MusicMetadataDatabase
+from automudo.utils import http
+from automudo.utils.aio import run_sync, run_blocking
+from .scoring import TorrentScorer
+from .title_classification import classify_title
 
 
 class TrackerLoginError(Exception):
@@ -32,59 +34,84 @@ class Tracker(object):
     # When inheriting this class, you should define a module-level
     # constant named "name", containing the tracker's name
 
-    def __init__(self, user_agent=None):
+    def __init__(self, user_agent=None,
+                 torrents_catalog=None, torrents_catalog_max_age_days=None,
+                 scoring_weights=None):
         """
         Initializes the Tracker object.
         The user_agent parameter will be the user agent
         provided in HTTP requests to the tracker.
+
+        The optional torrents_catalog (a TorrentsCatalog) is updated with
+        every torrent seen in the tracker. If torrents_catalog_max_age_days
+        is set too, searches are answered from the catalog first,
+        using torrents which were seen in the last given amount of days.
+
+        The optional scoring_weights override the weights used
+        for choosing the best torrents (see TorrentScorer).
         """
         if not user_agent:
             raise ValueError("user-agent not specified")
 
         self.__session = requests.Session()
         self.__http_headers = {'User-Agent': user_agent}
+        self.__torrents_catalog = torrents_catalog
+        self.__torrents_catalog_max_age_days = torrents_catalog_max_age_days
+        self.__scorer = TorrentScorer(
+            scoring_weights, category_scorer=self._get_torrent_category_score
+            )
 
-    def find_best_torrent_by_keywords(self,
-                                      *args,
+    def find_best_torrent_by_keywords(self, keywords, *args,
                                       look_for_discography=False,
                                       **kwargs):
-        torrents = self.find_torrents_by_keywords(*args, **kwargs)
-        if torrents is None:
-            return None
-
-        torrents = list(torrents)
-        if not torrents:
+        """
+        Finds the best torrent matching the keywords.
+        Returns its TorrentDetails, or None if there are no matching torrents.
+        """
+        best_torrents = self.find_ranked_torrents_by_keywords(
+            keywords, *args, max_results=1,
+            look_for_discography=look_for_discography, **kwargs
+            )
+        if not best_torrents:
             return None
+        return best_torrents[0].torrent
 
-        if look_for_discography:
-            filters = [
-                self._filter_by_seeders_amount,
-                self._filter_higher_sized_torrents
-                ]
-        else:
-            filters = [
-                self._filter_lower_sized_torrents,
-                self._filter_by_seeders_amount
-            ]
-        while filters and len(torrents) > 1:
-            filtered_torrents = list(filters[0](torrents))
-            del filters[0]
-
-            if len(filtered_torrents) > 0:
-                # There are torrents that passed the filter.
-                torrents = filtered_torrents
-
-        return torrents[0]
+    def find_ranked_torrents_by_keywords(self, keywords, *args,
+                                         max_results=5,
+                                         look_for_discography=False,
+                                         **kwargs):
+        """
+        Finds the best torrents matching the keywords.
+        Returns a list of up to max_results ScoredTorrent-s, best first,
+        including the breakdown of each torrent's score.
+        """
+        torrents = self.find_torrents_by_keywords(keywords, *args, **kwargs)
+        if torrents is None:
+            return []
+        return self.__scorer.select_best_torrents(
+            torrents, keywords, max_results=max_results,
+            look_for_discography=look_for_discography
+            )
 
-    def find_torrents_by_keywords(self, keywords,
-                                  allow_fancy_releases=False,
-                                  allow_remasters=False,
-                                  **kwargs):
+    def find_torrents_by_keywords(self, *args, **kwargs):
         """
         Finds torrents given a keywords list
         and returns their identifiers in the tracker.
+        A synchronous wrapper of find_torrents_by_keywords_async.
+        """
+        return iter(run_sync(self.find_torrents_by_keywords_async(
+            *args, **kwargs
+            )))
+
+    async def find_torrents_by_keywords_async(self, keywords,
+                                              allow_fancy_releases=False,
+                                              allow_remasters=False,
+                                              **kwargs):
+        """
+        Finds torrents given a keywords list
+        and returns a list of their TorrentDetails.
         """
-        torrents = self._find_torrents_by_keywords(
+        torrents = await self._find_torrents_by_keywords_async(
             keywords, allow_fancy_releases=allow_fancy_releases, **kwargs
             )
         if not allow_fancy_releases:
@@ -92,7 +119,7 @@ class Tracker(object):
         if not allow_remasters:
             torrents = self._filter_non_remasters_torrents(torrents)
         torrents = self._filter_accurate_torrents(torrents, keywords)
-        return torrents
+        return list(torrents)
 
     def find_best_discography_torrent(self, artist, *args, **kwargs):
         """
@@ -101,12 +128,72 @@ class Tracker(object):
         """
         raise NotImplementedError()
 
-    def get_torrent_file_contents(self, torrent_id):
+    def get_torrent_file_contents(self, torrent_id, tracker_name=None):
+        """
+        Returns the contents of the torrent file with the given identifier.
+        A synchronous wrapper of get_torrent_file_contents_async.
+        """
+        return run_sync(self.get_torrent_file_contents_async(
+            torrent_id, tracker_name=tracker_name
+            ))
+
+    async def get_torrent_file_contents_async(self, torrent_id,
+                                              tracker_name=None):
         """
         Returns the contents of the torrent file with the given identifier.
+        The tracker_name (the TorrentDetails.tracker_name of the torrent)
+        is needed only by trackers which combine several trackers,
+        in which torrents of different trackers may have the same
+        identifier.
+        """
+        raise NotImplementedError()
+
+    def get_torrents_info_hashes(self, torrent_ids, tracker_name=None):
+        """
+        Returns the info-hashes of the torrents with the given identifiers.
+        A synchronous wrapper of get_torrents_info_hashes_async.
+        """
+        return run_sync(self.get_torrents_info_hashes_async(
+            torrent_ids, tracker_name=tracker_name
+            ))
+
+    async def get_torrents_info_hashes_async(self, torrent_ids,
+                                             tracker_name=None):
+        """
+        Returns the info-hashes (hex strings) of the torrents with
+        the given identifiers, without downloading their torrent files,
+        as a dictionary of torrent-id -> info-hash.
+        Torrents whose info-hashes are unknown are omitted.
+        The torrents are all of the tracker with the given tracker_name
+        (see get_torrent_file_contents_async).
         """
         raise NotImplementedError()
 
+    def get_search_interval_seconds(self):
+        """
+        Returns the minimal amount of seconds between searches in the tracker
+        (used for planning runs, see automudo.planning).
+        """
+        return 0
+
+    def find_catalog_torrents(self, keywords):
+        """
+        Finds the torrents matching the keywords which a search would take
+        from the torrents catalog, without searching the tracker
+        (used for planning runs, see automudo.planning).
+        Returns an empty list if the search would search the tracker.
+        """
+        return self._find_catalog_torrents_by_keywords(keywords)
+
+    def remember_torrents(self, torrents):
+        """
+        Lets the tracker know of torrents which were found earlier
+        (for example, in a previous run), before downloading them.
+        Trackers need nothing but the torrents' identifiers,
+        so by default this does nothing.
+        """
+        pass
+
     # TORRENT FILTERS:
 
     @staticmethod
@@ -114,14 +201,7 @@ class Tracker(object):
         """
         Checks if a torrent's title is for a fancy album release.
         """
-        lowercase_title = title.lower()
-        return (re.search(r"24([\W\s]+192|[\W\s]*bit)", lowercase_title) or
-                re.search(r"180[\W\s]*gram", lowercase_title) or
-                "sacd" in lowercase_title or
-                "dsd" in lowercase_title or
-                "5.1" in lowercase_title or
-                "dvd" in lowercase_title or
-                "vinyl" in lowercase_title)
+        return classify_title(title).is_fancy
 
     @classmethod
     def _filter_non_fancy_torrents(cls, torrents):
@@ -132,22 +212,26 @@ class Tracker(object):
     @staticmethod
     def _filter_non_remasters_torrents(torrents):
         for torrent in torrents:
-            if "remaster" not in torrent.title.lower():
+            if not classify_title(torrent.title).is_remaster:
                 yield torrent
 
     @staticmethod
     def _filter_accurate_torrents(torrents, keywords):
+        normalized_keywords = [
+            MusicMetadataDatabase.normalize_music_description(keyword)
+            for keyword in keywords
+            ]
+        normalized_keywords_string = \
+            MusicMetadataDatabase.normalize_music_description(
+                " ".join(keywords)
+                )
         for torrent in torrents:
             # Make sure that all of the keywords appear
             # and do not overlap each other.
-            torrent_title = MusicMetadataDatabase.normalize_music_description(
-                torrent.title
-                )
+            torrent_title = classify_title(torrent.title).normalized_title
             all_keywords_were_found = True
             searched_string_part = ""
-            for keyword in keywords:
-                normalized_keyword = \
-                    MusicMetadataDatabase.normalize_music_description(keyword)
+            for normalized_keyword in normalized_keywords:
                 if normalized_keyword not in torrent_title:
                     all_keywords_were_found = False
                     break
@@ -167,10 +251,6 @@ class Tracker(object):
                 MusicMetadataDatabase.normalize_music_description(
                     searched_string_part
                     )
-            normalized_keywords_string = \
-                MusicMetadataDatabase.normalize_music_description(
-                    " ".join(keywords)
-                    )
             match_ratio = difflib.SequenceMatcher(
                 a=normalized_torrent_title,
                 b=normalized_keywords_string
@@ -178,40 +258,21 @@ class Tracker(object):
             if match_ratio > 0.6:
                 yield torrent
 
-    @staticmethod
-    def _filter_lower_sized_torrents(torrents):
-        torrents_sorted_by_size = \
-            sorted(torrents, key=lambda t: t.size_in_bytes)
-
-        if len(torrents_sorted_by_size) == 1:
-            return torrents_sorted_by_size
-        else:
-            min_size = torrents_sorted_by_size[0].size_in_bytes
-            return [t for t in torrents_sorted_by_size
-                    if t.size_in_bytes <= (min_size * 3 / 2)]
-
-    @staticmethod
-    def _filter_higher_sized_torrents(torrents):
-        torrents_sorted_by_size = \
-            sorted(torrents, key=lambda t: t.size_in_bytes,
-                   reverse=True)
-
-        if len(torrents_sorted_by_size) == 1:
-            return torrents_sorted_by_size
-        else:
-            end_index = math.ceil(len(torrents_sorted_by_size)/2)
-            return torrents_sorted_by_size[:end_index]
-
-    @staticmethod
-    def _filter_by_seeders_amount(torrents):
-        torrents_sorted_by_seeders = \
-            sorted(torrents, key=lambda torrent: torrent.seeders,
-                   reverse=True)
+    def _get_category_score(self, category):
+        """
+        Scores how good a torrent's category is, between 0 and 1.
+        Trackers may override this to prefer some of their categories.
+        """
+        return 0
 
-        if len(torrents_sorted_by_seeders) == 1:
-            return torrents_sorted_by_seeders
-        else:
-            return torrents_sorted_by_seeders[:-int(len(torrents)/2)]
+    def _get_torrent_category_score(self, torrent):
+        """
+        Scores how good the category of the given torrent is
+        (see _get_category_score).
+        Trackers which combine several trackers override this
+        to score each torrent by the tracker it was found in.
+        """
+        return self._get_category_score(torrent.category)
 
     # WORK AGAINST THE TRACKER:
 
@@ -237,17 +298,22 @@ class Tracker(object):
         """
         raise NotImplementedError()
 
-    def _http_request(self, url, login_if_needed=True, **http_request_args):
+    def _http_request(self, url, login_if_needed=True, idempotent=None,
+                      **http_request_args):
         """
         Sends an HTTP request to the tracker and returns the response.
         Automatically performs login if needed.
         Note that the default HTTP method is POST,
         as it tends to be more common in trackers.
+        The request is sent through the shared HTTP layer (utils.http),
+        with its timeouts, deadline, retries and circuit breaker.
 
         Parameters:
             url - the requested URL
             login_if_needed - optional. should log in if not logged in.
                               defaults to True
+            idempotent - optional. whether the request may be retried.
+                         defaults to True for GET requests only
             http_request_args - optional. HTTP request arguments
                                 (method, headers, data, cookies, ..).
 
@@ -257,6 +323,7 @@ class Tracker(object):
         Raises:
             TrackerLoginError - if login is needed
                                 and the login attempts failed.
+            http.HttpRequestError - the request failed.
         """
         method = http_request_args.pop('method', 'POST')
         headers = http_request_args.pop('headers', dict())
@@ -264,16 +331,14 @@ class Tracker(object):
 
         login_attempts = 0
         while True:
-            response = self.__session.request(
+            response = http.request(
                 method, url,
+                session=self.__session,
+                idempotent=idempotent,
                 headers=headers,
-                stream=True,
                 **http_request_args
                 )
-
-            response_data = b""
-            for chunk in response:
-                response_data += chunk
+            response_data = response.content
 
             if (self._has_torrent_content_type(response.headers) or
                     self._is_authenticated_user_response(response_data) or
@@ -287,9 +352,64 @@ class Tracker(object):
                 if login_attempts == 2:
                     raise exception
 
+    def _add_torrents_to_catalog(self, torrents):
+        """
+        Adds the given torrents (seen in the tracker) to the torrents catalog,
+        if there is one.
+        """
+        if self.__torrents_catalog is not None:
+            self.__torrents_catalog.add_torrents(torrents)
+
+    def _find_catalog_torrents_by_keywords(self, keywords):
+        """
+        Finds torrents matching the keywords in the torrents catalog.
+        Returns an empty list if there are no matching torrents
+        which are recent enough, or if catalog searches are disabled.
+        """
+        if (self.__torrents_catalog is None or
+                self.__torrents_catalog_max_age_days is None):
+            return []
+        return self.__torrents_catalog.find_torrents_by_keywords(
+            self.name, keywords,
+            max_age=self.__torrents_catalog_max_age_days * 24 * 60 * 60
+            )
+
+    async def _http_request_async(self, url, login_if_needed=True,
+                                  idempotent=None, **http_request_args):
+        """
+        The asyncio counterpart of _http_request.
+        requests has no asyncio support, so the request itself
+        is made in a thread, while the event loop is free to run
+        other lookups (or wait in their throttles) meanwhile.
+        """
+        return await run_blocking(self._http_request, url,
+                                  login_if_needed=login_if_needed,
+                                  idempotent=idempotent,
+                                  **http_request_args)
+
+    # The tracker-specific implementation is either
+    # _find_torrents_by_keywords_async or (in trackers written before it)
+    # _find_torrents_by_keywords, which it defaults to running in a thread.
+
     def _find_torrents_by_keywords(self, keywords,
                                    allow_fancy_releases=None, **kwargs):
         """
         Tracker-specific implementation for find_torrents_by_keywords.
+        Returns an iterable of TorrentDetails.
         """
         raise NotImplementedError()
+
+    async def _find_torrents_by_keywords_async(self, keywords,
+                                               allow_fancy_releases=None,
+                                               **kwargs):
+        """
+        Tracker-specific implementation for find_torrents_by_keywords_async.
+        Returns an iterable of TorrentDetails.
+        """
+        # The torrents are listed in the thread as well, since
+        # implementations may be generators which make the requests.
+        return await run_blocking(lambda: list(
+            self._find_torrents_by_keywords(
+                keywords, allow_fancy_releases=allow_fancy_releases, **kwargs
+                )
+            ))
@@ -0,0 +1,110 @@
+import time
+import sqlite3
+import threading
+
+from .base import TorrentDetails
+
+CATALOG_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS torrents (
+        tracker_name TEXT NOT NULL,
+        torrent_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        category TEXT NOT NULL,
+        size_in_bytes INTEGER NOT NULL,
+        seeders INTEGER NOT NULL,
+        leechers INTEGER NOT NULL,
+        last_seen REAL NOT NULL,
+        PRIMARY KEY (tracker_name, torrent_id)
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS torrents_titles USING fts5(
+        title, content='torrents', content_rowid='rowid',
+        tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS torrents_after_insert
+    AFTER INSERT ON torrents BEGIN
+        INSERT INTO torrents_titles (rowid, title)
+        VALUES (new.rowid, new.title);
+    END;
+    CREATE TRIGGER IF NOT EXISTS torrents_after_update
+    AFTER UPDATE OF title ON torrents BEGIN
+        INSERT INTO torrents_titles (torrents_titles, rowid, title)
+        VALUES ('delete', old.rowid, old.title);
+        INSERT INTO torrents_titles (rowid, title)
+        VALUES (new.rowid, new.title);
+    END;
+"""
+
+# The trigram index can only look for strings of at least 3 characters.
+MIN_INDEXED_KEYWORD_LENGTH = 3
+
+
+class TorrentsCatalog(object):
+    """
+        A persistent catalog of all of the torrents seen in the trackers.
+        Each torrent is kept with the details of the last time it was seen,
+        and the titles are indexed by trigrams, so that searches
+        can be answered locally.
+    """
+
+    def __init__(self, catalog_path):
+        """
+            Initializes the TorrentsCatalog object.
+            The catalog file is created if it does not exist.
+        """
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(catalog_path,
+                                            check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.executescript(CATALOG_SCHEMA)
+
+    def add_torrents(self, torrents):
+        """
+            Adds the given torrents to the catalog,
+            or updates them if they are already in it.
+        """
+        now = time.time()
+        rows = [(t.tracker_name, t.torrent_id, t.title, t.category,
+                 t.size_in_bytes, t.seeders, t.leechers, now)
+                for t in torrents]
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "INSERT INTO torrents VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (tracker_name, torrent_id) DO UPDATE SET "
+                "title = excluded.title, category = excluded.category, "
+                "size_in_bytes = excluded.size_in_bytes, "
+                "seeders = excluded.seeders, leechers = excluded.leechers, "
+                "last_seen = excluded.last_seen",
+                rows
+                )
+
+    def find_torrents_by_keywords(self, tracker_name, keywords, max_age):
+        """
+            Finds torrents of the given tracker whose titles
+            contain all of the given keywords (case-insensitively),
+            and that were seen in the last max_age seconds.
+
+            Returns:
+                a list of TorrentDetails, which is empty if the catalog
+                has no matching torrents or can't search for the keywords.
+        """
+        indexed_keywords = [k for k in keywords
+                            if len(k) >= MIN_INDEXED_KEYWORD_LENGTH]
+        if not indexed_keywords:
+            return []
+
+        full_text_query = " ".join('"{}"'.format(k.replace('"', '""'))
+                                   for k in indexed_keywords)
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT title, seeders, leechers, size_in_bytes, category, "
+                "torrent_id, tracker_name FROM torrents "
+                "WHERE rowid IN (SELECT rowid FROM torrents_titles "
+                "                WHERE torrents_titles MATCH ?) "
+                "AND tracker_name = ? AND last_seen >= ? "
+                "ORDER BY seeders DESC",
+                (full_text_query, tracker_name, time.time() - max_age)
+                ).fetchall()
+
+        torrents = map(TorrentDetails._make, rows)
+        return [t for t in torrents
+                if all(k.lower() in t.title.lower() for k in keywords)]
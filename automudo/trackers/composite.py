@@ -0,0 +1,224 @@
+import asyncio
+
+from .base import Tracker, TrackerLoginError
+from ..utils.aio import run_sync, run_blocking
+from ..utils.http import HttpRequestError, DeadlineExceededError
+
+# Errors of a single tracker, which should not fail the whole search.
+# A passed deadline fails the whole search, as the other trackers
+# are bound by the same deadline.
+TRACKER_SEARCH_ERRORS = (asyncio.TimeoutError, TrackerLoginError,
+                         HttpRequestError)
+
+
+class CompositeTracker(Tracker):
+    """
+    A Tracker that searches several trackers concurrently
+    and merges their results.
+    """
+    name = "composite"
+
+    def __init__(self, trackers, user_agent=None,
+                 tracker_timeout=60, clear_winner_seeders=50,
+                 scoring_weights=None, **config):
+        """
+        Initializes the CompositeTracker object.
+
+        Parameters:
+            trackers - the Tracker objects to search in
+            user_agent - the user agent used in HTTP requests
+            tracker_timeout - the amount of seconds to wait for each tracker
+                              in each search
+            clear_winner_seeders - when a torrent with at least this amount
+                                   of seeders is found, the search returns
+                                   without waiting for the slower trackers
+            scoring_weights - optional. weights for choosing the best
+                              of the merged torrents (see TorrentScorer)
+            config - the rest of the trackers' configuration (unused)
+        """
+        super(CompositeTracker, self).__init__(
+            user_agent, scoring_weights=scoring_weights
+            )
+
+        self.__trackers = {tracker.name: tracker for tracker in trackers}
+        self.__tracker_timeout = tracker_timeout
+        self.__clear_winner_seeders = clear_winner_seeders
+        # The (tracker name, torrent identifier) of the torrents which
+        # were found, for downloading them later. Torrents of different
+        # trackers may have the same identifier.
+        self.__found_torrents = set()
+
+    def _has_clear_winner(self, torrents):
+        """
+        Checks if the given torrents have a candidate which is good enough
+        to stop waiting for the other trackers.
+        """
+        return any(t.seeders >= self.__clear_winner_seeders
+                   for t in torrents)
+
+    def get_search_interval_seconds(self):
+        """
+        Implementation for Tracker.get_search_interval_seconds .
+        The trackers are searched concurrently,
+        so the slowest of them sets the pace.
+        """
+        return max(tracker.get_search_interval_seconds()
+                   for tracker in self.__trackers.values())
+
+    def find_catalog_torrents(self, keywords):
+        """
+        Implementation for Tracker.find_catalog_torrents .
+        A search searches the trackers which have no catalog torrents,
+        so the catalog torrents are returned only if all of them have.
+        """
+        torrents = []
+        for tracker in self.__trackers.values():
+            tracker_torrents = tracker.find_catalog_torrents(keywords)
+            if not tracker_torrents:
+                return []
+            torrents.extend(tracker_torrents)
+        return torrents
+
+    async def _search_tracker_async(self, tracker, keywords, **kwargs):
+        """
+        Searches a single tracker, giving up after the tracker timeout.
+        """
+        return await asyncio.wait_for(
+            tracker.find_torrents_by_keywords_async(keywords, **kwargs),
+            self.__tracker_timeout
+            )
+
+    async def find_torrents_by_keywords_async(self, keywords, **kwargs):
+        """
+        Implementation for Tracker.find_torrents_by_keywords_async .
+        Searches all of the trackers concurrently and returns
+        the merged results, ordered by seeders amount.
+        Returns as soon as a clear winner has arrived.
+        """
+        searches = {
+            asyncio.ensure_future(
+                self._search_tracker_async(tracker, keywords, **kwargs)
+                ): tracker_name
+            for tracker_name, tracker in self.__trackers.items()
+            }
+
+        torrents = []
+        pending_searches = set(searches)
+        try:
+            while pending_searches:
+                finished_searches, pending_searches = await asyncio.wait(
+                    pending_searches, return_when=asyncio.FIRST_COMPLETED
+                    )
+                for search in finished_searches:
+                    try:
+                        torrents.extend(search.result())
+                    except DeadlineExceededError:
+                        raise
+                    except TRACKER_SEARCH_ERRORS as exception:
+                        print("Searching in {} failed: {!r}".format(
+                            searches[search], exception
+                            ))
+                if self._has_clear_winner(torrents):
+                    break
+        finally:
+            for search in pending_searches:
+                search.cancel()
+
+        self.remember_torrents(torrents)
+        return sorted(torrents, key=lambda t: t.seeders, reverse=True)
+
+    def find_best_discography_torrent(self, artist, *args, **kwargs):
+        """
+        Implementation for Tracker.find_best_discography_torrent .
+        Looks for a discography in all of the trackers concurrently,
+        and returns the one with the most seeders.
+        """
+        return run_sync(self._find_best_discography_torrent_async(
+            artist, *args, **kwargs
+            ))
+
+    async def _find_best_discography_torrent_async(self, artist,
+                                                   *args, **kwargs):
+        async def find_in_tracker(tracker):
+            try:
+                return await asyncio.wait_for(
+                    run_blocking(tracker.find_best_discography_torrent,
+                                 artist, *args, **kwargs),
+                    self.__tracker_timeout
+                    )
+            except DeadlineExceededError:
+                raise
+            except TRACKER_SEARCH_ERRORS as exception:
+                print("Searching in {} failed: {!r}".format(
+                    tracker.name, exception
+                    ))
+                return None
+
+        torrents = await asyncio.gather(
+            *map(find_in_tracker, self.__trackers.values())
+            )
+        torrents = [t for t in torrents if t is not None]
+        if not torrents:
+            return None
+
+        self.remember_torrents(torrents)
+        return max(torrents, key=lambda t: t.seeders)
+
+    def remember_torrents(self, torrents):
+        """
+        Implementation for Tracker.remember_torrents .
+        Remembers the tracker of each of the torrents.
+        """
+        for torrent in torrents:
+            self.__found_torrents.add((torrent.tracker_name,
+                                       torrent.torrent_id))
+
+    def __get_torrent_tracker(self, tracker_name, torrent_id):
+        """
+        Returns the tracker in which the given torrent was found.
+        Raises KeyError if the torrent was not found
+        (or remembered, see remember_torrents) before.
+        """
+        if (tracker_name, torrent_id) not in self.__found_torrents:
+            raise KeyError("Unknown torrent: {} in {}".format(
+                torrent_id, tracker_name
+                ))
+        return self.__trackers[tracker_name]
+
+    def _get_torrent_category_score(self, torrent):
+        """
+        Implementation for Tracker._get_torrent_category_score .
+        Scores the category by the tracker the torrent was found in,
+        as the categories of each tracker are its own.
+        """
+        tracker = self.__trackers.get(torrent.tracker_name)
+        if tracker is None:
+            return 0
+        return tracker._get_torrent_category_score(torrent)
+
+    async def get_torrent_file_contents_async(self, torrent_id,
+                                              tracker_name=None):
+        """
+        Implementation for Tracker.get_torrent_file_contents_async .
+        Downloads the torrent from the tracker it was found in.
+        """
+        tracker = self.__get_torrent_tracker(tracker_name, torrent_id)
+        return await tracker.get_torrent_file_contents_async(
+            torrent_id, tracker_name=tracker_name
+            )
+
+    async def get_torrents_info_hashes_async(self, torrent_ids,
+                                             tracker_name=None):
+        """
+        Implementation for Tracker.get_torrents_info_hashes_async .
+        Asks the tracker the torrents were found in for their info-hashes.
+        """
+        torrent_ids = list(torrent_ids)
+        if not torrent_ids:
+            return dict()
+        # All of the torrents are of the same tracker.
+        trackers = [self.__get_torrent_tracker(tracker_name, torrent_id)
+                    for torrent_id in torrent_ids]
+        return await trackers[0].get_torrents_info_hashes_async(
+            torrent_ids, tracker_name=tracker_name
+            )
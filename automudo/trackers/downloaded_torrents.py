@@ -0,0 +1,80 @@
+import os
+import csv
+import threading
+from collections import namedtuple
+
+DownloadedTorrent = namedtuple(
+    "DownloadedTorrent",
+    ["tracker_name", "torrent_id", "info_hash", "total_size", "file_name"]
+    )
+
+
+class DownloadedTorrentsIndex(object):
+    """
+        A persistent index of the torrents which were already downloaded,
+        by their identifiers in the trackers and by their info-hashes.
+        Used for detecting duplicate torrents before downloading them.
+    """
+
+    FIELDS = ['tracker-name', 'torrent-id', 'info-hash',
+              'total-size', 'file-name']
+
+    def __init__(self, index_path):
+        """
+            Initializes the DownloadedTorrentsIndex object,
+            loading the index file if it exists.
+        """
+        self.__index_path = index_path
+        self.__lock = threading.Lock()
+        self.__by_torrent_id = dict()
+        self.__by_info_hash = dict()
+
+        try:
+            with open(index_path, "r",
+                      encoding="utf-8", newline="") as index_file:
+                for row in csv.DictReader(index_file):
+                    self.__add_to_memory(DownloadedTorrent(
+                        tracker_name=row['tracker-name'],
+                        torrent_id=row['torrent-id'],
+                        info_hash=row['info-hash'],
+                        total_size=int(row['total-size']),
+                        file_name=row['file-name']
+                        ))
+        except IOError:
+            pass  # The index file does not exist.
+
+    def __add_to_memory(self, torrent):
+        self.__by_torrent_id[(torrent.tracker_name,
+                              str(torrent.torrent_id))] = torrent
+        self.__by_info_hash[torrent.info_hash] = torrent
+
+    def find_by_torrent_id(self, tracker_name, torrent_id):
+        """
+            Returns the DownloadedTorrent with the given identifier
+            in the given tracker, or None if it was not downloaded.
+        """
+        with self.__lock:
+            return self.__by_torrent_id.get((tracker_name, str(torrent_id)))
+
+    def find_by_info_hash(self, info_hash):
+        """
+            Returns the DownloadedTorrent with the given info-hash,
+            or None if it was not downloaded.
+        """
+        with self.__lock:
+            return self.__by_info_hash.get(info_hash)
+
+    def add(self, torrent):
+        """
+            Adds a DownloadedTorrent to the index.
+        """
+        with self.__lock:
+            self.__add_to_memory(torrent)
+
+            file_existed = os.path.exists(self.__index_path)
+            with open(self.__index_path, "a",
+                      encoding="utf-8", newline="") as index_file:
+                index_file_writer = csv.DictWriter(index_file, self.FIELDS)
+                if not file_existed:
+                    index_file_writer.writeheader()
+                index_file_writer.writerow(dict(zip(self.FIELDS, torrent)))
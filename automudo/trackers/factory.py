@@ -1,6 +1,9 @@
-from .rutracker import Rutracker
+from automudo.utils.registry import PluginRegistry
 
-SUPPORTED_TRACKERS = [Rutracker]
+# The implementations are imported only when they are used.
+SUPPORTED_TRACKERS = PluginRegistry("tracker", {
+    'rutracker': "automudo.trackers.rutracker:Rutracker"
+    })
 
 
 def create_tracker(tracker_name, **kwargs):
@@ -8,12 +11,8 @@ def create_tracker(tracker_name, **kwargs):
         Finds the class that inherits Tracker
         and has the given tracker name,
         and initializes an object of it using kwargs.
+
+        Raises:
+            KeyError - there is no tracker with the given name.
     """
-    for tracker in SUPPORTED_TRACKERS:
-        if tracker.name == tracker_name:
-            return tracker(**kwargs)
-    return KeyError(
-        "Tracker {} not found. Supported trackers are: {}".format(
-            tracker_name,
-            ", ".join(tracker.name for tracker in SUPPORTED_TRACKERS)
-            ))
+    return SUPPORTED_TRACKERS.create(tracker_name, **kwargs)
@@ -0,0 +1,100 @@
+import os
+from collections import OrderedDict
+from urllib.parse import quote
+
+
+def build_magnet_link(info_hash, display_name):
+    """
+        Builds a magnet link for the torrent with the given info-hash.
+    """
+    return "magnet:?xt=urn:btih:{}&dn={}".format(info_hash,
+                                                 quote(display_name))
+
+
+class MagnetLinksBatch(object):
+    """
+        Collects torrents whose magnet links should be written
+        into a single file, so that their info-hashes are resolved
+        together, in as few requests as possible.
+    """
+
+    def __init__(self, tracker, magnet_links_file_path):
+        """
+            Initializes the MagnetLinksBatch object.
+
+            Parameters:
+                tracker - the tracker of the torrents
+                magnet_links_file_path - the file to append the links to
+        """
+        self.__tracker = tracker
+        self.__magnet_links_file_path = magnet_links_file_path
+        # (tracker name, torrent identifier) -> (torrent, display name)
+        self.__torrents = OrderedDict()
+
+    def add(self, torrent_details, display_name):
+        """
+            Adds a torrent to the batch.
+            A torrent which is already in the batch is not added again.
+        """
+        self.__torrents.setdefault(
+            (torrent_details.tracker_name, str(torrent_details.torrent_id)),
+            (torrent_details, display_name)
+            )
+
+    def flush(self, is_duplicate_info_hash=lambda info_hash: False):
+        """
+            Resolves the info-hashes of the torrents in the batch and
+            appends their magnet links to the magnet links file.
+            Torrents for which is_duplicate_info_hash returns True,
+            and torrents with the same info-hash as an earlier torrent
+            of the batch, are not written.
+            Torrents whose info-hashes were not resolved are dropped.
+
+            Returns:
+                a list of (torrent-details, info-hash, was-written)
+                of the torrents whose info-hashes were resolved.
+        """
+        if not self.__torrents:
+            return []
+
+        torrents = list(self.__torrents.values())
+        self.__torrents = OrderedDict()
+        # The info-hashes are resolved per tracker,
+        # as their torrent identifiers may collide.
+        torrent_ids_by_tracker = OrderedDict()
+        for torrent, _ in torrents:
+            torrent_ids_by_tracker.setdefault(torrent.tracker_name, []).append(
+                torrent.torrent_id
+                )
+        info_hashes = dict()
+        for tracker_name, torrent_ids in torrent_ids_by_tracker.items():
+            for torrent_id, info_hash in \
+                    self.__tracker.get_torrents_info_hashes(
+                        torrent_ids, tracker_name=tracker_name
+                        ).items():
+                info_hashes[(tracker_name, torrent_id)] = info_hash
+
+        resolved_torrents = []
+        magnet_links = []
+        written_info_hashes = set()
+        for torrent, display_name in torrents:
+            info_hash = info_hashes.get((torrent.tracker_name,
+                                         torrent.torrent_id))
+            if info_hash is None:
+                print("Could not get the magnet link of:", display_name)
+                continue
+            was_written = (info_hash not in written_info_hashes and
+                           not is_duplicate_info_hash(info_hash))
+            if was_written:
+                written_info_hashes.add(info_hash)
+                magnet_links.append(build_magnet_link(info_hash,
+                                                      display_name))
+            resolved_torrents.append((torrent, info_hash, was_written))
+
+        directory = os.path.dirname(self.__magnet_links_file_path)
+        os.makedirs(directory, exist_ok=True)
+        with open(self.__magnet_links_file_path, "a",
+                  encoding="utf-8") as magnet_links_file:
+            for magnet_link in magnet_links:
+                magnet_links_file.write(magnet_link + "\n")
+        return resolved_torrents
@@ -1,11 +1,24 @@
+import os
 import re
+import json
+import time
 import html
 
 from .base import Tracker, TrackerLoginError, TorrentDetails
+from .catalog import TorrentsCatalog
 from ..utils.data_sizes import parse_data_size_string
 from ..utils.html_parse import \
     find_html_tags_by_type, search_html_tag_by_type, get_text
-from ..utils.throttle import throttle
+from ..utils.aio import async_throttle
+
+# The forums map is rebuilt when it is older than this.
+FORUMS_MAP_MAX_AGE = 30 * 24 * 60 * 60
+
+# The kinds of forums in the forums map.
+LOSSLESS_FORUM = "lossless"
+LOSSY_FORUM = "lossy"
+MIXED_FORUM = "mixed"  # Lossy and lossless.
+FANCY_FORUM = "fancy"  # Vinyl, 5.1, ..
 
 
 class Rutracker(Tracker):
@@ -14,6 +27,9 @@ class Rutracker(Tracker):
     """
     name = "rutracker"
 
+    # The minimal amount of seconds between searches.
+    SEARCH_INTERVAL_SECONDS = 3
+
     def __init__(self, **config):
         """
         Initializes the Rutracker object.
@@ -21,24 +37,76 @@ class Rutracker(Tracker):
         Parameters:
             config - tracker configuration
         """
-        super(Rutracker, self).__init__(config['user_agent'])
+        torrents_catalog = None
+        if config.get('torrents_catalog_path'):
+            torrents_catalog = TorrentsCatalog(
+                os.path.expanduser(config['torrents_catalog_path'])
+                )
+        super(Rutracker, self).__init__(
+            config['user_agent'],
+            torrents_catalog=torrents_catalog,
+            torrents_catalog_max_age_days=config.get(
+                'torrents_catalog_max_age_days'
+                ),
+            scoring_weights=config.get('scoring_weights')
+            )
 
         self.__username = config['username']
         self.__password = config['password']
         self.__allow_fancy_releases = config['allow_fancy_releases']
         self.__data_compression_type = config['data_compression_type']
+        self.__forums_map_path = config.get('forums_map_path')
+        if self.__forums_map_path:
+            self.__forums_map_path = os.path.expanduser(
+                self.__forums_map_path
+                )
+        self.__forums_map = None
 
-    def get_torrent_file_contents(self, torrent_id):
+    async def get_torrent_file_contents_async(self, torrent_id,
+                                              tracker_name=None):
         """
-            Implementation for Tracker.get_torrent_file_contents .
+            Implementation for Tracker.get_torrent_file_contents_async .
         """
         viewtopic_url_format = "http://rutracker.org/forum/viewtopic.php?t={}"
         referer_header = {'Referer': viewtopic_url_format.format(torrent_id)}
-        return self._http_request("http://dl.rutracker.org/forum/dl.php",
-                                  'GET',
-                                  params={'t': torrent_id},
-                                  cookies={'bb_dl': str(torrent_id)},
-                                  headers=referer_header)
+        return await self._http_request_async(
+            "http://dl.rutracker.org/forum/dl.php",
+            idempotent=True,
+            params={'t': torrent_id},
+            cookies={'bb_dl': str(torrent_id)},
+            headers=referer_header
+            )
+
+    async def get_torrents_info_hashes_async(self, torrent_ids,
+                                             tracker_name=None):
+        """
+            Implementation for Tracker.get_torrents_info_hashes_async .
+            Uses Rutracker's API, which returns the info-hashes
+            of up to 100 torrents in a single request.
+        """
+        torrent_ids = list(torrent_ids)
+        info_hashes = dict()
+        for i in range(0, len(torrent_ids), 100):
+            torrent_ids_chunk = torrent_ids[i:i + 100]
+            response = await self._http_request_async(
+                "http://api.rutracker.org/v1/get_tor_hash",
+                login_if_needed=False,
+                method='GET',
+                params={'by': "topic_id",
+                        'val': ",".join(map(str, torrent_ids_chunk))}
+                )
+            result = json.loads(response.decode('utf-8'))['result']
+            for torrent_id in torrent_ids_chunk:
+                info_hash = result.get(str(torrent_id))
+                if info_hash:
+                    info_hashes[torrent_id] = info_hash.lower()
+        return info_hashes
+
+    def get_search_interval_seconds(self):
+        """
+            Implementation for Tracker.get_search_interval_seconds .
+        """
+        return self.SEARCH_INTERVAL_SECONDS
 
     def find_best_discography_torrent(self, artist, *args, **kwargs):
         for keyword in ["дискография", "discography", "cd", "studio", "complete"]:
@@ -72,21 +140,19 @@ class Rutracker(Tracker):
         if not self._is_authenticated_user_response(response):
             raise TrackerLoginError("Could not login to rutracker.")
 
-    def _extract_torrents_from_html(
-            self, html_string,
-            data_compression_type, allow_fancy_releases
-            ):
+    def _extract_torrents_from_html(self, html_string):
         """
             Gets an HTTP response from the server as a string
             and extracts TorrentDetails for each torrent in it.
-            returns an iterator of the TorrentDetails-s.
+            returns a list of the TorrentDetails-s.
         """
+        torrents = []
         html_string = html_string.partition(' id="tor-tbl">')[2]
         torrents_table_body = search_html_tag_by_type("tbody", html_string)
         for row in find_html_tags_by_type("tr", torrents_table_body):
             for cell in find_html_tags_by_type("td", row):
                 if "Не найдено" in cell:
-                    return  # No results.
+                    return torrents  # No results.
                 cell = html.unescape(cell)
                 if "t-title" in cell:  # Torrent title.
                     title = get_text(cell)
@@ -105,19 +171,33 @@ class Rutracker(Tracker):
                 elif cell.startswith("<b>"):  # Leechers amount.
                     leechers = int(search_html_tag_by_type("b", cell))
 
-            # Verify that the user's requested compression type is matched.
-            # Forums in Rutracker have quite a few possible suffixes:
-            # 1. "(lossy)" for lossy-only forum
-            # 2. "(lossless)" for lossless-only forum
-            # 3. "(lossy и lossless)" for forum with lossy and lossless music
-            #    (used in sub-forums for unpopular music)
-            # 4. Музыка Lossless (ALAC)
-            # 5. Музыка Lossy (ALAC)
-            # 6. No suffix, for "special" lossless music (vinyl, 5.1, ..)
-            #    or non-music contents.
-            data_compression_type = data_compression_type.lower()
-            if ((data_compression_type == "lossy" and
-                 "lossy" not in category.lower()) or
+            torrents.append(TorrentDetails(title=title,
+                                           seeders=seeders, leechers=leechers,
+                                           size_in_bytes=size_in_bytes,
+                                           category=category,
+                                           torrent_id=torrent_id,
+                                           tracker_name=self.name))
+        return torrents
+
+    @staticmethod
+    def _is_requested_category(category,
+                               data_compression_type, allow_fancy_releases):
+        """
+            Checks if a torrent's category (its forum title) matches
+            the user's requested compression type.
+        """
+        # Forums in Rutracker have quite a few possible suffixes:
+        # 1. "(lossy)" for lossy-only forum
+        # 2. "(lossless)" for lossless-only forum
+        # 3. "(lossy и lossless)" for forum with lossy and lossless music
+        #    (used in sub-forums for unpopular music)
+        # 4. Музыка Lossless (ALAC)
+        # 5. Музыка Lossy (ALAC)
+        # 6. No suffix, for "special" lossless music (vinyl, 5.1, ..)
+        #    or non-music contents.
+        data_compression_type = data_compression_type.lower()
+        return not ((data_compression_type == "lossy" and
+                     "lossy" not in category.lower()) or
                     (data_compression_type == "lossless" and
                      allow_fancy_releases and
                      (category.endswith("(lossy)") or
@@ -125,38 +205,189 @@ class Rutracker(Tracker):
                     (data_compression_type == "lossless" and
                      not allow_fancy_releases and
                      not category.endswith("lossless)") and
-                     "Музыка Lossless" not in category)):
+                     "Музыка Lossless" not in category))
+
+    def _get_category_score(self, category):
+        """
+            Implementation for Tracker._get_category_score .
+            Prefers the forums which are dedicated to the requested
+            compression type over the mixed forums.
+        """
+        if self.__data_compression_type.lower() == "lossless":
+            return int(category.endswith("(lossless)") or
+                       "Музыка Lossless" in category)
+        return int(category.endswith("(lossy)") or
+                   "Музыка Lossy" in category)
+
+    @staticmethod
+    def _extract_forums_from_html(html_string):
+        """
+            Extracts the forums from the forums selection
+            in the search page.
+            Returns a list of (forum-group-index, forum-id, forum-name).
+        """
+        forums_selection = html_string.partition(' id="fs-main"')[2]
+        forums_selection = forums_selection.partition('</select>')[0]
+
+        forums = []
+        forum_groups = forums_selection.split('<optgroup')
+        for group_index, forum_group in enumerate(forum_groups):
+            for forum_id, forum_name in re.findall(
+                    r'<option[^>]*value="(\d+)"[^>]*>(.*?)</option>',
+                    forum_group, re.DOTALL):
+                forum_name = html.unescape(get_text(forum_name))
+                forum_name = forum_name.lstrip(" |-\xa0")
+                forums.append((group_index, int(forum_id), forum_name))
+        return forums
+
+    @staticmethod
+    def _classify_forums(forums):
+        """
+            Classifies the forums as lossless/lossy/mixed/fancy forums,
+            by the suffixes of their names
+            (see _is_requested_category).
+            Forums with no suffix are considered fancy forums only if they
+            are in a group of music forums, meaning a group with some
+            lossless or lossy forums.
+
+            Returns:
+                a dictionary of forum-id -> forum-kind.
+        """
+        forums_map = dict()
+        unclassified_forums = []
+        music_forum_groups = set()
+        for group_index, forum_id, forum_name in forums:
+            lowercase_forum_name = forum_name.lower()
+            if "lossy" in lowercase_forum_name:
+                if "lossless" in lowercase_forum_name:
+                    forums_map[forum_id] = MIXED_FORUM
+                else:
+                    forums_map[forum_id] = LOSSY_FORUM
+            elif "lossless" in lowercase_forum_name:
+                forums_map[forum_id] = LOSSLESS_FORUM
+            else:
+                unclassified_forums.append((group_index, forum_id))
                 continue
+            music_forum_groups.add(group_index)
 
-            yield TorrentDetails(title=title,
-                                 seeders=seeders, leechers=leechers,
-                                 size_in_bytes=size_in_bytes,
-                                 category=category, torrent_id=torrent_id,
-                                 tracker_name=self.name)
+        for group_index, forum_id in unclassified_forums:
+            if group_index in music_forum_groups:
+                forums_map[forum_id] = FANCY_FORUM
+        return forums_map
 
-    @throttle(seconds=3)
-    def _find_torrents_by_keywords(
-            self, keywords,
-            data_compression_type=None, allow_fancy_releases=None
-            ):
+    async def _get_forums_map_async(self):
         """
-            Implementation for Tracker.find_torrents_by_keywords .
+            Returns the forums map (forum-id -> forum-kind).
+            The map is built from the search page, and is cached
+            in the forums map file (if configured) for FORUMS_MAP_MAX_AGE.
+        """
+        if self.__forums_map is not None:
+            return self.__forums_map
 
-            Note: does not look past the first search page.
+        if self.__forums_map_path:
+            try:
+                with open(self.__forums_map_path, "r",
+                          encoding="utf-8") as forums_map_file:
+                    cached_forums_map = json.load(forums_map_file)
+                if (time.time() - cached_forums_map['creation_time'] <
+                        FORUMS_MAP_MAX_AGE):
+                    self.__forums_map = {
+                        int(forum_id): forum_kind for forum_id, forum_kind
+                        in cached_forums_map['forums'].items()
+                        }
+                    return self.__forums_map
+            except (IOError, ValueError, KeyError):
+                pass  # No valid cached map.
+
+        response = await self._http_request_async(
+            'http://rutracker.org/forum/tracker.php', idempotent=True
+            )
+        self.__forums_map = self._classify_forums(
+            self._extract_forums_from_html(response.decode('windows-1251'))
+            )
+
+        if self.__forums_map and self.__forums_map_path:
+            with open(self.__forums_map_path, "w",
+                      encoding="utf-8") as forums_map_file:
+                json.dump({'creation_time': time.time(),
+                           'forums': self.__forums_map},
+                          forums_map_file)
+        return self.__forums_map
+
+    async def _get_requested_forum_ids_async(self, data_compression_type,
+                                             allow_fancy_releases):
         """
-        if data_compression_type is None:
-            data_compression_type = self.__data_compression_type
-        if allow_fancy_releases is None:
-            allow_fancy_releases = self.__allow_fancy_releases
+            Returns the identifiers of the forums
+            matching the user's requested compression type,
+            or None if the forums are unknown.
+        """
+        if data_compression_type.lower() == "lossy":
+            requested_forum_kinds = [LOSSY_FORUM, MIXED_FORUM]
+        else:
+            requested_forum_kinds = [LOSSLESS_FORUM, MIXED_FORUM]
+            if allow_fancy_releases:
+                requested_forum_kinds.append(FANCY_FORUM)
 
+        forums_map = await self._get_forums_map_async()
+        forum_ids = [forum_id for forum_id, forum_kind in forums_map.items()
+                     if forum_kind in requested_forum_kinds]
+        return sorted(forum_ids) or None
+
+    @async_throttle(seconds=SEARCH_INTERVAL_SECONDS)
+    async def _search_torrents_async(self, keywords, forum_ids=None):
+        """
+            Searches the tracker for torrents matching the keywords.
+            If forum_ids are given, only these forums are searched.
+            All of the found torrents are added to the torrents catalog.
+
+            Note: does not look past the first search page.
+        """
         url = 'http://rutracker.org/forum/tracker.php'
         params = {
             'nm': " ".join(map('"{}"'.format, keywords)),
             'o': "10"  # Sort by seeders amount.
             }
-        response = self._http_request(url, 'GET', params=params)
+        if forum_ids:
+            params['f'] = ",".join(map(str, forum_ids))
+        response = await self._http_request_async(url, idempotent=True,
+                                                  params=params)
         response = response.decode('windows-1251')
 
-        yield from self._extract_torrents_from_html(
-            response, data_compression_type, allow_fancy_releases
+        torrents = self._extract_torrents_from_html(response)
+        self._add_torrents_to_catalog(torrents)
+        return torrents
+
+    async def _find_torrents_by_keywords_async(
+            self, keywords,
+            data_compression_type=None, allow_fancy_releases=None
+            ):
+        """
+            Implementation for Tracker._find_torrents_by_keywords_async .
+            Uses the torrents catalog when it has matching torrents,
+            and searches the tracker otherwise.
+        """
+        if data_compression_type is None:
+            data_compression_type = self.__data_compression_type
+        if allow_fancy_releases is None:
+            allow_fancy_releases = self.__allow_fancy_releases
+
+        def filter_requested_categories(torrents):
+            return [t for t in torrents
+                    if self._is_requested_category(t.category,
+                                                   data_compression_type,
+                                                   allow_fancy_releases)]
+
+        torrents = filter_requested_categories(
+            self._find_catalog_torrents_by_keywords(keywords)
             )
+        if not torrents:
+            # The search is restricted to the requested forums,
+            # so the torrents should already be of the requested categories.
+            # They are filtered anyway, in case the forums have changed.
+            forum_ids = await self._get_requested_forum_ids_async(
+                data_compression_type, allow_fancy_releases
+                )
+            torrents = filter_requested_categories(
+                await self._search_torrents_async(keywords, forum_ids)
+                )
+        return torrents
@@ -0,0 +1,129 @@
+import math
+import heapq
+from collections import namedtuple
+
+from automudo.music_metadata_databases.base import MusicMetadataDatabase
+from .title_classification import classify_title
+
+ScoredTorrent = namedtuple("ScoredTorrent", ["score", "torrent", "breakdown"])
+
+# The weight of each of the scoring features.
+# Every feature is scored between 0 and 1.
+# The default weights prefer (in that order) a small size,
+# many seeders, an accurate title and a good category.
+DEFAULT_SCORING_WEIGHTS = {
+    'size': 3.0,
+    'seeders': 2.0,
+    'keywords': 1.0,
+    'category': 1.0,
+    'leechers': 0.25
+    }
+
+
+class TorrentScorer(object):
+    """
+    Scores torrents by a weighted sum of their features,
+    in order to choose the best torrent out of search results.
+    """
+
+    def __init__(self, weights=None, category_scorer=None):
+        """
+        Initializes the TorrentScorer object.
+
+        Parameters:
+            weights - optional. the weights of the scoring features,
+                      overriding the DEFAULT_SCORING_WEIGHTS
+            category_scorer - optional. a function that scores
+                              the category of a torrent (given its
+                              TorrentDetails) between 0 and 1
+        """
+        self.__weights = dict(DEFAULT_SCORING_WEIGHTS)
+        if weights:
+            unknown_features = set(weights) - set(DEFAULT_SCORING_WEIGHTS)
+            if unknown_features:
+                raise ValueError("Unknown scoring features: {}".format(
+                    ", ".join(sorted(unknown_features))
+                    ))
+            self.__weights.update(weights)
+        self.__category_scorer = category_scorer or (lambda torrent: 0)
+
+    @staticmethod
+    def _score_logarithmically(value, max_value):
+        if max_value <= 0:
+            return 0
+        return math.log1p(value) / math.log1p(max_value)
+
+    @staticmethod
+    def _score_keywords_match(torrent_title, keywords_words):
+        """
+        Returns the part of the keywords' words found in the torrent's title.
+        """
+        if not keywords_words:
+            return 1
+        title_words = classify_title(torrent_title).words
+        return len(keywords_words & title_words) / len(keywords_words)
+
+    def score_torrents(self, torrents, keywords, look_for_discography=False):
+        """
+        Scores each of the given torrents.
+        The sizes, seeders and leechers are scored relatively to the
+        other torrents, so they are gathered in a first pass over the
+        torrents, and the torrents are scored in a second pass.
+
+        Parameters:
+            torrents - the TorrentDetails-s to score
+            keywords - the keywords the torrents were searched by
+            look_for_discography - prefer bigger torrents, instead of
+                                   smaller ones
+
+        Returns:
+            a list of ScoredTorrent-s, in the order of the given torrents.
+        """
+        torrents = list(torrents)
+        if not torrents:
+            return []
+
+        min_size = min(t.size_in_bytes for t in torrents)
+        max_size = max(t.size_in_bytes for t in torrents)
+        max_seeders = max(t.seeders for t in torrents)
+        max_leechers = max(t.leechers for t in torrents)
+        keywords_words = set(
+            MusicMetadataDatabase.normalize_music_description(
+                " ".join(keywords)
+                ).split()
+            )
+
+        scored_torrents = []
+        for torrent in torrents:
+            if look_for_discography:
+                size_score = torrent.size_in_bytes / max(max_size, 1)
+            else:
+                size_score = max(min_size, 1) / max(torrent.size_in_bytes, 1)
+
+            breakdown = {
+                'size': size_score,
+                'seeders': self._score_logarithmically(torrent.seeders,
+                                                       max_seeders),
+                'leechers': self._score_logarithmically(torrent.leechers,
+                                                        max_leechers),
+                'category': self.__category_scorer(torrent),
+                'keywords': self._score_keywords_match(torrent.title,
+                                                       keywords_words)
+                }
+            score = sum(self.__weights[feature] * feature_score
+                        for feature, feature_score in breakdown.items())
+            scored_torrents.append(ScoredTorrent(score=score, torrent=torrent,
+                                                 breakdown=breakdown))
+        return scored_torrents
+
+    def select_best_torrents(self, torrents, keywords,
+                             max_results=1, look_for_discography=False):
+        """
+        Returns the max_results best ScoredTorrent-s, best first.
+        See score_torrents for the parameters.
+        """
+        return heapq.nlargest(
+            max_results,
+            self.score_torrents(torrents, keywords, look_for_discography),
+            key=lambda scored_torrent: scored_torrent.score
+            )
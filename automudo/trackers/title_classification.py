@@ -0,0 +1,61 @@
+import re
+import functools
+from collections import namedtuple
+
+from automudo.music_metadata_databases.base import MusicMetadataDatabase
+
+TitleClassification = namedtuple(
+    "TitleClassification",
+    ["tags", "is_fancy", "is_remaster", "normalized_title", "words"]
+    )
+
+# The rules for tagging torrent titles: (tag, is-fancy, regex).
+# The regexes are matched against the lowercase title.
+# Fancy tags mark heavier, special releases (5.1, vinyl rips, ..).
+TITLE_TAG_RULES = [
+    ("hi-res", True, r"24(?:[\W\s]+192|[\W\s]*bit)"),
+    ("180-gram", True, r"180[\W\s]*gram"),
+    ("sacd", True, r"sacd"),
+    ("dsd", True, r"dsd"),
+    ("5.1", True, r"5\.1"),
+    ("dvd", True, r"dvd"),
+    ("vinyl", True, r"vinyl"),
+    ("remaster", False, r"remaster"),
+    ]
+
+FANCY_TAGS = frozenset(tag for tag, is_fancy, _ in TITLE_TAG_RULES
+                       if is_fancy)
+
+# All of the rules are matched in a single pass over the title,
+# each of them in its own named group.
+_TITLE_TAGS_REGEX = re.compile("|".join(
+    "(?P<tag{}>{})".format(rule_index, regex)
+    for rule_index, (_, _, regex) in enumerate(TITLE_TAG_RULES)
+    ))
+
+
+@functools.lru_cache(maxsize=4096)
+def classify_title(title):
+    """
+    Analyzes a torrent's title once, returning a TitleClassification:
+        tags - the tags (of TITLE_TAG_RULES) found in the title
+        is_fancy - whether the title is of a fancy release
+        is_remaster - whether the title is of a remaster
+        normalized_title - the normalized title
+                           (see MusicMetadataDatabase.normalize_music_description)
+        words - the set of words in the normalized title
+    Classifications are cached, as the same titles are seen
+    again and again throughout the filters and the ranking.
+    """
+    tags = frozenset(
+        TITLE_TAG_RULES[int(match.lastgroup[len("tag"):])][0]
+        for match in _TITLE_TAGS_REGEX.finditer(title.lower())
+        )
+    normalized_title = MusicMetadataDatabase.normalize_music_description(
+        title
+        )
+    return TitleClassification(tags=tags,
+                               is_fancy=not tags.isdisjoint(FANCY_TAGS),
+                               is_remaster="remaster" in tags,
+                               normalized_title=normalized_title,
+                               words=frozenset(normalized_title.split()))
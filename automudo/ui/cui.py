@@ -2,12 +2,16 @@ import os
 import sys
 import string
 import itertools
+import contextvars
 from collections import OrderedDict
-
-from unidecode import unidecode
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from . import user_selection_types
 
+# The amount of items (from the first one) that are kept
+# for showing them again when the user asks to repeat.
+MAX_REPEATED_ITEMS = 100
+
 
 def get_char_from_terminal():
     """
@@ -87,7 +91,7 @@ def let_user_choose_action(prompt, actions_descriptions,
 
 
 def let_user_choose_item(items_iterator, items_per_page,
-                         item_printer, prompt):
+                         item_printer, prompt, allow_permanent_skip=False):
     """
         Lets the user choose an item from a given iterator.
 
@@ -96,6 +100,13 @@ def let_user_choose_item(items_iterator, items_per_page,
             items_per_page - items shown in each items page
             item_printer - function that prints a given item
             prompt - the user prompt shown after each items page
+            allow_permanent_skip - optional. let the user request
+                                   to permanently skip the selection
+
+        While a page is shown, the next page is already read
+        in the background, so moving to it does not wait for slow
+        iterators (such as the ones which send requests).
+        Therefore the iterator must not be used after this function returns.
 
         Returns:
             A tuple: (user-selection-type, chosen-item).
@@ -104,13 +115,52 @@ def let_user_choose_item(items_iterator, items_per_page,
             NoItemsError - there are no items that
                            the user can choose from at all.
     """
-    items_iterator, items_iterator_backup = itertools.tee(items_iterator)
-
+    prefetch_executor = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="automudo-prefetch"
+        )
+    try:
+        return _let_user_choose_prefetched_item(
+            items_iterator, items_per_page, item_printer, prompt,
+            allow_permanent_skip, prefetch_executor
+            )
+    finally:
+        # A page which is being read is left to complete in the background.
+        prefetch_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _let_user_choose_prefetched_item(items_iterator, items_per_page,
+                                     item_printer, prompt,
+                                     allow_permanent_skip, prefetch_executor):
+    def read_page(iterator):
+        return list(itertools.islice(iterator, items_per_page))
+
+    def read_next_page_in_background(iterator):
+        # The page is read in a copy of the current context,
+        # so its requests see the same context variables (such as deadlines).
+        return prefetch_executor.submit(contextvars.copy_context().run,
+                                        read_page, iterator)
+
+    # The first items, for repeating them without keeping all of them.
+    repeated_items = []
+    is_repeating = False
     were_items_read = False
 
+    next_page = read_next_page_in_background(items_iterator)
     page_number = 1
     while True:
-        current_items = list(itertools.islice(items_iterator, items_per_page))
+        current_items = next_page.result()
+        if len(current_items) == items_per_page:
+            next_page = read_next_page_in_background(items_iterator)
+        else:
+            # The iterator is exhausted, there is no next page to read.
+            next_page = Future()
+            next_page.set_result([])
+
+        if not is_repeating:
+            repeated_items.extend(
+                current_items[:MAX_REPEATED_ITEMS - len(repeated_items)]
+                )
+
         if current_items:
             were_items_read = True
         elif were_items_read:
@@ -118,8 +168,9 @@ def let_user_choose_item(items_iterator, items_per_page,
                                                  OrderedDict([('y', ""),
                                                               ('N', "")]))
             if action_char == 'y':
-                new_iterators = itertools.tee(items_iterator_backup)
-                items_iterator, items_iterator_backup = new_iterators
+                items_iterator = iter(repeated_items)
+                is_repeating = True
+                next_page = read_next_page_in_background(items_iterator)
                 continue
             else:
                 return (user_selection_types.SKIPPED_SELECTION, None)
@@ -134,13 +185,18 @@ def let_user_choose_item(items_iterator, items_per_page,
             print()
             return (user_selection_types.ITEM_SELECTED, current_items[0])
 
+        actions = OrderedDict([('n', "next"),
+                               ('s', "skip")])
+        if allow_permanent_skip:
+            actions['p'] = "skip permanently"
         c = let_user_choose_action(
                 prompt,
-                OrderedDict([('n', "next"),
-                             ('s', "skip")]),
+                actions,
                 allowed_digits=range(1, items_per_page + 1))
         if c == 's':
             return (user_selection_types.SKIPPED_SELECTION, None)
+        elif c == 'p':
+            return (user_selection_types.PERMANENT_SKIP_REQUESTED, None)
         elif c.isdigit():
             return (user_selection_types.ITEM_SELECTED,
                     current_items[int(c) - 1])
@@ -153,4 +209,6 @@ def get_printable_string(s):
     """
     Returns a printable string which is visually similar to the given string.
     """
+    # unidecode is imported on first use, to keep the startup fast.
+    from unidecode import unidecode
     return unidecode(s)
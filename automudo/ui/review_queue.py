@@ -0,0 +1,135 @@
+import os
+import json
+import threading
+from collections import namedtuple, OrderedDict
+
+from automudo.music_metadata_databases.serialization import \
+    music_metadata_to_dict, music_metadata_from_dict
+
+# A title whose matches were ambiguous, waiting for the user's review.
+# Either album_candidates is set (a list of (album, probability)),
+# or album and torrent_candidates (a list of TorrentDetails) are set.
+ReviewEntry = namedtuple(
+    "ReviewEntry",
+    ["title", "album_candidates", "album", "torrent_candidates"]
+    )
+
+
+class ReviewQueue(object):
+    """
+        A persistent queue of titles whose matches were ambiguous.
+        Instead of waiting for the user in the middle of a run,
+        these titles are parked here and reviewed together later.
+    """
+
+    def __init__(self, queue_path):
+        """
+            Initializes the ReviewQueue object,
+            loading the queue file if it exists.
+        """
+        self.__queue_path = queue_path
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+
+        try:
+            with open(queue_path, "r", encoding="utf-8") as queue_file:
+                serialized_entries = json.load(queue_file)
+        except IOError:
+            serialized_entries = []  # The queue file does not exist.
+
+        for serialized_entry in serialized_entries:
+            entry = self._deserialize_entry(serialized_entry)
+            self.__entries[entry.title] = entry
+
+    @staticmethod
+    def _serialize_entry(entry):
+        return {
+            'title': entry.title,
+            'album_candidates': entry.album_candidates and [
+                [music_metadata_to_dict(album), probability]
+                for album, probability in entry.album_candidates
+                ],
+            'album': entry.album and music_metadata_to_dict(entry.album),
+            'torrent_candidates': entry.torrent_candidates and [
+                torrent._asdict() for torrent in entry.torrent_candidates
+                ]
+            }
+
+    @staticmethod
+    def _deserialize_entry(serialized_entry):
+        # The trackers' modules are slow to import (they import requests),
+        # and only the titles are needed for most runs.
+        from automudo.trackers.base import TorrentDetails
+        return ReviewEntry(
+            title=serialized_entry['title'],
+            album_candidates=serialized_entry['album_candidates'] and [
+                (music_metadata_from_dict(album), probability)
+                for album, probability in serialized_entry['album_candidates']
+                ],
+            album=(serialized_entry['album'] and
+                   music_metadata_from_dict(serialized_entry['album'])),
+            torrent_candidates=serialized_entry['torrent_candidates'] and [
+                TorrentDetails(**torrent)
+                for torrent in serialized_entry['torrent_candidates']
+                ]
+            )
+
+    def __save(self):
+        """
+            Writes the queue file.
+            The file is replaced only after it is completely written.
+        """
+        os.makedirs(os.path.dirname(self.__queue_path), exist_ok=True)
+        temporary_queue_path = self.__queue_path + ".tmp"
+        with open(temporary_queue_path, "w", encoding="utf-8") as queue_file:
+            json.dump([self._serialize_entry(entry)
+                       for entry in self.__entries.values()],
+                      queue_file, ensure_ascii=False, indent=1)
+        os.replace(temporary_queue_path, self.__queue_path)
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    def __contains__(self, title):
+        with self.__lock:
+            return title in self.__entries
+
+    def entries(self):
+        """
+            Returns a list of the ReviewEntry-s in the queue,
+            by the order they were added in.
+        """
+        with self.__lock:
+            return list(self.__entries.values())
+
+    def add_album_review(self, title, album_candidates):
+        """
+            Parks a title with several close album matches.
+            album_candidates is a list of (album, probability).
+        """
+        self.__add(ReviewEntry(title=title,
+                               album_candidates=album_candidates,
+                               album=None, torrent_candidates=None))
+
+    def add_torrent_review(self, title, album, torrent_candidates):
+        """
+            Parks a title whose album has several close torrent matches.
+            torrent_candidates is a list of TorrentDetails.
+        """
+        self.__add(ReviewEntry(title=title, album_candidates=None,
+                               album=album,
+                               torrent_candidates=torrent_candidates))
+
+    def __add(self, entry):
+        with self.__lock:
+            self.__entries[entry.title] = entry
+            self.__save()
+
+    def remove(self, title):
+        """
+            Removes a reviewed title from the queue.
+        """
+        with self.__lock:
+            if self.__entries.pop(title, None) is not None:
+                self.__save()
@@ -10,3 +10,7 @@ SKIPPED_SELECTION = 1
 NO_ITEMS_TO_SELECT_FROM = 2
 # The user has requested permanent skip
 PERMANENT_SKIP_REQUESTED = 3
+# The selection was deferred to a later review
+REVIEW_DEFERRED = 4
+# The selected item was added to a batch, which is saved later
+BATCHED = 5
@@ -0,0 +1,95 @@
+"""
+    Helpers for the asyncio-based parts of automudo.
+"""
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from . import http
+
+# Blocking calls (such as requests' HTTP requests) made from coroutines
+# are run in this shared pool, so that every event loop uses the same
+# bounded amount of threads.
+_BLOCKING_CALLS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=32, thread_name_prefix="automudo-blocking"
+    )
+
+
+def run_sync(awaitable):
+    """
+        Runs the given awaitable in a new event loop and returns its result.
+        Used by the thin synchronous wrappers of the asyncio-based functions.
+    """
+    async def await_it():
+        return await awaitable
+    return asyncio.run(await_it())
+
+
+def iterate_sync(async_iterable):
+    """
+        Returns a (lazy) iterator over the given asynchronous iterable.
+        Each item is awaited only when it is requested.
+    """
+    loop = asyncio.new_event_loop()
+    async_iterator = async_iterable.__aiter__()
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(async_iterator.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if hasattr(async_iterator, 'aclose'):
+            loop.run_until_complete(async_iterator.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+async def run_blocking(function, *args, **kwargs):
+    """
+        Runs a blocking function in a thread, without blocking the event loop,
+        and returns its result.
+        The function is run in a copy of the current context,
+        so it sees the caller's context variables.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _BLOCKING_CALLS_EXECUTOR,
+        functools.partial(context.run, function, *args, **kwargs)
+        )
+
+
+def async_throttle(seconds):
+    """
+        Decorates a coroutine function so that calls to it start
+        at least the given amount of seconds apart.
+        The pacing is shared by all threads and event loops,
+        and callers wait for their turn with asyncio.sleep,
+        so waiting does not hold a thread.
+        A caller takes its turn only when the call is made, so callers
+        whose requests were cancelled while waiting (see
+        http.cancellation) do not delay the other callers.
+    """
+    def decorator(function):
+        lock = threading.Lock()
+        next_call_time = 0
+
+        @functools.wraps(function)
+        async def throttled_function(*args, **kwargs):
+            nonlocal next_call_time
+            while True:
+                http.check_cancelled()
+                with lock:
+                    now = time.monotonic()
+                    if now >= next_call_time:
+                        next_call_time = now + seconds
+                        break
+                    wait_time = next_call_time - now
+                await asyncio.sleep(wait_time)
+            return await function(*args, **kwargs)
+        return throttled_function
+    return decorator
@@ -0,0 +1,128 @@
+"""
+    Decoding of bencoded data and of torrent files.
+
+    Torrent files are downloaded into memory as a whole (and then written
+    as they are), so they are decoded from that buffer rather than from
+    a stream. Only the positions of the info dictionary are kept for
+    computing the info-hash, so it is never encoded again.
+"""
+import hashlib
+from collections import namedtuple
+
+TorrentFileInfo = namedtuple("TorrentFileInfo",
+                             ["info_hash", "name", "total_size"])
+
+# Values are decoded recursively, so deeper lists and dictionaries
+# (which torrent files never have) are rejected as malformed,
+# rather than exhausting Python's recursion limit.
+MAX_NESTING_DEPTH = 100
+
+
+class BencodeError(ValueError):
+    """
+        Represents malformed bencoded data.
+    """
+    pass
+
+
+def _decode_at(data, index, depth=0):
+    """
+        Decodes the bencoded value which starts at the given index,
+        nested in depth lists and dictionaries.
+        Returns a tuple: (value, index-after-the-value).
+    """
+    try:
+        value_type = data[index:index + 1]
+        if value_type in (b"l", b"d") and depth >= MAX_NESTING_DEPTH:
+            raise BencodeError("Values nested too deeply at {}".format(index))
+        if value_type == b"i":
+            end_index = data.index(b"e", index)
+            return (int(data[index + 1:end_index]), end_index + 1)
+        elif value_type == b"l":
+            index += 1
+            values = []
+            while data[index:index + 1] != b"e":
+                value, index = _decode_at(data, index, depth + 1)
+                values.append(value)
+            return (values, index + 1)
+        elif value_type == b"d":
+            index += 1
+            dictionary = dict()
+            while data[index:index + 1] != b"e":
+                key, index = _decode_at(data, index, depth + 1)
+                if not isinstance(key, bytes):
+                    raise BencodeError("Non-string dictionary key")
+                dictionary[key], index = _decode_at(data, index, depth + 1)
+            return (dictionary, index + 1)
+        elif value_type.isdigit():
+            colon_index = data.index(b":", index)
+            start_index = colon_index + 1
+            end_index = start_index + int(data[index:colon_index])
+            if end_index > len(data):
+                raise BencodeError("Truncated string")
+            return (bytes(data[start_index:end_index]), end_index)
+    except ValueError as exception:
+        if isinstance(exception, BencodeError):
+            raise
+        raise BencodeError("Malformed value at {}".format(index))
+    raise BencodeError("Unexpected data at {}".format(index))
+
+
+def decode(data):
+    """
+        Decodes bencoded data.
+        Strings are decoded as bytes.
+
+        Raises:
+            BencodeError - the data is not a single bencoded value.
+    """
+    value, end_index = _decode_at(data, 0)
+    if end_index != len(data):
+        raise BencodeError("Unexpected data after the value")
+    return value
+
+
+def parse_torrent_file(contents):
+    """
+        Validates the contents of a torrent file and parses its details.
+
+        Returns:
+            TorrentFileInfo - the torrent's info-hash (hex string),
+                              name and total payload size (in bytes).
+
+        Raises:
+            BencodeError - the contents are not of a valid torrent file.
+    """
+    if contents[:1] != b"d":
+        raise BencodeError("A torrent file must be a dictionary")
+
+    # The info-hash is the hash of the bencoded info dictionary
+    # exactly as it appears in the file, so its position is needed.
+    index = 1
+    info = info_start_index = info_end_index = None
+    while contents[index:index + 1] != b"e":
+        key, index = _decode_at(contents, index, 1)
+        value_start_index = index
+        value, index = _decode_at(contents, index, 1)
+        if key == b"info":
+            info = value
+            info_start_index, info_end_index = value_start_index, index
+    if index + 1 != len(contents):
+        raise BencodeError("Unexpected data after the torrent")
+
+    if not isinstance(info, dict) or b"name" not in info:
+        raise BencodeError("The torrent has no valid info dictionary")
+    try:
+        if b"length" in info:
+            total_size = int(info[b"length"])
+        else:
+            total_size = sum(int(f[b"length"]) for f in info[b"files"])
+    except (KeyError, TypeError):
+        raise BencodeError("The torrent has no valid files list")
+
+    info_hash = hashlib.sha1(
+        contents[info_start_index:info_end_index]
+        ).hexdigest()
+    return TorrentFileInfo(info_hash=info_hash,
+                           name=info[b"name"].decode("utf-8", "replace"),
+                           total_size=total_size)
@@ -0,0 +1,345 @@
+"""
+    The shared HTTP layer of automudo.
+    Wraps requests with timeouts, deadlines, retries and
+    a circuit breaker per host, so that a stalled or a broken site
+    costs seconds instead of the whole run.
+"""
+import time
+import random
+import threading
+import contextlib
+import contextvars
+import email.utils
+from urllib.parse import urlsplit
+
+# The timeouts (in seconds) of connecting to a server
+# and of waiting for its data.
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# Idempotent requests are attempted up to this amount of times.
+MAX_ATTEMPTS = 4
+# The delays between the attempts grow exponentially from this base
+# (in seconds), and each of them is randomized ("full jitter").
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+# Servers may ask (by Retry-After) to wait longer than a run should,
+# so their delays are capped by this amount of seconds.
+RETRY_AFTER_MAX_DELAY = 5 * 60
+RETRIED_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+# After this amount of consecutive failures of a host,
+# requests to it fail immediately for the given amount of seconds.
+# The first request after that is a trial: if it fails too,
+# the circuit opens again.
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_OPEN_SECONDS = 60
+
+# The time (time.monotonic) by which the current requests should end.
+_deadline = contextvars.ContextVar("automudo_http_deadline", default=None)
+# A threading.Event which is set when the current requests are not needed.
+_cancel_event = contextvars.ContextVar("automudo_http_cancel_event",
+                                       default=None)
+
+# The amount of requests sent by this process (including retries).
+_sent_requests_count = 0
+_sent_requests_lock = threading.Lock()
+
+
+class HttpRequestError(Exception):
+    """
+        Represents an HTTP request which failed (after its retries).
+        The response attribute is the last failed response
+        (a requests.Response), or None if there is no such response.
+    """
+
+    def __init__(self, message, response=None):
+        super(HttpRequestError, self).__init__(message)
+        self.response = response
+
+
+class DeadlineExceededError(HttpRequestError):
+    """
+        Represents an HTTP request which could not end before the deadline.
+    """
+    pass
+
+
+class RequestCancelledError(HttpRequestError):
+    """
+        Represents an HTTP request which was not sent,
+        since its result is no longer needed.
+    """
+    pass
+
+
+class CircuitOpenError(HttpRequestError):
+    """
+        Represents an HTTP request to a host which keeps failing,
+        which was not sent at all.
+    """
+    pass
+
+
+class _CircuitBreaker(object):
+    """
+        Tracks the consecutive failures of a single host.
+    """
+
+    def __init__(self, host):
+        self.__host = host
+        self.__lock = threading.Lock()
+        self.__consecutive_failures = 0
+        self.__open_until = 0
+
+    def check(self):
+        """
+            Raises CircuitOpenError if requests to the host
+            should fail immediately.
+        """
+        with self.__lock:
+            if time.monotonic() < self.__open_until:
+                raise CircuitOpenError(
+                    "{} keeps failing, not sending requests to it for "
+                    "{:.0f} more seconds".format(
+                        self.__host, self.__open_until - time.monotonic()
+                        ))
+
+    def record_success(self):
+        with self.__lock:
+            self.__consecutive_failures = 0
+
+    def record_failure(self):
+        with self.__lock:
+            self.__consecutive_failures += 1
+            if self.__consecutive_failures >= CIRCUIT_BREAKER_FAILURES:
+                self.__open_until = \
+                    time.monotonic() + CIRCUIT_BREAKER_OPEN_SECONDS
+
+
+_circuit_breakers_lock = threading.Lock()
+_circuit_breakers = dict()
+
+
+def _get_circuit_breaker(url):
+    host = urlsplit(url).hostname
+    with _circuit_breakers_lock:
+        circuit_breaker = _circuit_breakers.get(host)
+        if circuit_breaker is None:
+            circuit_breaker = _circuit_breakers[host] = _CircuitBreaker(host)
+        return circuit_breaker
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """
+        A context manager which limits all of the HTTP requests made
+        in its block to end within the given amount of seconds.
+        The deadline is kept in a context variable, so it also applies
+        to the threads and coroutines started with the context
+        (such as by aio.run_blocking and aio.run_sync).
+        A nested deadline cannot extend the deadline around it.
+        None means no deadline.
+    """
+    if seconds is None:
+        yield
+        return
+
+    deadline_time = time.monotonic() + seconds
+    if _deadline.get() is not None:
+        deadline_time = min(deadline_time, _deadline.get())
+    token = _deadline.set(deadline_time)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextlib.contextmanager
+def cancellation(cancel_event):
+    """
+        A context manager which stops the HTTP requests made in its block
+        once the given threading.Event is set: requests which are not
+        sent yet raise RequestCancelledError instead of being sent.
+        Like the deadline, it is kept in a context variable.
+        A request which is already being sent is not interrupted.
+    """
+    token = _cancel_event.set(cancel_event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def check_cancelled():
+    """
+        Raises RequestCancelledError if the current requests
+        were cancelled (see cancellation).
+    """
+    cancel_event = _cancel_event.get()
+    if cancel_event is not None and cancel_event.is_set():
+        raise RequestCancelledError("The requests were cancelled")
+
+
+def _wait_before_retry(seconds):
+    """
+        Waits the given amount of seconds before retrying a request.
+        Raises RequestCancelledError as soon as the current requests
+        are cancelled (see cancellation).
+    """
+    cancel_event = _cancel_event.get()
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        raise RequestCancelledError("The requests were cancelled")
+
+
+def get_remaining_time():
+    """
+        Returns the amount of seconds left until the deadline,
+        or None if there is no deadline.
+
+        Raises:
+            DeadlineExceededError - the deadline has passed.
+    """
+    deadline_time = _deadline.get()
+    if deadline_time is None:
+        return None
+    remaining_time = deadline_time - time.monotonic()
+    if remaining_time <= 0:
+        raise DeadlineExceededError("The deadline has passed")
+    return remaining_time
+
+
+def get_sent_requests_count():
+    """
+        Returns the amount of requests sent so far (including retries),
+        for enforcing the request budgets of runs.
+    """
+    with _sent_requests_lock:
+        return _sent_requests_count
+
+
+def _count_sent_request():
+    global _sent_requests_count
+    with _sent_requests_lock:
+        _sent_requests_count += 1
+
+
+def get_retry_after(response):
+    """
+        Returns the amount of seconds in the Retry-After header
+        (given in seconds or as a date) of a response,
+        or None if there is no such header.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    if retry_after.isdigit():
+        return int(retry_after)
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retry_date.timestamp() - time.time())
+
+
+def get_retry_delay(attempt, response):
+    """
+        Returns the amount of seconds to wait before the next attempt.
+        A Retry-After header is respected, up to RETRY_AFTER_MAX_DELAY.
+    """
+    if response is not None:
+        retry_after = get_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, RETRY_AFTER_MAX_DELAY)
+    return random.uniform(
+        0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+        )
+
+
+def request(method, url, session=None, idempotent=None, **request_args):
+    """
+        Sends an HTTP request and returns the response (a requests.Response).
+
+        Parameters:
+            method - the HTTP method
+            url - the requested URL
+            session - optional. the requests.Session to send the request in
+            idempotent - optional. whether the request may be sent again.
+                         defaults to True for GET, HEAD and OPTIONS requests
+            request_args - the rest of the arguments of requests.request
+                           (params, data, headers, cookies, ..)
+
+        Idempotent requests which fail (by a connection error, a timeout
+        or a retried status code) are retried with jittered exponential
+        delays. Responses with other statuses are returned as they are,
+        so the callers should check their statuses.
+
+        Raises:
+            CircuitOpenError - the host keeps failing.
+            DeadlineExceededError - the request could not end
+                                    before the deadline.
+            RequestCancelledError - the request was cancelled
+                                    (see cancellation).
+            HttpRequestError - the request failed (including by a retried
+                               status code, when the attempts run out).
+    """
+    # requests is slow to import, so it is imported on first use.
+    import requests
+
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    max_attempts = MAX_ATTEMPTS if idempotent else 1
+    circuit_breaker = _get_circuit_breaker(url)
+
+    for attempt in range(1, max_attempts + 1):
+        check_cancelled()
+        circuit_breaker.check()
+        remaining_time = get_remaining_time()
+        read_timeout = READ_TIMEOUT
+        if remaining_time is not None:
+            read_timeout = min(read_timeout, remaining_time)
+
+        response = None
+        _count_sent_request()
+        try:
+            response = (session or requests).request(
+                method, url,
+                timeout=(min(CONNECT_TIMEOUT, read_timeout), read_timeout),
+                **request_args
+                )
+        except (requests.ConnectionError, requests.Timeout) as exception:
+            circuit_breaker.record_failure()
+            if attempt == max_attempts:
+                raise HttpRequestError(
+                    "{} {} failed: {}".format(method, url, exception)
+                    ) from exception
+        except requests.RequestException as exception:
+            raise HttpRequestError(
+                "{} {} failed: {}".format(method, url, exception)
+                ) from exception
+        else:
+            if response.status_code >= 500:
+                circuit_breaker.record_failure()
+            else:
+                circuit_breaker.record_success()
+            if response.status_code not in RETRIED_STATUS_CODES:
+                return response
+            if attempt == max_attempts:
+                raise HttpRequestError(
+                    "{} {} failed: status {}".format(
+                        method, url, response.status_code
+                        ),
+                    response=response
+                    )
+
+        retry_delay = get_retry_delay(attempt, response)
+        remaining_time = get_remaining_time()
+        if remaining_time is not None and retry_delay >= remaining_time:
+            raise DeadlineExceededError(
+                "{} {} could not be retried before the deadline".format(
+                    method, url
+                    ))
+        _wait_before_retry(retry_delay)
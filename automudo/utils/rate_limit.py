@@ -0,0 +1,98 @@
+"""
+    Pacing of requests by the request budget that a server reports.
+"""
+import time
+import asyncio
+import threading
+
+from .http import get_retry_after, RETRY_AFTER_MAX_DELAY
+
+
+class AdaptiveRateLimiter(object):
+    """
+        Paces requests to a server which reports its rate limit
+        in the headers of its responses: the amount of requests allowed
+        in a moving window, and the amount of them which remain.
+
+        While much of the budget remains, requests are sent at once.
+        As it runs out, the remaining requests are spread over the window.
+        A response with Retry-After (429 - too many requests)
+        holds all of the requests for the given time.
+
+        The pacing is shared by all threads and event loops,
+        and callers wait for their turn with asyncio.sleep
+        (as with aio.async_throttle).
+    """
+
+    def __init__(self, limit_header, remaining_header,
+                 window_seconds=60, initial_interval=1, burst_ratio=0.25):
+        """
+            Initializes the AdaptiveRateLimiter object.
+
+            Parameters:
+                limit_header - the header of the amount of requests
+                               allowed in the window
+                remaining_header - the header of the amount of requests
+                                   which remain in the window
+                window_seconds - optional. the length of the window
+                initial_interval - optional. the seconds between requests
+                                   until the server reports its budget
+                burst_ratio - optional. requests are not paced while
+                              more than this part of the budget remains
+        """
+        self.__limit_header = limit_header
+        self.__remaining_header = remaining_header
+        self.__window_seconds = window_seconds
+        self.__initial_interval = initial_interval
+        self.__burst_ratio = burst_ratio
+
+        self.__lock = threading.Lock()
+        self.__next_call_time = 0
+        self.__limit = None
+        # The reported remaining budget, minus the requests
+        # which were sent since it was reported.
+        self.__remaining = None
+
+    def __get_interval(self):
+        if self.__remaining is None:
+            return self.__initial_interval
+        if self.__remaining > self.__limit * self.__burst_ratio:
+            return 0
+        return self.__window_seconds / max(self.__remaining, 1)
+
+    async def wait_async(self):
+        """
+            Waits for the turn of the next request.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            call_time = max(now, self.__next_call_time)
+            self.__next_call_time = call_time + self.__get_interval()
+            if self.__remaining is not None:
+                self.__remaining = max(0, self.__remaining - 1)
+        await asyncio.sleep(call_time - now)
+
+    def update(self, response):
+        """
+            Updates the budget by the headers of a response
+            (a requests.Response).
+        """
+        retry_after = None
+        if response.status_code == 429:
+            retry_after = get_retry_after(response)
+            if retry_after is None:
+                retry_after = self.__window_seconds
+            retry_after = min(retry_after, RETRY_AFTER_MAX_DELAY)
+
+        with self.__lock:
+            try:
+                self.__limit = int(response.headers[self.__limit_header])
+                self.__remaining = int(
+                    response.headers[self.__remaining_header]
+                    )
+            except (KeyError, ValueError):
+                pass  # The response does not report the budget.
+            if retry_after is not None:
+                self.__remaining = 0
+                self.__next_call_time = max(self.__next_call_time,
+                                            time.monotonic() + retry_after)
@@ -0,0 +1,74 @@
+"""
+    A lazy registry of the implementations of a plugin kind
+    (browsers, trackers, music metadata databases).
+"""
+import importlib
+
+
+class PluginRegistry(object):
+    """
+        Names the implementations of a plugin kind by import paths
+        ("package.module:ClassName"), so that an implementation
+        (and the modules it depends on) is imported only when it is used.
+
+        Implementations from other packages are found by the entry points
+        group "automudo.<kind>s", which is looked up only for names
+        that are not built-in.
+    """
+
+    def __init__(self, kind, implementations):
+        """
+            Initializes the PluginRegistry object.
+
+            Parameters:
+                kind - the kind of the plugins, such as "tracker"
+                implementations - a dictionary of the built-in implementations:
+                                  name -> "package.module:ClassName"
+        """
+        self.__kind = kind
+        self.__implementations = dict(implementations)
+        self.__entry_points_group = "automudo.{}s".format(kind)
+
+    def __get_entry_points(self):
+        # importlib.metadata is slow to import, so it is imported
+        # only when a name is not built-in.
+        from importlib.metadata import entry_points
+        return {entry_point.name: entry_point
+                for entry_point in entry_points(
+                    group=self.__entry_points_group
+                    )}
+
+    def get_names(self):
+        """
+            Returns the sorted names of all of the implementations.
+        """
+        return sorted(set(self.__implementations) |
+                      set(self.__get_entry_points()))
+
+    def load(self, name):
+        """
+            Imports the implementation with the given name and returns it.
+
+            Raises:
+                KeyError - there is no implementation with the given name.
+        """
+        import_path = self.__implementations.get(name)
+        if import_path is None:
+            entry_point = self.__get_entry_points().get(name)
+            if entry_point is None:
+                raise KeyError(
+                    "{} {} not found. Supported {}s are: {}".format(
+                        self.__kind.capitalize(), name, self.__kind,
+                        ", ".join(self.get_names())
+                        ))
+            return entry_point.load()
+
+        module_name, class_name = import_path.split(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def create(self, name, **kwargs):
+        """
+            Initializes an object of the implementation with the given name
+            using kwargs.
+        """
+        return self.load(name)(**kwargs)
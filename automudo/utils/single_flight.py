@@ -0,0 +1,68 @@
+import threading
+
+
+class _Call(object):
+    """
+        A single call made by SingleFlight.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+        Coalesces calls that share a key, so that the work for each key
+        is done only once.
+        Callers that arrive while the work for their key is in flight
+        wait for it and share its result.
+        Results are kept for the lifetime of the SingleFlight object.
+    """
+
+    def __init__(self):
+        """
+            Initializes the SingleFlight object.
+        """
+        self.__lock = threading.Lock()
+        self.__calls = dict()
+
+    def __contains__(self, key):
+        """
+            Checks if a call was already made for the given key.
+        """
+        with self.__lock:
+            return key in self.__calls
+
+    def do(self, key, function, *args, **kwargs):
+        """
+            Returns the result of function(*args, **kwargs) for the given key.
+            The function is only called if no call was made for the key yet.
+
+            If the call raises an exception, the exception is raised
+            to all of the callers waiting for it, and the key is forgotten
+            (so that the next caller tries again).
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            is_first_caller = call is None
+            if is_first_caller:
+                call = _Call()
+                self.__calls[key] = call
+
+        if not is_first_caller:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+        except BaseException as exception:
+            call.exception = exception
+            with self.__lock:
+                del self.__calls[key]
+            raise
+        finally:
+            call.done.set()
+        return call.result
@@ -0,0 +1,268 @@
+"""
+    A work queue shared by several worker processes,
+    kept in a local SQLite database (in WAL mode).
+"""
+import time
+import sqlite3
+import threading
+import contextlib
+
+WORK_QUEUE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS titles (
+        title TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        worker_id TEXT,
+        lease_expiration REAL,
+        available_time REAL NOT NULL DEFAULT 0,
+        outcome,
+        completion_time REAL
+    );
+    CREATE INDEX IF NOT EXISTS titles_by_state
+    ON titles (state, available_time);
+    CREATE TABLE IF NOT EXISTS releases (
+        release_key TEXT PRIMARY KEY,
+        worker_id TEXT,
+        lease_expiration REAL,
+        outcome,
+        completion_time REAL
+    );
+"""
+
+# The amount of seconds for which a worker holds a title or a release.
+# Leases which were not completed by then (for example, since the worker
+# was killed) are reclaimed by the other workers.
+DEFAULT_LEASE_SECONDS = 15 * 60
+
+# The states of the titles in the queue.
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+# The results of claim_release.
+RELEASE_CLAIMED = "claimed"
+RELEASE_BUSY = "busy"
+
+
+class WorkQueue(object):
+    """
+        A queue of titles which several workers (processes, each with
+        its own WorkQueue object) handle together.
+
+        A worker claims a title with a time-limited lease, and records its
+        outcome when it is done. The albums themselves are claimed the same
+        way (by their release keys), so that titles of the same album which
+        are handled by different workers are downloaded only once.
+        Leases of workers which stopped are reclaimed after they expire.
+    """
+
+    def __init__(self, queue_path, worker_id,
+                 lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+            Initializes the WorkQueue object.
+            The queue file is created if it does not exist.
+
+            Parameters:
+                queue_path - the path of the queue's SQLite database
+                worker_id - a unique identifier of this worker
+                lease_seconds - optional. the lifetime of the leases
+        """
+        self.__worker_id = worker_id
+        self.__lease_seconds = lease_seconds
+        self.__lock = threading.Lock()
+        # Transactions are managed explicitly (see __transaction),
+        # so that claims take the write lock before reading.
+        self.__connection = sqlite3.connect(queue_path, timeout=60,
+                                            isolation_level=None,
+                                            check_same_thread=False)
+        with self.__lock:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.executescript(WORK_QUEUE_SCHEMA)
+            # Queues created by older versions lack the completion times
+            # of the releases.
+            releases_columns = [
+                column[1] for column in self.__connection.execute(
+                    "PRAGMA table_info(releases)"
+                    )
+                ]
+            if 'completion_time' not in releases_columns:
+                self.__connection.execute(
+                    "ALTER TABLE releases ADD COLUMN completion_time REAL"
+                    )
+
+    @contextlib.contextmanager
+    def __transaction(self):
+        """
+            A write transaction which takes the database's write lock
+            when it begins (BEGIN IMMEDIATE), so that workers which read
+            and then update the queue do not race each other.
+            Must be used with the lock held.
+        """
+        self.__connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.__connection.execute("ROLLBACK")
+            raise
+        self.__connection.execute("COMMIT")
+
+    def add_titles(self, titles, listing_time):
+        """
+            Adds titles to the queue. Titles which are already in it
+            are not added again, unless they were done before listing_time
+            (the time.time() at which the caller decided that they
+            should be handled), meaning that they should be handled again.
+            Albums downloaded before listing_time may be downloaded again
+            as well (for example, if their torrents were deleted),
+            since titles of theirs are still listed.
+        """
+        with self.__lock, self.__transaction():
+            self.__connection.execute(
+                "DELETE FROM releases WHERE completion_time < ?",
+                (listing_time,)
+                )
+            self.__connection.executemany(
+                "INSERT INTO titles (title, state) VALUES (?, ?) "
+                "ON CONFLICT (title) DO UPDATE SET "
+                "state = excluded.state, worker_id = NULL, "
+                "lease_expiration = NULL, available_time = 0, "
+                "outcome = NULL, completion_time = NULL "
+                "WHERE state = ? AND completion_time < ?",
+                [(title, PENDING, DONE, listing_time) for title in titles]
+                )
+
+    def claim_title(self):
+        """
+            Claims the next available title (pending, or leased
+            by a worker whose lease has expired).
+            Returns the title, or None if there are no available titles.
+        """
+        now = time.time()
+        with self.__lock, self.__transaction():
+            row = self.__connection.execute(
+                "SELECT title FROM titles "
+                "WHERE (state = ? AND available_time <= ?) OR "
+                "      (state = ? AND lease_expiration < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (PENDING, now, LEASED, now)
+                ).fetchone()
+            if row is None:
+                return None
+            self.__connection.execute(
+                "UPDATE titles SET state = ?, worker_id = ?, "
+                "lease_expiration = ? WHERE title = ?",
+                (LEASED, self.__worker_id, now + self.__lease_seconds, row[0])
+                )
+            return row[0]
+
+    def renew_title_lease(self, title):
+        """
+            Renews the lease of a title claimed by this worker
+            (for titles which take long to handle).
+        """
+        with self.__lock, self.__transaction():
+            self.__connection.execute(
+                "UPDATE titles SET lease_expiration = ? "
+                "WHERE title = ? AND worker_id = ? AND state = ?",
+                (time.time() + self.__lease_seconds, title,
+                 self.__worker_id, LEASED)
+                )
+
+    def has_postponed_titles(self):
+        """
+            Checks if there are pending titles which are not available yet
+            (see postpone_title).
+        """
+        with self.__lock:
+            return self.__connection.execute(
+                "SELECT 1 FROM titles WHERE state = ? AND available_time > ?",
+                (PENDING, time.time())
+                ).fetchone() is not None
+
+    def complete_title(self, title, outcome):
+        """
+            Records the outcome of a title claimed by this worker.
+            A None outcome means that the title should be handled again
+            in a later run, so it is removed from the queue instead.
+        """
+        with self.__lock, self.__transaction():
+            if outcome is None:
+                self.__connection.execute(
+                    "DELETE FROM titles WHERE title = ? AND worker_id = ?",
+                    (title, self.__worker_id)
+                    )
+            else:
+                self.__connection.execute(
+                    "UPDATE titles SET state = ?, outcome = ?, "
+                    "lease_expiration = NULL, completion_time = ? "
+                    "WHERE title = ? AND worker_id = ?",
+                    (DONE, outcome, time.time(), title, self.__worker_id)
+                    )
+
+    def postpone_title(self, title, seconds):
+        """
+            Returns a title claimed by this worker to the queue,
+            to be claimed again after the given amount of seconds.
+        """
+        with self.__lock, self.__transaction():
+            self.__connection.execute(
+                "UPDATE titles SET state = ?, worker_id = NULL, "
+                "lease_expiration = NULL, available_time = ? "
+                "WHERE title = ? AND worker_id = ?",
+                (PENDING, time.time() + seconds, title, self.__worker_id)
+                )
+
+    def claim_release(self, release_key):
+        """
+            Claims an album (by its release key) before downloading it.
+
+            Returns:
+                RELEASE_CLAIMED - this worker should download the album
+                                  (and then call complete_release)
+                RELEASE_BUSY - another worker is downloading the album
+                otherwise - the outcome recorded by the worker
+                            which has already downloaded the album
+                            (since the last listing, see add_titles)
+        """
+        now = time.time()
+        with self.__lock, self.__transaction():
+            row = self.__connection.execute(
+                "SELECT worker_id, lease_expiration, outcome FROM releases "
+                "WHERE release_key = ?",
+                (release_key,)
+                ).fetchone()
+            if row is not None:
+                worker_id, lease_expiration, outcome = row
+                if outcome is not None:
+                    return outcome
+                if worker_id != self.__worker_id and lease_expiration >= now:
+                    return RELEASE_BUSY
+
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO releases "
+                "(release_key, worker_id, lease_expiration, outcome) "
+                "VALUES (?, ?, ?, NULL)",
+                (release_key, self.__worker_id, now + self.__lease_seconds)
+                )
+            return RELEASE_CLAIMED
+
+    def complete_release(self, release_key, outcome):
+        """
+            Records the outcome of an album claimed by this worker.
+            A None outcome means that the album was not downloaded
+            (for example, it was skipped), so other workers may claim it.
+        """
+        with self.__lock, self.__transaction():
+            if outcome is None:
+                self.__connection.execute(
+                    "DELETE FROM releases "
+                    "WHERE release_key = ? AND worker_id = ?",
+                    (release_key, self.__worker_id)
+                    )
+            else:
+                self.__connection.execute(
+                    "UPDATE releases SET outcome = ?, "
+                    "lease_expiration = NULL, completion_time = ? "
+                    "WHERE release_key = ? AND worker_id = ?",
+                    (outcome, time.time(), release_key, self.__worker_id)
+                    )
+
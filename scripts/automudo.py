@@ -1,32 +1,217 @@
 #! python3
 import os
 import re
-import sys
 import csv
+import time
+import socket
+import datetime
 import itertools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
-import yaml
 from appdirs import user_data_dir
 
 from automudo.ui import cui, user_selection_types
+from automudo.ui.review_queue import ReviewQueue
 from automudo.browsers.factory import create_browser
 from automudo.trackers.factory import create_tracker
+from automudo.trackers.downloaded_torrents import \
+    DownloadedTorrentsIndex, DownloadedTorrent
+from automudo.trackers.magnet_links import \
+    build_magnet_link, MagnetLinksBatch
 from automudo.music_metadata_databases.factory \
     import create_music_metadata_database
-from automudo.music_metadata_databases.base import MusicMetadata
+from automudo.music_metadata_databases.base import MusicMetadataDatabase
+from automudo.music_metadata_databases.pending_titles \
+    import PendingTitlesIndex
+from automudo.music_metadata_databases.resolution_cache \
+    import ResolutionCache
+from automudo.trackers.scoring import ScoredTorrent
+from automudo.planning import RunPlanner, RunBudget
+from automudo.scheduling import TitleScheduler
+from automudo.retry_schedule import RetrySchedule
 from automudo.utils.data_sizes import build_data_size_string
+from automudo.utils.single_flight import SingleFlight
+from automudo.utils.bencode import parse_torrent_file, BencodeError
+from automudo.utils import http
 
 
-TITLES_TO_SKIP_FILE = os.path.join(user_data_dir('Automudo', 'Automudo'),
+AUTOMUDO_DATA_DIRECTORY = user_data_dir('Automudo', 'Automudo')
+TITLES_TO_SKIP_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY,
                                    ".automudo_permanent_skips.csv")
+TORRENTS_CATALOG_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY,
+                                     "torrents_catalog.sqlite")
+DOWNLOADED_TORRENTS_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY,
+                                        "downloaded_torrents.csv")
+# The file into which magnet links are written, in the "magnets_file"
+# output format. It is created in the output directory.
+MAGNET_LINKS_FILE_NAME = "magnets.txt"
+RUTRACKER_FORUMS_MAP_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY,
+                                         "rutracker_forums.json")
+REVIEW_QUEUE_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY,
+                                 "review_queue.json")
+WORK_QUEUE_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY, "work_queue.sqlite")
+RETRY_SCHEDULE_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY,
+                                   "retry_schedule.csv")
+RESOLUTION_CACHE_FILE = os.path.join(AUTOMUDO_DATA_DIRECTORY,
+                                     "resolution_cache.jsonl")
+
+# Titles skipped for these reasons are searched again later
+# (see RetrySchedule), as albums are added to the trackers all the time.
+NO_MATCH_SKIP_REASONS = frozenset(["no matching albums",
+                                   "no matching torrents"])
+
+# An album match at least this probable is taken
+# without looking for other close matches.
+CERTAIN_ALBUM_MATCH_PROBABILITY = 0.97
+# Album matches whose probabilities are this close are ambiguous.
+AMBIGUOUS_ALBUM_MATCHES_MARGIN = 0.02
+# Torrents whose scores (see TorrentScorer) are this close are ambiguous.
+AMBIGUOUS_TORRENTS_SCORE_MARGIN = 0.1
+# The amount of ranked torrents each search strategy returns.
+RANKED_TORRENTS_PER_SEARCH = 5
+# Titles are grouped by their probable artist, and the titles of an artist
+# with at least this amount of titles are looked up together.
+MIN_ARTIST_TITLES_TO_GROUP = 2
+# In worker mode: a title whose album is being downloaded by another worker
+# is handled again after this amount of seconds,
+POSTPONED_TITLE_DELAY_SECONDS = 60
+# and a worker which has only postponed titles left
+# checks the queue again every this amount of seconds.
+WORK_QUEUE_POLL_SECONDS = 10
+
+
+class _ReleaseBusyError(Exception):
+    """
+        Raised when the album of a title is being downloaded
+        by another worker.
+    """
+    pass
+
+
+def _get_torrent_search_strategies(album, tracker, **search_args):
+    """
+        Returns the torrent search strategies for the given album,
+        ordered by priority.
+        Each strategy is a function which returns a list of the best
+        ScoredTorrent-s it has found (best first), which may be empty.
+    """
+    def find_by_whole_name():
+        # Search: "artist title".
+        return tracker.find_ranked_torrents_by_keywords(
+            [" ".join([album.artist, album.title])],
+            max_results=RANKED_TORRENTS_PER_SEARCH, **search_args
+            )
+
+    def find_by_artist_and_title():
+        # Search: "artist" "title".
+        return tracker.find_ranked_torrents_by_keywords(
+            [album.artist, album.title],
+            max_results=RANKED_TORRENTS_PER_SEARCH, **search_args
+            )
+
+    def find_discography():
+        # Discographies are not ranked, so they are never ambiguous.
+        torrent = tracker.find_best_discography_torrent(
+            album.artist, **search_args
+            )
+        if torrent is None:
+            return []
+        return [ScoredTorrent(score=None, torrent=torrent, breakdown=None)]
+
+    return [find_by_whole_name, find_by_artist_and_title, find_discography]
+
+
+def _run_search_strategies_sequentially(strategies):
+    """
+        Runs the strategies one after the other, until one of them
+        finds torrents. Returns the found ScoredTorrent-s (or an empty list).
+    """
+    for strategy_index, strategy in enumerate(strategies):
+        if strategy_index == len(strategies) - 1:
+            print("No matching torrents. Looking for discography..")
+        ranked_torrents = strategy()
+        if ranked_torrents:
+            return ranked_torrents
+    return []
+
+
+def _run_cancellable_strategy(strategy, cancel_event):
+    with http.cancellation(cancel_event):
+        return strategy()
+
+
+def _run_search_strategies_speculatively(strategies):
+    """
+        Runs all of the strategies in parallel and returns the torrents
+        found by the first strategy (in priority order) that found any.
+        The requests themselves are still paced by the tracker's throttle.
+
+        Once the result is known, the rest of the strategies are cancelled:
+        their requests which are not sent yet are dropped (see
+        http.cancellation), so they do not take the throttle's turns.
+        Note that a strategy which is already in the middle
+        of a request completes it in the background.
+    """
+    cancel_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(strategies))
+    try:
+        # Each strategy runs in a copy of the current context,
+        # so it respects the title's deadline (see utils.http).
+        futures = [executor.submit(contextvars.copy_context().run,
+                                   _run_cancellable_strategy,
+                                   strategy, cancel_event)
+                   for strategy in strategies]
+        for future in futures:
+            ranked_torrents = future.result()
+            if ranked_torrents:
+                return ranked_torrents
+        return []
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _print_torrent(torrent):
+    print(cui.get_printable_string(
+        "{} [{}s/{}l, {}]".format(
+            torrent.title, torrent.seeders, torrent.leechers,
+            build_data_size_string(torrent.size_in_bytes)
+            )
+        ))
+
+
+def let_user_choose_torrent(torrents):
+    """
+        Lets the user choose one of several close torrents.
+        Returns a tuple: (user-selection-type, torrent-details).
+    """
+    def print_torrent(index, torrent):
+        print("{}. ".format(index), end="")
+        _print_torrent(torrent)
+
+    return cui.let_user_choose_item(
+        iter(torrents), RANKED_TORRENTS_PER_SEARCH, print_torrent,
+        "Which torrent should be downloaded?", allow_permanent_skip=True
+        )
 
 
 def find_torrent_for_album(album, tracker,
                            allow_fancy_releases=False, allow_remasters=False,
+                           speculative_search=False,
+                           ambiguous_matches="take_best",
                            **kwargs):
     """
     Finds a torrent of the given album in the given tracker.
+    When speculative_search is set, all of the search strategies
+    are launched at once instead of one after the other.
+    When there are several close torrents, the ambiguous_matches mode
+    decides (see find_album_in_database).
+
     Returns a tuple: (user-selection-type, torrent-details).
+    When the selection is deferred (REVIEW_DEFERRED), a list of
+    the close torrents is returned instead of the torrent's details.
     """
     print("* * * * * Searching Torrent * * * * *")
     print(
@@ -34,127 +219,521 @@ def find_torrent_for_album(album, tracker,
         cui.get_printable_string(" - ".join([album.artist, album.title]))
         )
 
-    # Try to search: "artist title".
-    # If no results, search: "artist" "title".
-    torrent = tracker.find_best_torrent_by_keywords(
-        [" ".join([album.artist, album.title])],
+    strategies = _get_torrent_search_strategies(
+        album, tracker,
         allow_fancy_releases=allow_fancy_releases,
         allow_remasters=allow_remasters
         )
-    if torrent is None:
-        torrent = tracker.find_best_torrent_by_keywords(
-            [album.artist, album.title],
-            allow_fancy_releases=allow_fancy_releases,
-            allow_remasters=allow_remasters
-            )
-    if torrent is None:
-        print("No matching torrents. Looking for discography..")
-        torrent = tracker.find_best_discography_torrent(
-            album.artist,
-            allow_fancy_releases=allow_fancy_releases,
-            allow_remasters=allow_remasters
-            )
+    if speculative_search:
+        ranked_torrents = _run_search_strategies_speculatively(strategies)
+    else:
+        ranked_torrents = _run_search_strategies_sequentially(strategies)
 
-    if torrent is None:
+    if not ranked_torrents:
         print("No matching torrents were found.")
-        user_selection_type = user_selection_types.NO_ITEMS_TO_SELECT_FROM
+        print()
+        return (user_selection_types.NO_ITEMS_TO_SELECT_FROM, None)
+
+    best_score = ranked_torrents[0].score
+    close_torrents = [
+        scored_torrent.torrent for scored_torrent in ranked_torrents
+        if scored_torrent.score is not None and
+        best_score - scored_torrent.score < AMBIGUOUS_TORRENTS_SCORE_MARGIN
+        ]
+    if ambiguous_matches != "take_best" and len(close_torrents) > 1:
+        print("Found {} close torrents.".format(len(close_torrents)))
+        if ambiguous_matches == "defer":
+            print("Deferring the selection to a later review..")
+            print()
+            return (user_selection_types.REVIEW_DEFERRED, close_torrents)
+        user_selection_type, torrent = let_user_choose_torrent(
+            close_torrents
+            )
     else:
-        print(cui.get_printable_string(
-            "Match: {} [{}s/{}l, {}]".format(
-                torrent.title, torrent.seeders, torrent.leechers,
-                build_data_size_string(torrent.size_in_bytes)
-                )
-            ))
         user_selection_type = user_selection_types.ITEM_SELECTED
+        torrent = ranked_torrents[0].torrent
 
+    if user_selection_type == user_selection_types.ITEM_SELECTED:
+        print("Match: ", end="")
+        _print_torrent(torrent)
     print()
     return (user_selection_type, torrent)
 
 
-def download_album_torrent(album, tracker, torrents_dir, **tracker_config):
+def _build_album_file_name(album, torrent_details, extension):
+    return re.sub(
+        r'[\/:*?"<>|]', '_',
+        "{} - {} [{}].{}".format(album.artist, album.title,
+                                 torrent_details.torrent_id, extension)
+        )
+
+
+def _record_duplicate_torrent(downloaded_torrent, torrent_details,
+                              downloaded_torrents):
+    """
+    Records that a torrent has the same info-hash as a torrent which was
+    already downloaded, so that titles which resolve to it later
+    are skipped by its identifier, without downloading it again.
+    """
+    downloaded_torrents.add(downloaded_torrent._replace(
+        tracker_name=torrent_details.tracker_name,
+        torrent_id=torrent_details.torrent_id
+        ))
+
+
+def _save_torrent_file(album, torrent_details, tracker, torrents_dir,
+                       downloaded_torrents):
     """
-    Downloads torrent for the music album.
+    Downloads the torrent file of the album and saves it.
+    Returns user_selection_types of the torrent selection.
+    """
+    torrent_file_contents = tracker.get_torrent_file_contents(
+        torrent_details.torrent_id, tracker_name=torrent_details.tracker_name
+        )
+    try:
+        torrent_file_info = parse_torrent_file(torrent_file_contents)
+    except BencodeError as exception:
+        print("The downloaded torrent file is invalid ({}). Skipping..".format(
+            exception
+            ))
+        print()
+        return user_selection_types.SKIPPED_SELECTION
+
+    downloaded_torrent = downloaded_torrents.find_by_info_hash(
+        torrent_file_info.info_hash
+        )
+    if downloaded_torrent is not None:
+        print("The same torrent was already downloaded:",
+              cui.get_printable_string(downloaded_torrent.file_name))
+        print()
+        _record_duplicate_torrent(downloaded_torrent, torrent_details,
+                                  downloaded_torrents)
+        return user_selection_types.ITEM_SELECTED
+
+    torrent_file_name = _build_album_file_name(album, torrent_details,
+                                               "torrent")
+    torrent_file_path = os.path.join(torrents_dir, torrent_file_name)
+
+    os.makedirs(torrents_dir, exist_ok=True)
+    with open(torrent_file_path, "wb") as torrent_file:
+        torrent_file.write(torrent_file_contents)
+
+    downloaded_torrents.add(DownloadedTorrent(
+        tracker_name=torrent_details.tracker_name,
+        torrent_id=torrent_details.torrent_id,
+        info_hash=torrent_file_info.info_hash,
+        total_size=torrent_file_info.total_size,
+        file_name=torrent_file_name
+        ))
+    return user_selection_types.ITEM_SELECTED
+
+
+def _save_magnet_link_file(album, torrent_details, tracker, torrents_dir,
+                           downloaded_torrents):
+    """
+    Saves the magnet link of the album's torrent in a .magnet file
+    (instead of downloading its torrent file).
+    Returns user_selection_types of the torrent selection.
+    """
+    info_hash = tracker.get_torrents_info_hashes(
+        [torrent_details.torrent_id],
+        tracker_name=torrent_details.tracker_name
+        ).get(torrent_details.torrent_id)
+    if info_hash is None:
+        print("Could not get the magnet link of the torrent. Skipping..")
+        print()
+        return user_selection_types.SKIPPED_SELECTION
+
+    downloaded_torrent = downloaded_torrents.find_by_info_hash(info_hash)
+    if downloaded_torrent is not None:
+        print("The same torrent was already downloaded:",
+              cui.get_printable_string(downloaded_torrent.file_name))
+        print()
+        _record_duplicate_torrent(downloaded_torrent, torrent_details,
+                                  downloaded_torrents)
+        return user_selection_types.ITEM_SELECTED
+
+    magnet_file_name = _build_album_file_name(album, torrent_details,
+                                              "magnet")
+    os.makedirs(torrents_dir, exist_ok=True)
+    with open(os.path.join(torrents_dir, magnet_file_name), "w",
+              encoding="utf-8") as magnet_file:
+        magnet_file.write(build_magnet_link(info_hash, torrent_details.title))
+
+    downloaded_torrents.add(DownloadedTorrent(
+        tracker_name=torrent_details.tracker_name,
+        torrent_id=torrent_details.torrent_id,
+        info_hash=info_hash,
+        total_size=torrent_details.size_in_bytes,
+        file_name=magnet_file_name
+        ))
+    return user_selection_types.ITEM_SELECTED
+
+
+def download_album_torrent(album, tracker, torrents_dir,
+                           downloaded_torrents, magnet_links_batch=None,
+                           output_format="torrent", **tracker_config):
+    """
+    Finds a torrent for the music album and downloads it.
 
     Parameters:
         album - the metadata of the album to download
         tracker - the tracker to download from
         torrents_dir - the directory into which the torrents will be saved
+        downloaded_torrents - the index of the already downloaded torrents
+        magnet_links_batch - the MagnetLinksBatch to add the torrent to,
+                             when output_format is "magnets_file"
+        output_format - "torrent" for saving .torrent files,
+                        "magnet" for saving a .magnet file per torrent,
+                        or "magnets_file" for adding the torrent's magnet
+                        link to the magnet_links_batch
         tracker_config - the tracker's configuration
 
     Returns:
-        user_selection_types of the torrent selection.
+        (user_selection_types of the torrent selection,
+         the close torrents when the selection was deferred,
+         the TorrentDetails of the torrent when it was batched, or None).
     """
     user_selection_type, torrent_details = find_torrent_for_album(
         album, tracker, **tracker_config
         )
+    if user_selection_type == user_selection_types.REVIEW_DEFERRED:
+        return (user_selection_type, torrent_details)
+    if user_selection_type != user_selection_types.ITEM_SELECTED:
+        return (user_selection_type, None)
+
+    user_selection_type = save_album_torrent(
+        album, torrent_details, tracker, torrents_dir, downloaded_torrents,
+        magnet_links_batch, output_format
+        )
+    if user_selection_type == user_selection_types.BATCHED:
+        return (user_selection_type, torrent_details)
+    return (user_selection_type, None)
+
+
+def save_album_torrent(album, torrent_details, tracker, torrents_dir,
+                       downloaded_torrents, magnet_links_batch=None,
+                       output_format="torrent"):
+    """
+    Saves the chosen torrent of the music album, in the given output format
+    (see download_album_torrent).
+    Torrents which were already downloaded (by torrent identifier
+    or by info-hash) are not downloaded again.
+    Returns user_selection_types of the torrent selection:
+    BATCHED when the torrent was added to the magnet links batch,
+    which is saved later (see save_magnet_links_batch).
+    """
+    user_selection_type = user_selection_types.ITEM_SELECTED
+    downloaded_torrent = downloaded_torrents.find_by_torrent_id(
+        torrent_details.tracker_name, torrent_details.torrent_id
+        )
+    if downloaded_torrent is not None:
+        print("This torrent was already downloaded:",
+              cui.get_printable_string(downloaded_torrent.file_name))
+        print()
+        return user_selection_type
+
+    if output_format == "magnets_file":
+        magnet_links_batch.add(torrent_details, torrent_details.title)
+        return user_selection_types.BATCHED
+    elif output_format == "magnet":
+        return _save_magnet_link_file(album, torrent_details, tracker,
+                                      torrents_dir, downloaded_torrents)
+    else:
+        return _save_torrent_file(album, torrent_details, tracker,
+                                  torrents_dir, downloaded_torrents)
 
-    if user_selection_type == user_selection_types.ITEM_SELECTED:
-        torrent_file_name = re.sub(
-            r'[\/:*?"<>|]', '_',
-            "{} - {} [{}].torrent".format(album.artist, album.title,
-                                          torrent_details.torrent_id)
-            )
-        torrent_file_path = os.path.join(torrents_dir, torrent_file_name)
 
-        os.makedirs(torrents_dir, exist_ok=True)
-        with open(torrent_file_path, "wb") as torrent_file:
-            torrent_file_contents = tracker.get_torrent_file_contents(
-                torrent_details.torrent_id
+def save_magnet_links_batch(magnet_links_batch, downloaded_torrents):
+    """
+    Writes the magnet links collected in the batch into the magnet links file,
+    skipping torrents which were already downloaded (by info-hash).
+    Returns a set of the (tracker name, torrent identifier) of the saved
+    torrents (including the ones which were already downloaded).
+    Torrents whose info-hashes were not resolved are not saved.
+    """
+    resolved_torrents = magnet_links_batch.flush(
+        lambda info_hash:
+        downloaded_torrents.find_by_info_hash(info_hash) is not None
+        )
+    saved_torrents = set()
+    for torrent_details, info_hash, was_written in resolved_torrents:
+        saved_torrents.add((torrent_details.tracker_name,
+                            str(torrent_details.torrent_id)))
+        if was_written:
+            downloaded_torrents.add(DownloadedTorrent(
+                tracker_name=torrent_details.tracker_name,
+                torrent_id=torrent_details.torrent_id,
+                info_hash=info_hash,
+                total_size=torrent_details.size_in_bytes,
+                file_name=MAGNET_LINKS_FILE_NAME
+                ))
+        elif downloaded_torrents.find_by_torrent_id(
+                torrent_details.tracker_name,
+                torrent_details.torrent_id) is None:
+            _record_duplicate_torrent(
+                downloaded_torrents.find_by_info_hash(info_hash),
+                torrent_details, downloaded_torrents
                 )
-            torrent_file.write(torrent_file_contents)
+    return saved_torrents
 
-    return user_selection_type
+
+def write_batched_titles(batched_titles, saved_torrents,
+                         skipped_titles_file_writer, metadata_database_name):
+    """
+    Writes the titles whose torrents were batched into the titles to skip
+    file, once their torrents were saved (see save_magnet_links_batch).
+    batched_titles is a dictionary of (tracker name, torrent identifier)
+    -> a list of (title, release identifier).
+    Titles whose torrents were not saved are handled again in the next run.
+    """
+    for torrent_key, titles in batched_titles.items():
+        if torrent_key not in saved_torrents:
+            continue
+        for title, release_id in titles:
+            skipped_titles_file_writer.writerow({
+                'bookmark-title': title,
+                'release-id': release_id,
+                'metadata-database-name': metadata_database_name,
+                'reason': get_skip_reason(user_selection_types.ITEM_SELECTED,
+                                          "torrents")
+                })
 
 
 def get_titles_of_downloaded_albums():
     """
         Returns an iterator of the bookmark titles
         for whom torrents were already downloaded
-        in the previous runs of the program.
+        in the previous runs of the program
+        (or which should be skipped for other reasons).
+        Titles which only had no matches are not included
+        (see get_titles_without_matches).
     """
     try:
         with open(TITLES_TO_SKIP_FILE, "r",
                   encoding="utf-8", newline="") as input_file:
             for row in csv.DictReader(input_file):
-                yield row['bookmark-title']
+                if row['reason'] not in NO_MATCH_SKIP_REASONS:
+                    yield row['bookmark-title']
     except IOError:
         pass  # The downloads file does not exist.
 
 
-def find_album_in_database(title, metadata_database):
+def get_titles_without_matches():
+    """
+        Returns an iterator of the bookmark titles for whom
+        no matching albums or torrents were found in the previous runs.
+    """
+    try:
+        with open(TITLES_TO_SKIP_FILE, "r",
+                  encoding="utf-8", newline="") as input_file:
+            for row in csv.DictReader(input_file):
+                if row['reason'] in NO_MATCH_SKIP_REASONS:
+                    yield row['bookmark-title']
+    except IOError:
+        pass  # The downloads file does not exist.
+
+
+def update_retry_schedule(retry_schedule, title, skip_reason):
+    """
+        Records a failed attempt of a title which had no matches.
+    """
+    if retry_schedule is not None and skip_reason in NO_MATCH_SKIP_REASONS:
+        retry_schedule.add_failed_attempt(title)
+
+
+def let_user_choose_album(album_matches):
+    """
+        Lets the user choose one of several close album matches,
+        given as (album, probability) tuples.
+        Returns a tuple: (user-selection-type, (album, probability)).
+    """
+    def print_album_match(index, album_match):
+        album, probability = album_match
+        print(cui.get_printable_string(
+            "{}. [{:.2%}] {} - {} ({}, {})".format(
+                index, probability, album.artist, album.title,
+                album.date.year if album.date else "?",
+                ", ".join(album.formats)
+                )
+            ))
+
+    return cui.let_user_choose_item(
+        iter(album_matches), RANKED_TORRENTS_PER_SEARCH, print_album_match,
+        "Which album matches?", allow_permanent_skip=True
+        )
+
+
+def find_album_in_database(title, metadata_database,
+                           ambiguous_matches="take_best",
+                           on_album_fetched=None, on_album_resolved=None):
     """
         Looks for an album by title in the given metadata database.
-        If no matching albums were found, asks the user for help.
-        The user may choose to skip.
+        When there are several close matches, the ambiguous_matches mode
+        decides what to do:
+            take_best - take the best match
+            ask - ask the user to choose
+            defer - defer the choice to a later review
+        The optional on_album_fetched is called with every album
+        fetched from the database (see MusicMetadataDatabase.find_album).
+        The optional on_album_resolved is called with the chosen
+        (album, probability).
 
         Returns:
             (user-selection-type, album-metadata).
+            When the choice is deferred (REVIEW_DEFERRED), a list of
+            the close (album, probability) matches is returned instead
+            of the album's metadata.
     """
     print("* * * * * Searching Album * * * * *")
     print("For:", cui.get_printable_string(title))
 
-    possible_matches = metadata_database.find_album(title)
-    # find_album only returns good matches, simply take the first.
+    possible_matches = metadata_database.find_album(
+        title, on_album_fetched=on_album_fetched
+        )
+    # find_album only returns good matches, so by default
+    # simply take the first.
     first_match = next(possible_matches, None)
     if first_match is None:
         print("Couldn't find metadata for album. Skipping..")
-        user_selection_type = user_selection_types.NO_ITEMS_TO_SELECT_FROM
-        album = None
-    else:
-        user_selection_type = user_selection_types.ITEM_SELECTED
+        print()
+        print()
+        return (user_selection_types.NO_ITEMS_TO_SELECT_FROM, None)
+
+    close_matches = [first_match]
+    if ambiguous_matches != "take_best" and \
+            first_match[1] < CERTAIN_ALBUM_MATCH_PROBABILITY:
+        close_matches.extend(
+            match for match in possible_matches
+            if match[1] > first_match[1] - AMBIGUOUS_ALBUM_MATCHES_MARGIN
+            )
+
+    user_selection_type = user_selection_types.ITEM_SELECTED
+    if len(close_matches) > 1:
+        print("Found {} close matches.".format(len(close_matches)))
+        if ambiguous_matches == "defer":
+            print("Deferring the choice to a later review..")
+            print()
+            print()
+            return (user_selection_types.REVIEW_DEFERRED, close_matches)
+        user_selection_type, first_match = let_user_choose_album(
+            close_matches
+            )
+
+    album = None
+    if user_selection_type == user_selection_types.ITEM_SELECTED:
         album, probability = first_match
         print(cui.get_printable_string(
             'Match [{:.2%}]:  {} - {}'.format(
                 probability, album.artist, album.title
                 )
             ))
+        if on_album_resolved is not None:
+            on_album_resolved(first_match)
     print()
     print()
     return (user_selection_type, album)
 
 
+def get_probable_artist(title):
+    """
+        Returns the normalized probable artist of a bookmark title
+        (the part before " - "), or None if the title has no such part.
+    """
+    artist, separator, _ = title.partition(" - ")
+    if not separator:
+        return None
+    return MusicMetadataDatabase.normalize_music_description(artist) or None
+
+
+def resolve_titles_by_artist(artist, titles, metadata_database,
+                             pending_titles):
+    """
+        Looks up the titles of a single (probable) artist together,
+        using a single listing of the artist's albums.
+        The matched titles are resolved in the pending titles index,
+        and the rest of them are looked up one by one later.
+    """
+    print("* * * * * Searching Artist * * * * *")
+    print("For: {} ({} titles)".format(cui.get_printable_string(artist),
+                                       len(titles)))
+    matches = metadata_database.find_artist_albums(
+        artist, titles, on_album_fetched=pending_titles.match_album
+        )
+    for title, (album, probability) in matches.items():
+        pending_titles.resolve(title, album, probability)
+    print("Matched {} of the titles.".format(len(matches)))
+    print()
+    print()
+
+
+def use_resolved_album(title, album_match,
+                       header="Matched While Searching Another Title"):
+    """
+        Uses the (album, probability) which the title was resolved to
+        (while looking for another title, or in an earlier run)
+        instead of looking for it.
+        Returns (user-selection-type, album-metadata),
+        like find_album_in_database.
+    """
+    album, probability = album_match
+    print("* * * * * {} * * * * *".format(header))
+    print("For:", cui.get_printable_string(title))
+    print(cui.get_printable_string(
+        'Match [{:.2%}]:  {} - {}'.format(
+            probability, album.artist, album.title
+            )
+        ))
+    print()
+    print()
+    return (user_selection_types.ITEM_SELECTED, album)
+
+
+def open_titles_to_skip_file():
+    """
+        Opens the titles to skip file for appending.
+        Returns (the opened file, a csv.DictWriter of it).
+    """
+    file_existed = os.path.exists(TITLES_TO_SKIP_FILE)
+    if not file_existed:
+        # Make sure that the directory exists
+        os.makedirs(os.path.dirname(TITLES_TO_SKIP_FILE), exist_ok=True)
+
+    output_file = open(TITLES_TO_SKIP_FILE, "a+",
+                       encoding="utf-8", newline="")
+    skipped_titles_file_writer = csv.DictWriter(
+        output_file,
+        ['bookmark-title', 'release-id',
+         'metadata-database-name', 'reason']
+        )
+    if not file_existed:
+        skipped_titles_file_writer.writeheader()
+    return (output_file, skipped_titles_file_writer)
+
+
+def get_skip_reason(user_selection_type, searched_items_name):
+    """
+        Returns the reason written into the titles to skip file
+        for a title with the given user selection type,
+        or None if the title should be searched again in the next run.
+        searched_items_name is "albums" or "torrents".
+    """
+    if user_selection_type == user_selection_types.NO_ITEMS_TO_SELECT_FROM:
+        return "no matching {}".format(searched_items_name)
+    return {
+        user_selection_types.ITEM_SELECTED: "torrent downloaded",
+        user_selection_types.PERMANENT_SKIP_REQUESTED:
+            "permanent skip requested"
+        }.get(user_selection_type)
+
+
 def download_albums_by_titles(titles_to_download, metadata_database,
-                              tracker, torrents_dir, **tracker_config):
+                              tracker, torrents_dir, review_queue=None,
+                              ambiguous_matches="take_best",
+                              title_deadline_seconds=None,
+                              work_queue=None, retry_schedule=None,
+                              resolution_cache=None, run_budget=None,
+                              **tracker_config):
     """
         Downloads torrents for the albums matching the given titles.
 
@@ -165,56 +744,391 @@ def download_albums_by_titles(titles_to_download, metadata_database,
             tracker - the torrents tracker to download the albums from
             torrents_dir - the directory into which the downloaded torrents
                            will be written
+            review_queue - the ReviewQueue into which ambiguous titles
+                           are parked, when ambiguous_matches is "defer"
+            ambiguous_matches - what to do with several close matches
+                                (see find_album_in_database)
+            title_deadline_seconds - optional. the amount of seconds
+                                     in which all of the requests for
+                                     a single title should end.
+                                     Not applied when the user is asked
+                                     to choose between matches.
+            work_queue - optional. a WorkQueue shared with other workers.
+                         When given, the titles are claimed from it
+                         (instead of handled in order), and the albums
+                         are claimed before they are downloaded.
+            retry_schedule - optional. the RetrySchedule into which titles
+                             without matches are recorded
+            resolution_cache - optional. the ResolutionCache of the albums
+                               which titles were resolved to. Cached titles
+                               skip the album lookup, and new resolutions
+                               are recorded in it.
+            run_budget - optional. the RunBudget of the run. Once it is
+                         used up, the rest of the titles are left
+                         for the next run.
             tracker_config - tracker configuration
+
+        Titles whose requests fail (or whose tracker login fails)
+        are reported and skipped (without being written
+        into the skips file), so they are handled again in the next run.
     """
-    file_existed = os.path.exists(TITLES_TO_SKIP_FILE)
-    if not file_existed:
-        # Make sure that the directory exists
-        os.makedirs(os.path.dirname(TITLES_TO_SKIP_FILE), exist_ok=True)
+    # The trackers' modules are slow to import (they import requests),
+    # and the tracker is already created by now.
+    from automudo.trackers.base import TrackerLoginError
 
-    with open(TITLES_TO_SKIP_FILE, "a+",
-              encoding="utf-8", newline="") as output_file:
-        skipped_titles_file_writer = csv.DictWriter(
-            output_file,
-            ['bookmark-title', 'release-id',
-             'metadata-database-name', 'reason']
-            )
-        if not file_existed:
-            skipped_titles_file_writer.writeheader()
+    downloaded_torrents = DownloadedTorrentsIndex(DOWNLOADED_TORRENTS_FILE)
+    # Used when the magnet links are written into a single file.
+    # The titles of the batched torrents are written into the skips file
+    # only once their magnet links are saved (see write_batched_titles).
+    magnet_links_batch = MagnetLinksBatch(
+        tracker, os.path.join(torrents_dir, MAGNET_LINKS_FILE_NAME)
+        )
+    batched_titles = dict()
+    if ambiguous_matches == "ask":
+        title_deadline_seconds = None
 
-        for title in titles_to_download:
-            user_selection_type, album = find_album_in_database(
-                title, metadata_database
-                )
-            if user_selection_type == user_selection_types.NO_ITEMS_TO_SELECT_FROM:
-                skipped_titles_file_writer.writerow({
-                    'bookmark-title': title,
-                    'release-id': "",
-                    'metadata-database-name': metadata_database.name,
-                    'reason': "no matching albums"
-                    })
-                continue  # Skips the torrent downloading as well.
+    output_file, skipped_titles_file_writer = open_titles_to_skip_file()
+    with output_file:
+        # Bookmarks are often several tracks of the same album.
+        # Titles with the same normalized form share a single album lookup,
+        # and titles which resolve to the same release share
+        # a single torrent search and download.
+        # Each title still gets its own row in the skips file.
+        album_lookups = SingleFlight()
+        torrent_downloads = SingleFlight()
+        # Every album fetched while looking for one title is matched
+        # against all of the pending titles, so other titles of the same
+        # album are resolved without looking for them again.
+        # Unless the best match is always taken, only certain matches
+        # are resolved this way, since they skip the ambiguity checks.
+        titles_to_download = list(titles_to_download)
+        # Titles whose albums are cached are not looked up at all.
+        titles_to_look_up = [
+            title for title in titles_to_download
+            if resolution_cache is None or title not in resolution_cache
+            ]
+        pending_titles = PendingTitlesIndex(
+            titles_to_look_up,
+            min_probability=(
+                MusicMetadataDatabase.GOOD_MATCH_PROBABILITY
+                if ambiguous_matches == "take_best"
+                else CERTAIN_ALBUM_MATCH_PROBABILITY
+                ))
+
+        # Bookmarks folders tend to hold many titles of the same artist,
+        # which are looked up together when the first of them is reached.
+        titles_by_artist = dict()
+        for title in titles_to_look_up:
+            artist = get_probable_artist(title)
+            if artist is not None:
+                titles_by_artist.setdefault(artist, []).append(title)
+        looked_up_artists = set()
+
+        def record_resolution(title, album_match):
+            if resolution_cache is not None:
+                resolution_cache.add(title, *album_match)
 
-            assert user_selection_type == user_selection_types.ITEM_SELECTED
+        def download_claimed_album_torrent(album, release_key):
+            # Claims the album in the work queue (if there is one),
+            # so that other workers do not download it too.
+            if work_queue is None:
+                return download_album_torrent(
+                    album, tracker, torrents_dir, downloaded_torrents,
+                    magnet_links_batch, ambiguous_matches=ambiguous_matches,
+                    **tracker_config
+                    )
 
-            user_selection_type = download_album_torrent(
-                album, tracker, torrents_dir, **tracker_config
+            # The work queue (and sqlite3) is only used by workers.
+            from automudo.utils.work_queue import \
+                RELEASE_CLAIMED, RELEASE_BUSY
+            release_key = "{}:{}".format(*release_key)
+            release_state = work_queue.claim_release(release_key)
+            if release_state == RELEASE_BUSY:
+                raise _ReleaseBusyError()
+            if release_state != RELEASE_CLAIMED:
+                print("Another worker has already handled this torrent.")
+                print()
+                return (release_state, None)
+
+            release_outcome = None
+            try:
+                user_selection_type, close_torrents = download_album_torrent(
+                    album, tracker, torrents_dir, downloaded_torrents,
+                    magnet_links_batch, ambiguous_matches=ambiguous_matches,
+                    **tracker_config
+                    )
+                # Only downloads (and batched magnet links) are recorded.
+                # Albums without torrents (or skipped by the user)
+                # may be claimed again, for example when their titles'
+                # retries are due.
+                if user_selection_type in (user_selection_types.ITEM_SELECTED,
+                                           user_selection_types.BATCHED):
+                    release_outcome = user_selection_type
+            finally:
+                work_queue.complete_release(release_key, release_outcome)
+            return (user_selection_type, close_torrents)
+
+        def download_album_by_title(title):
+            # Returns the outcome of the title: the reason written
+            # into the skips file, "review deferred", or None if
+            # the title should be handled again in the next run.
+            cached_album = None
+            if resolution_cache is not None:
+                cached_album = resolution_cache.get(title)
+            artist = get_probable_artist(title)
+            # Titles claimed from the work queue may have been listed
+            # by another worker, and are not grouped.
+            if cached_album is None and artist is not None and \
+                    artist not in looked_up_artists and \
+                    len(titles_by_artist.get(artist, ())) >= \
+                    MIN_ARTIST_TITLES_TO_GROUP:
+                looked_up_artists.add(artist)
+                resolve_titles_by_artist(artist, titles_by_artist[artist],
+                                         metadata_database, pending_titles)
+
+            normalized_title = \
+                metadata_database.normalize_music_description(title)
+            resolved_album = pending_titles.pop_resolved_album(title)
+            if normalized_title in album_lookups:
+                print("Reusing the album lookup of a similar title for:",
+                      cui.get_printable_string(title))
+            if cached_album is not None:
+                user_selection_type, album = album_lookups.do(
+                    normalized_title,
+                    use_resolved_album, title, cached_album,
+                    "Resolved In An Earlier Run"
+                    )
+            elif resolved_album is not None:
+                record_resolution(title, resolved_album)
+                user_selection_type, album = album_lookups.do(
+                    normalized_title,
+                    use_resolved_album, title, resolved_album
+                    )
+            else:
+                user_selection_type, album = album_lookups.do(
+                    normalized_title,
+                    find_album_in_database, title, metadata_database,
+                    ambiguous_matches, pending_titles.match_album,
+                    lambda album_match: record_resolution(title, album_match)
+                    )
+            if user_selection_type == user_selection_types.REVIEW_DEFERRED:
+                review_queue.add_album_review(title, album)
+                return "review deferred"
+            if user_selection_type != user_selection_types.ITEM_SELECTED:
+                skip_reason = get_skip_reason(user_selection_type, "albums")
+                if skip_reason is not None:
+                    skipped_titles_file_writer.writerow({
+                        'bookmark-title': title,
+                        'release-id': "",
+                        'metadata-database-name': metadata_database.name,
+                        'reason': skip_reason
+                        })
+                return skip_reason  # Skips the torrent downloading as well.
+
+            if work_queue is not None:
+                work_queue.renew_title_lease(title)
+            release_key = (album.metadata_database_name, album.release_id)
+            if release_key in torrent_downloads:
+                print(cui.get_printable_string(
+                    "Already handled the torrent of: {} - {}".format(
+                        album.artist, album.title
+                        )
+                    ))
+                print()
+            user_selection_type, close_torrents = torrent_downloads.do(
+                release_key,
+                download_claimed_album_torrent, album, release_key
                 )
-            if user_selection_type == user_selection_types.NO_ITEMS_TO_SELECT_FROM:
-                skipped_titles_file_writer.writerow({
-                    'bookmark-title': title,
-                    'release-id': album.release_id,
-                    'metadata-database-name': metadata_database.name,
-                    'reason': "no matching torrents"
-                    })
-            elif user_selection_type == user_selection_types.ITEM_SELECTED:
-                # A torrent was chosen.
+            if user_selection_type == user_selection_types.REVIEW_DEFERRED:
+                review_queue.add_torrent_review(title, album, close_torrents)
+                return "review deferred"
+            if user_selection_type == user_selection_types.BATCHED:
+                # The torrent is missing when another worker batched it.
+                # The title is then handled again in the next run.
+                batched_torrent = close_torrents
+                if batched_torrent is not None:
+                    batched_titles.setdefault(
+                        (batched_torrent.tracker_name,
+                         str(batched_torrent.torrent_id)),
+                        []
+                        ).append((title, album.release_id))
+                return "magnet link batched"
+            skip_reason = get_skip_reason(user_selection_type, "torrents")
+            if skip_reason is not None:
                 skipped_titles_file_writer.writerow({
                     'bookmark-title': title,
                     'release-id': album.release_id,
                     'metadata-database-name': metadata_database.name,
-                    'reason': "torrent downloaded"
+                    'reason': skip_reason
                     })
+            return skip_reason
+
+        def handle_title(title):
+            try:
+                with http.deadline(title_deadline_seconds):
+                    outcome = download_album_by_title(title)
+                update_retry_schedule(retry_schedule, title, outcome)
+                return outcome
+            except (http.HttpRequestError, TrackerLoginError) as exception:
+                print("Handling the title failed: {}".format(exception))
+                print("It will be handled again in the next run.")
+                print()
+                print()
+                return None
+            finally:
+                # Other workers may be appending to the skips file as well.
+                output_file.flush()
+
+        def is_budget_used_up():
+            if run_budget is None or not run_budget.is_used_up():
+                return False
+            print("The budget of the run is used up. "
+                  "The rest of the titles are left for the next run.")
+            print()
+            return True
+
+        if work_queue is None:
+            for title in titles_to_download:
+                if is_budget_used_up():
+                    break
+                handle_title(title)
+        else:
+            handle_work_queue_titles(work_queue, handle_title,
+                                     is_budget_used_up)
+
+        # The batched magnet links are saved only when the titles
+        # were handled, since saving them sends requests. When the run
+        # fails (or is interrupted), their titles are handled again
+        # in the next run.
+        write_batched_titles(
+            batched_titles,
+            save_magnet_links_batch(magnet_links_batch, downloaded_torrents),
+            skipped_titles_file_writer, metadata_database.name
+            )
+
+
+def handle_work_queue_titles(work_queue, handle_title,
+                             should_stop=lambda: False):
+    """
+        Claims titles from the work queue and handles them
+        (using handle_title, which returns the outcome of a title),
+        until no titles are left in the queue, or until should_stop
+        returns True (the rest of the titles are left to other workers).
+    """
+    while True:
+        if should_stop():
+            return
+        title = work_queue.claim_title()
+        if title is None:
+            if not work_queue.has_postponed_titles():
+                return
+            time.sleep(WORK_QUEUE_POLL_SECONDS)
+            continue
+
+        try:
+            outcome = handle_title(title)
+        except _ReleaseBusyError:
+            print("Another worker is downloading the album of:",
+                  cui.get_printable_string(title))
+            print("It will be handled again later.")
+            print()
+            print()
+            work_queue.postpone_title(title, POSTPONED_TITLE_DELAY_SECONDS)
+        except BaseException:
+            work_queue.complete_title(title, None)
+            raise
+        else:
+            work_queue.complete_title(title, outcome)
+
+
+def review_deferred_titles(review_queue, metadata_database, tracker,
+                           torrents_dir, retry_schedule=None,
+                           resolution_cache=None, **tracker_config):
+    """
+        Lets the user review the titles parked in the review queue,
+        one after the other, and downloads the chosen torrents.
+        Titles the user skips stay in the queue for the next review.
+        Titles without matches are recorded in the optional retry_schedule,
+        and the chosen albums in the optional resolution_cache.
+    """
+    downloaded_torrents = DownloadedTorrentsIndex(DOWNLOADED_TORRENTS_FILE)
+    magnet_links_batch = MagnetLinksBatch(
+        tracker, os.path.join(torrents_dir, MAGNET_LINKS_FILE_NAME)
+        )
+    batched_titles = dict()
+    output_format = tracker_config.pop('output_format', "torrent")
+
+    output_file, skipped_titles_file_writer = open_titles_to_skip_file()
+    with output_file:
+        for entry in review_queue.entries():
+            print("* * * * * Reviewing * * * * *")
+            print("For:", cui.get_printable_string(entry.title))
+            print()
+
+            album = entry.album
+            if album is None:
+                user_selection_type, album_match = let_user_choose_album(
+                    entry.album_candidates
+                    )
+                if user_selection_type == user_selection_types.ITEM_SELECTED:
+                    album = album_match[0]
+                    if resolution_cache is not None:
+                        resolution_cache.add(entry.title, *album_match)
+                print()
+            if album is not None:
+                if entry.torrent_candidates:
+                    tracker.remember_torrents(entry.torrent_candidates)
+                    user_selection_type, torrent_details = \
+                        let_user_choose_torrent(entry.torrent_candidates)
+                    print()
+                else:
+                    user_selection_type, torrent_details = \
+                        find_torrent_for_album(
+                            album, tracker, ambiguous_matches="ask",
+                            **tracker_config
+                            )
+                if user_selection_type == user_selection_types.ITEM_SELECTED:
+                    user_selection_type = save_album_torrent(
+                        album, torrent_details, tracker, torrents_dir,
+                        downloaded_torrents, magnet_links_batch,
+                        output_format
+                        )
+
+            if user_selection_type == user_selection_types.BATCHED:
+                # Written into the skips file once the magnet link
+                # is saved, or handled again in the next run.
+                batched_titles.setdefault(
+                    (torrent_details.tracker_name,
+                     str(torrent_details.torrent_id)),
+                    []
+                    ).append((entry.title, album.release_id))
+                continue
+            skip_reason = get_skip_reason(user_selection_type, "torrents")
+            if skip_reason is None:
+                continue  # Stays in the queue for the next review.
+            skipped_titles_file_writer.writerow({
+                'bookmark-title': entry.title,
+                'release-id': album.release_id if album else "",
+                'metadata-database-name': metadata_database.name,
+                'reason': skip_reason
+                })
+            output_file.flush()
+            update_retry_schedule(retry_schedule, entry.title,
+                                  skip_reason)
+            review_queue.remove(entry.title)
+
+        # As in download_albums_by_titles, the batched magnet links
+        # are saved only when the review ends normally. The titles
+        # whose magnet links were not saved stay in the review queue.
+        saved_torrents = save_magnet_links_batch(magnet_links_batch,
+                                                 downloaded_torrents)
+        write_batched_titles(batched_titles, saved_torrents,
+                             skipped_titles_file_writer,
+                             metadata_database.name)
+        for torrent_key, titles in batched_titles.items():
+            if torrent_key in saved_torrents:
+                for title, _ in titles:
+                    review_queue.remove(title)
 
 
 def read_selection_field_from_config(config, field_name):
@@ -245,18 +1159,41 @@ def read_selection_field_from_config(config, field_name):
     return (selected, settings_for_selected)
 
 
-def main(config, keywords):
+def read_multiple_selection_field_from_config(config, field_name):
     """
-        The entry point of the automudo program.
+        Reads a selection field in which several options may be selected
+        (use: [banana, apple]) as:
+            (shared-settings,
+             [(selected-option, selected-option-settings), ..]).
+        The settings of each selected option include the shared settings.
+        A single selected option (use: banana) is supported as well.
     """
-    browser_name, browser_settings = read_selection_field_from_config(
-        config, 'browser'
-        )
-    browser = create_browser(
-        browser_name,
-        **browser_settings
-        )
+    all_configs_field_name = '{}s'.format(field_name)
+    selected = config[field_name]['use']
+    if isinstance(selected, str):
+        selected = [selected]
+    all_field_configs = config[field_name][all_configs_field_name]
+
+    shared_settings = {
+        key: value for key, value in config[field_name].items()
+        if key not in ['use', all_configs_field_name]
+        }
+    selections = []
+    for selected_option in selected:
+        settings_for_selected = dict(shared_settings)
+        if all_field_configs[selected_option] is not None:
+            settings_for_selected.update(all_field_configs[selected_option])
+        selections.append((selected_option, settings_for_selected))
 
+    return (shared_settings, selections)
+
+
+def create_metadata_database_and_tracker(config):
+    """
+        Creates the music metadata database and the tracker
+        selected in the configuration.
+        Returns (metadata-database, tracker, tracker-settings).
+    """
     database_name, database_settings = read_selection_field_from_config(
         config, 'music_database'
         )
@@ -265,38 +1202,352 @@ def main(config, keywords):
         **database_settings
         )
 
-    tracker_name, tracker_settings = read_selection_field_from_config(
-        config, 'tracker'
+    if 'torrents_catalog_path' not in config['tracker']:
+        os.makedirs(AUTOMUDO_DATA_DIRECTORY, exist_ok=True)
+        config['tracker']['torrents_catalog_path'] = TORRENTS_CATALOG_FILE
+    rutracker_config = config['tracker']['trackers'].get('rutracker')
+    if rutracker_config is not None and \
+            'forums_map_path' not in rutracker_config:
+        os.makedirs(AUTOMUDO_DATA_DIRECTORY, exist_ok=True)
+        rutracker_config['forums_map_path'] = RUTRACKER_FORUMS_MAP_FILE
+    tracker_settings, trackers_selections = \
+        read_multiple_selection_field_from_config(config, 'tracker')
+    trackers = [
+        create_tracker(tracker_name,
+                       user_agent=config['advanced']['user_agent'],
+                       **settings)
+        for tracker_name, settings in trackers_selections
+        ]
+    if len(trackers) == 1:
+        tracker = trackers[0]
+    else:
+        from automudo.trackers.composite import CompositeTracker
+        tracker = CompositeTracker(
+            trackers, user_agent=config['advanced']['user_agent'],
+            **tracker_settings
+            )
+
+    return (metadata_database, tracker, tracker_settings)
+
+
+def print_run_plan(run_plan):
+    """
+        Prints the estimated requests and time of a run (a RunPlan).
+    """
+    print("Titles:             {}".format(run_plan.titles))
+    print("Metadata searches:  ~{:.0f}".format(run_plan.metadata_searches))
+    print("Detail fetches:     ~{:.0f}".format(run_plan.detail_fetches))
+    print("Tracker searches:   ~{:.0f}".format(run_plan.tracker_searches))
+    print("Torrent downloads:  ~{:.0f}".format(run_plan.downloads))
+    print("Requests:           ~{:.0f}".format(run_plan.requests))
+    print("Time:               ~{}".format(
+        datetime.timedelta(seconds=round(run_plan.seconds))
+        ))
+    print()
+
+
+def plan_run(titles, metadata_database, tracker, tracker_settings,
+             max_requests=None, time_budget_seconds=None, plan_only=False,
+             added_times=None, failed_attempts=None, resolution_cache=None):
+    """
+        Estimates the requests and the time of handling the titles,
+        orders them by priority (see TitleScheduler) and chooses
+        the highest-priority titles which fit in the budget (if there is
+        one). The titles are those whose retries are due
+        (see RetrySchedule).
+        When plan_only is set, the estimates are printed.
+        added_times are the times in which the titles' bookmarks were added
+        (see Browser.get_music_bookmarks_added_times), and failed_attempts
+        are the amounts of the titles' past attempts without matches.
+        The albums of the titles in the resolution_cache are already known,
+        so they are not looked up. Their torrents may be known as well,
+        from the torrents catalog, and may have been downloaded already
+        (see DownloadedTorrentsIndex).
+        Returns the chosen titles, from the highest priority to the lowest.
+    """
+    resolved_titles = set()
+    if resolution_cache is not None:
+        resolved_titles = set(title for title in titles
+                              if title in resolution_cache)
+
+    def get_known_torrents(title):
+        # The torrents of titles whose albums are not known yet can't be
+        # looked for. The first search of a known album is by its whole
+        # name (see _get_torrent_search_strategies).
+        if title not in resolved_titles:
+            return []
+        album, _ = resolution_cache.get(title)
+        return tracker.find_catalog_torrents(
+            [" ".join([album.artist, album.title])]
+            )
+
+    planner = RunPlanner(metadata_database, tracker,
+                         tracker_settings.get('output_format', "torrent"))
+    title_plans = planner.plan_titles(
+        titles, get_artist=get_probable_artist,
+        min_artist_titles=MIN_ARTIST_TITLES_TO_GROUP,
+        resolved_titles=resolved_titles,
+        get_known_torrents=get_known_torrents,
+        downloaded_torrents=DownloadedTorrentsIndex(DOWNLOADED_TORRENTS_FILE)
         )
-    tracker = create_tracker(
-        tracker_name, user_agent=config['advanced']['user_agent'],
-        **tracker_settings
+    scheduler = TitleScheduler(planner, get_artist=get_probable_artist,
+                               added_times=added_times,
+                               failed_attempts=failed_attempts)
+    chosen_title_plans = planner.select_titles(
+        scheduler.schedule(title_plans), max_requests=max_requests,
+        time_budget_seconds=time_budget_seconds
         )
 
-    user_music_bookmarks_titles = browser.get_music_bookmarks_titles()
-    already_downloaded_titles = get_titles_of_downloaded_albums()
+    if plan_only:
+        print("* * * * * Plan * * * * *")
+        print_run_plan(planner.summarize(title_plans))
+    if len(chosen_title_plans) < len(title_plans):
+        print("Within the budget, {} of the {} titles are handled:".format(
+            len(chosen_title_plans), len(title_plans)
+            ))
+        print_run_plan(planner.summarize(chosen_title_plans))
+    return [title_plan.title for title_plan in chosen_title_plans]
+
+
+def forget_resolutions(resolution_cache, keywords):
+    """
+        Forgets the cached albums of the titles which contain
+        all of the keywords (or of all of the titles, without keywords),
+        so that their albums are looked up again.
+    """
+    forgotten_titles_count = 0
+    for title in resolution_cache.titles():
+        if all([keyword.lower() in title.lower() for keyword in keywords]):
+            print("Forgetting the album of:", cui.get_printable_string(title))
+            resolution_cache.invalidate(title)
+            forgotten_titles_count += 1
+    print("Forgot the albums of {} titles.".format(forgotten_titles_count))
+
+
+def main(config, keywords, review_only=False, worker=False, plan_only=False,
+         max_requests=None, time_budget_seconds=None, forget_only=False):
+    """
+        The entry point of the automudo program.
+        When review_only is set, only the titles parked
+        in the review queue are reviewed.
+        When forget_only is set, the cached albums of the titles
+        which contain the keywords are forgotten (see ResolutionCache).
+        When worker is set, the titles are added to the work queue
+        shared with the other workers (other automudo processes,
+        possibly with other tracker accounts), which handle them together.
+        When plan_only is set, the requests and the time that handling
+        the titles would take are estimated, without handling them.
+        The run handles only the titles which fit in max_requests
+        and in time_budget_seconds (when they are given).
+
+        The metadata database and the tracker (and the modules they use)
+        are created only when there is something to do with them,
+        so runs without new titles are fast.
+    """
+    torrents_dir = os.path.expanduser(config['tracker']['output_directory'])
+    review_settings = config.get('review') or {}
+    review_queue = ReviewQueue(REVIEW_QUEUE_FILE)
+    retry_schedule = RetrySchedule(RETRY_SCHEDULE_FILE)
+    if forget_only:
+        forget_resolutions(
+            ResolutionCache(RESOLUTION_CACHE_FILE,
+                            config['music_database']['use']),
+            keywords
+            )
+        return
+    if review_only:
+        metadata_database, tracker, tracker_settings = \
+            create_metadata_database_and_tracker(config)
+        review_deferred_titles(review_queue, metadata_database, tracker,
+                               torrents_dir, retry_schedule,
+                               ResolutionCache(RESOLUTION_CACHE_FILE,
+                                               metadata_database.name),
+                               **tracker_settings)
+        return
+
+    browser_name, browser_settings = read_selection_field_from_config(
+        config, 'browser'
+        )
+    browser = create_browser(
+        browser_name,
+        **browser_settings
+        )
+
+    # Titles which were done by other workers before this time
+    # (and are still listed) should be handled again.
+    listing_time = time.time()
+    user_music_bookmarks_titles = set(browser.get_music_bookmarks_titles())
+    already_downloaded_titles = set(get_titles_of_downloaded_albums())
     titles_to_download = sorted(
-        set(user_music_bookmarks_titles) - set(already_downloaded_titles)
+        user_music_bookmarks_titles - already_downloaded_titles
+        )
+
+    # Titles which had no matches are searched again only when
+    # their retry is due. Titles which had no matches before the retry
+    # schedule was kept are spread over the first retry delay.
+    retry_schedule.add_unscheduled_titles(
+        set(get_titles_without_matches()) - already_downloaded_titles
         )
+    now = time.time()
+    titles_without_due_retries = [
+        title for title in titles_to_download
+        if not retry_schedule.is_due(title, now)
+        ]
 
+    # Titles waiting for a review are not searched again.
     titles_to_download = [title for title in titles_to_download
                           if all([keyword.lower() in title.lower()
-                                  for keyword in keywords])]
+                                  for keyword in keywords]) and
+                          title not in review_queue and
+                          retry_schedule.is_due(title, now)]
 
-    download_albums_by_titles(
+    if plan_only:
+        print("Bookmarks:          {}".format(
+            len(user_music_bookmarks_titles)
+            ))
+        print("Already handled:    {}".format(len(
+            user_music_bookmarks_titles & already_downloaded_titles
+            )))
+        print("Waiting for review: {}".format(len(review_queue)))
+        print("Waiting for retry:  {}".format(len(titles_without_due_retries)))
+        print()
+        if not titles_to_download:
+            print("No new titles to download.")
+            return
+        metadata_database, tracker, tracker_settings = \
+            create_metadata_database_and_tracker(config)
+        resolution_cache = ResolutionCache(RESOLUTION_CACHE_FILE,
+                                           metadata_database.name)
+        print("Albums known:       {}".format(len([
+            title for title in titles_to_download
+            if title in resolution_cache
+            ])))
+        print()
+        plan_run(titles_to_download, metadata_database, tracker,
+                 tracker_settings, max_requests, time_budget_seconds,
+                 plan_only=True,
+                 added_times=browser.get_music_bookmarks_added_times(),
+                 failed_attempts=retry_schedule.get_failed_attempts_counts(),
+                 resolution_cache=resolution_cache)
+        return
+
+    should_review = review_settings.get('review_at_end') and len(review_queue)
+    if not titles_to_download and not should_review and not worker:
+        print("No new titles to download.")
+        return
+
+    metadata_database, tracker, tracker_settings = \
+        create_metadata_database_and_tracker(config)
+    resolution_cache = ResolutionCache(RESOLUTION_CACHE_FILE,
+                                       metadata_database.name)
+    run_budget = RunBudget(max_requests, time_budget_seconds)
+    # The most valuable titles are handled first, so that runs which
+    # are interrupted (or limited by a budget) have done the most.
+    titles_to_download = plan_run(
         titles_to_download, metadata_database, tracker,
-        os.path.expanduser(config['tracker']['output_directory']),
+        tracker_settings, max_requests, time_budget_seconds,
+        added_times=browser.get_music_bookmarks_added_times(),
+        failed_attempts=retry_schedule.get_failed_attempts_counts(),
+        resolution_cache=resolution_cache
+        )
+
+    ambiguous_matches = review_settings.get('ambiguous_matches', "take_best")
+    work_queue = None
+    if worker:
+        # sqlite3 is slow to import, and is needed only by workers.
+        from automudo.utils.work_queue import WorkQueue, DEFAULT_LEASE_SECONDS
+        os.makedirs(AUTOMUDO_DATA_DIRECTORY, exist_ok=True)
+        work_queue = WorkQueue(
+            WORK_QUEUE_FILE,
+            worker_id="{}:{}".format(socket.gethostname(), os.getpid()),
+            lease_seconds=config['advanced'].get('work_queue_lease_seconds',
+                                                 DEFAULT_LEASE_SECONDS)
+            )
+        work_queue.add_titles(titles_to_download, listing_time)
+        if ambiguous_matches == "defer":
+            # Each worker keeps its own copy of the review queue in memory,
+            # so the workers would overwrite each other's parked titles.
+            print("Workers do not defer ambiguous matches, "
+                  "taking the best matches instead.")
+            ambiguous_matches = "take_best"
+
+    download_albums_by_titles(
+        titles_to_download, metadata_database, tracker, torrents_dir,
+        review_queue=review_queue,
+        ambiguous_matches=ambiguous_matches,
+        title_deadline_seconds=config['advanced'].get(
+            'title_deadline_seconds'
+            ),
+        work_queue=work_queue,
+        retry_schedule=retry_schedule,
+        resolution_cache=resolution_cache,
+        run_budget=run_budget,
         **tracker_settings
         )
 
+    if review_settings.get('review_at_end') and len(review_queue):
+        review_deferred_titles(review_queue, metadata_database, tracker,
+                               torrents_dir, retry_schedule, resolution_cache,
+                               **tracker_settings)
+
+
+def parse_time_budget(time_budget):
+    """
+        Parses a time budget given in seconds,
+        or with an "m" (minutes) or an "h" (hours) suffix.
+        Returns the amount of seconds.
+    """
+    units = {'s': 1, 'm': 60, 'h': 60 * 60}
+    unit = 's'
+    if time_budget and time_budget[-1].lower() in units:
+        time_budget, unit = time_budget[:-1], time_budget[-1].lower()
+    return float(time_budget) * units[unit]
+
+
 if __name__ == '__main__':
+    # argparse and yaml are needed only for running the program.
+    import argparse
+    import yaml
+
+    COMMANDS = ['review', 'worker', 'plan', 'forget']
+    arguments_parser = argparse.ArgumentParser(
+        prog="python3 -m scripts.automudo",
+        description="Downloads the music that you have in your bookmarks."
+        )
+    arguments_parser.add_argument(
+        'words', nargs='*', metavar='[COMMAND] KEYWORD',
+        help="an optional command: review (the parked titles), "
+             "worker (handle the titles with other workers) "
+             "plan (estimate the requests and the time of the run) "
+             "or forget (the cached albums of the titles, "
+             "so that they are looked up again), "
+             "followed by keywords which the handled titles must contain"
+        )
+    arguments_parser.add_argument(
+        '--max-requests', type=int,
+        help="handle only the titles which fit in this amount of requests"
+        )
+    arguments_parser.add_argument(
+        '--time-budget', type=parse_time_budget, metavar='SECONDS',
+        help="handle only the titles which fit in this time "
+             "(in seconds, or with an m or an h suffix, such as 90m)"
+        )
+    arguments = arguments_parser.parse_args()
+    command = None
+    keywords = arguments.words
+    if keywords and keywords[0] in COMMANDS:
+        command, keywords = keywords[0], keywords[1:]
+
     with open("config.yaml", encoding="utf-8") as config_file:
         config_dict = yaml.load(config_file)
 
     try:
-        keywords = []
-        if len(sys.argv) > 1:
-            keywords = sys.argv[1:]
-        main(config_dict, keywords)
+        main(config_dict, keywords,
+             review_only=command == 'review',
+             worker=command == 'worker',
+             plan_only=command == 'plan',
+             forget_only=command == 'forget',
+             max_requests=arguments.max_requests,
+             time_budget_seconds=arguments.time_budget)
     except KeyboardInterrupt:
         print("Good bye!")
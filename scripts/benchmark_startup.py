@@ -0,0 +1,78 @@
+#! python3
+"""
+    Measures the startup time of automudo, using python -X importtime,
+    and makes sure that the slow modules are not imported on startup
+    (they should be imported only when they are used).
+
+    Usage:
+        python3 -m scripts.benchmark_startup [RUNS]
+"""
+import sys
+import time
+import subprocess
+
+# The module whose import is measured.
+BENCHMARKED_MODULE = "scripts.automudo"
+# Slow modules which a run without new titles should not import.
+LAZY_MODULES = ["requests", "asyncio", "sqlite3", "yaml", "unidecode"]
+# The amount of slowest modules which are shown.
+SHOWN_MODULES = 10
+
+
+def measure_import(module_name):
+    """
+        Imports the module in a new interpreter.
+        Returns (the interpreter's wall time in seconds,
+                 {imported-module: (self-microseconds, cumulative-microseconds)}).
+    """
+    start_time = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import {}".format(module_name)],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+        )
+    wall_time = time.perf_counter() - start_time
+
+    import_times = dict()
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, cumulative_time, imported_module = \
+            line[len("import time:"):].split("|")
+        import_times[imported_module.strip()] = (int(self_time),
+                                                 int(cumulative_time))
+    return (wall_time, import_times)
+
+
+def main(runs):
+    """
+        The entry point of the benchmark.
+    """
+    # The first run also compiles the modules, so it is not counted.
+    measure_import(BENCHMARKED_MODULE)
+    wall_time, import_times = min(
+        (measure_import(BENCHMARKED_MODULE) for _ in range(runs)),
+        key=lambda measurement: measurement[1][BENCHMARKED_MODULE][1]
+        )
+
+    print("Importing {} took {:.1f}ms (the interpreter ran {:.1f}ms).".format(
+        BENCHMARKED_MODULE,
+        import_times[BENCHMARKED_MODULE][1] / 1000,
+        wall_time * 1000
+        ))
+    print("Slowest modules (self time):")
+    for imported_module, (self_time, _) in sorted(
+            import_times.items(), key=lambda item: item[1][0],
+            reverse=True)[:SHOWN_MODULES]:
+        print("  {:8.1f}ms  {}".format(self_time / 1000, imported_module))
+
+    eagerly_imported_modules = [module for module in LAZY_MODULES
+                                if module in import_times]
+    if eagerly_imported_modules:
+        print("Imported on startup, but should be imported on first use:",
+              ", ".join(eagerly_imported_modules))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
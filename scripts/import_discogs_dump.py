@@ -0,0 +1,35 @@
+#! python3
+"""
+    Builds a local index from Discogs XML data dumps
+    (https://data.discogs.com/), for use by the discogs_dump
+    music metadata database.
+    The releases are kept next to the index, in INDEX-PATH.records .
+
+    Usage:
+        python3 -m scripts.import_discogs_dump INDEX-PATH DUMP-PATH...
+"""
+import os
+import sys
+import time
+
+from automudo.music_metadata_databases.discogs_dump \
+    import import_discogs_dump
+
+
+def main(index_path, dump_paths):
+    """
+        The entry point of the importer.
+    """
+    start_time = time.time()
+    imported_releases = import_discogs_dump(
+        os.path.expanduser(index_path), dump_paths
+        )
+    print("Imported {} releases in {:.1f} seconds.".format(
+        imported_releases, time.time() - start_time
+        ))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__.strip())
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from automudo.music_metadata_databases.discogs_dump import \
+    import_discogs_dump, DiscogsDumpMetadataDatabase, RECORDS_FILE_SUFFIX
+from automudo.music_metadata_databases.serialization import \
+    music_metadata_to_dict, music_metadata_from_dict
+
+SAMPLE_DUMP_PATH = os.path.join(os.path.dirname(__file__), "fixtures",
+                                "discogs_releases_sample.xml")
+
+
+class DiscogsDumpTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.directory, "discogs.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def find_release_ids(self, search_string, master_releases_only=False):
+        database = DiscogsDumpMetadataDatabase(index_path=self.index_path)
+        return [album.release_id for album in database._find_album(
+            search_string, master_releases_only, 10
+            )]
+
+    def test_import(self):
+        self.assertEqual(
+            import_discogs_dump(self.index_path, [SAMPLE_DUMP_PATH]), 4
+            )
+        database = DiscogsDumpMetadataDatabase(index_path=self.index_path)
+        album, = database._find_album("persuader stockholm", False, 10)
+        self.assertEqual(album.artist, "Persuader")
+        self.assertEqual(album.title.strip(), "Stockholm")
+        self.assertEqual(album.genres, ["Deep House"])
+        self.assertEqual(album.date.year, 1999)
+        self.assertEqual(album.formats, ['Vinyl', '12"', "Album"])
+        self.assertEqual([track.title for track in album.tracks],
+                         ["Östermalm", "Vasastaden"])
+        self.assertEqual(album.tracks[1].duration.minute, 6)
+        self.assertEqual(album.metadata_database_name, "discogs_dump")
+
+    def test_find_album(self):
+        import_discogs_dump(self.index_path, [SAMPLE_DUMP_PATH])
+        database = DiscogsDumpMetadataDatabase(index_path=self.index_path)
+        (album, probability), = database.find_album("Persuader - Stockholm")
+        self.assertEqual(album.release_id, 1)
+        self.assertEqual(music_metadata_from_dict(
+            music_metadata_to_dict(album)
+            ).tracks[0].title, "Östermalm")
+
+    def test_index_must_match_records_file(self):
+        import_discogs_dump(self.index_path, [SAMPLE_DUMP_PATH])
+        other_index_path = os.path.join(self.directory, "other.sqlite")
+        import_discogs_dump(other_index_path,
+                            [SAMPLE_DUMP_PATH, SAMPLE_DUMP_PATH])
+        os.replace(other_index_path + RECORDS_FILE_SUFFIX,
+                   self.index_path + RECORDS_FILE_SUFFIX)
+        with self.assertRaises(ValueError):
+            DiscogsDumpMetadataDatabase(index_path=self.index_path)
+
+    def test_import_is_idempotent(self):
+        self.assertEqual(
+            import_discogs_dump(self.index_path,
+                                [SAMPLE_DUMP_PATH, SAMPLE_DUMP_PATH]),
+            4
+            )
+        self.assertEqual(self.find_release_ids("persuader"), [1])
+        self.assertEqual(import_discogs_dump(self.index_path,
+                                             [SAMPLE_DUMP_PATH]),
+                         4)
+        self.assertEqual(self.find_release_ids("persuader"), [1])
+
+    def test_lookup_matches_all_words(self):
+        import_discogs_dump(self.index_path, [SAMPLE_DUMP_PATH])
+        # "stockholm" appears in the Muse releases as well.
+        self.assertEqual(self.find_release_ids("the persuader stockholm"),
+                         [1])
+        self.assertEqual(sorted(self.find_release_ids("muse absolution")),
+                         [3, 4])
+        self.assertEqual(
+            self.find_release_ids("muse absolution",
+                                  master_releases_only=True),
+            [3]
+            )
+
+    def test_lookup_falls_back_to_any_word(self):
+        import_discogs_dump(self.index_path, [SAMPLE_DUMP_PATH])
+        self.assertEqual(self.find_release_ids("persuader unknownword"),
+                         [1])
+        # Searches of only common words still search for them.
+        self.assertEqual(self.find_release_ids("is"), [3])
+        self.assertEqual(self.find_release_ids("!!"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+from automudo.music_metadata_databases import records
+from automudo.music_metadata_databases.base import \
+    MusicMetadata, TrackMetadata
+from automudo.music_metadata_databases.records import \
+    write_music_metadata_records, MusicMetadataRecordsFile
+
+
+def build_album(index):
+    return MusicMetadata(
+        artist="Artist {}".format(index % 3), title="Album {}".format(index),
+        genres=["Rock"] if index % 2 else None,
+        date=datetime.date(2000 + index % 20, 1, 2) if index % 4 else None,
+        formats=["CD", "Album"],
+        release_id=index if index % 5 else "r{}".format(index),
+        metadata_database_name="test",
+        tracks=[TrackMetadata(title="Track {}-{}".format(index, i),
+                              duration=(datetime.time(minute=3, second=i)
+                                        if i else None))
+                for i in range(index % 4)]
+        )
+
+
+class RecordsFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "albums.records")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        albums = [build_album(i) for i in range(50)]
+        self.assertEqual(write_music_metadata_records(self.path, albums), 50)
+        # Only the records file is left.
+        self.assertEqual(os.listdir(self.directory), ["albums.records"])
+
+        with MusicMetadataRecordsFile(self.path) as records_file:
+            self.assertEqual(len(records_file), 50)
+            for album, read_album in zip(albums, records_file):
+                self.assertEqual(read_album._replace(tracks=None),
+                                 album._replace(tracks=None))
+                self.assertEqual(list(read_album.tracks), album.tracks)
+            self.assertEqual(records_file[-1].title, "Album 49")
+
+    def test_decoded_strings_cache_is_bounded(self):
+        albums = [build_album(i) for i in range(50)]
+        write_music_metadata_records(self.path, albums)
+        with mock.patch.object(records, "DECODED_STRINGS_CACHE_SIZE", 4), \
+                MusicMetadataRecordsFile(self.path) as records_file:
+            for _ in range(2):
+                self.assertEqual([album.title for album in records_file],
+                                 [album.title for album in albums])
+            self.assertLessEqual(
+                len(records_file._MusicMetadataRecordsFile__strings), 4
+                )
+
+    def test_unsupported_version(self):
+        write_music_metadata_records(self.path, [build_album(1)])
+        with open(self.path, "r+b") as records_file:
+            records_file.seek(len(records.MAGIC))
+            records_file.write(b"\x01\x00")
+        with self.assertRaises(ValueError):
+            MusicMetadataRecordsFile(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()